@@ -0,0 +1,245 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/answer_index.py` as well as `python -m src.answer_index`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .colors import Colors
+from .command_analysis import tokenize_command
+from .event_log import VERDICT_CORRECT, event_log_directory, iter_events, list_segments, EVENT_LOG_DIR
+from .task_loader import Task, load_all_tasks
+
+ANSWER_INDEX_ENV_VAR = "CMD_PRACTICE_ANSWER_INDEX" # "0" disables feedback, a directory path relocates the index
+ANSWER_INDEX_DIR = ".accepted_answers"
+MAX_FEEDBACK_DISTANCE = 2 # Token edits; further away, the "diff" would mostly be the answer itself
+
+Tokens = Tuple[str, ...]
+
+def command_tokens(command: str) -> Tokens:
+    """shlex tokens of a command, interned so token comparisons are pointer comparisons."""
+    try:
+        tokens = tokenize_command(command)
+    except ValueError: # Unbalanced quotes; fall back to whitespace
+        tokens = command.split()
+    return tuple(sys.intern(token) for token in tokens)
+
+def token_distance(a: Tokens, b: Tokens) -> int:
+    """Levenshtein distance counted in whole tokens (a missing `-r` is one edit)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, token_a in enumerate(a, 1):
+        current = [i]
+        for j, token_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (token_a is not token_b and token_a != token_b)))
+        previous = current
+    return previous[-1]
+
+def _bucket(table: Dict[int, Any], key: int) -> Sequence[Tokens]:
+    entry = table.get(key)
+    if entry is None:
+        return ()
+    return (entry,) if type(entry) is tuple else entry
+
+def _bucket_add(table: Dict[int, Any], key: int, tokens: Tokens):
+    # Most keys hold one sequence; a list is only allocated on the second one
+    entry = table.get(key)
+    if entry is None:
+        table[key] = tokens
+    elif type(entry) is list:
+        entry.append(tokens)
+    else:
+        table[key] = [entry, tokens]
+
+def _deletion_keys(tokens: Tokens) -> List[int]:
+    """Hashes of the sequence with one token removed, one per position."""
+    return [hash(tokens[:i] + tokens[i + 1:]) for i in range(len(tokens))]
+
+class DeletionIndex:
+    """Accepted token sequences indexed by their one-token deletions (a SymSpell-style index).
+
+    Two sequences within one token edit share a key: one is the other minus a token, or both
+    minus the same position (a substitution). A lookup is one dict probe per query token, however
+    many sequences are stored. It finds every sequence within one edit and most within two
+    (one edit each side, e.g. a wrong flag plus a missing one). Keys are hashes, and candidates
+    are checked against the real sequences, so collisions cost time, not correctness.
+    """
+
+    def __init__(self):
+        # Values are one sequence, or a list of them when several share the key
+        self.sequences: Dict[int, Any] = {} # hash(sequence) -> sequences
+        self.deletions: Dict[int, Any] = {} # hash(sequence minus one token) -> sequences
+        self.size = 0
+
+    def __contains__(self, tokens: Tokens) -> bool:
+        return tokens in _bucket(self.sequences, hash(tokens))
+
+    def add(self, tokens: Tokens) -> bool:
+        """Inserts a token sequence. Returns False if it was already indexed."""
+        if tokens in self:
+            return False
+        _bucket_add(self.sequences, hash(tokens), tokens)
+        for key in set(_deletion_keys(tokens)): # `rm -r -r` has two equal deletions
+            _bucket_add(self.deletions, key, tokens)
+        self.size += 1
+        return True
+
+    def nearest(self, tokens: Tokens, max_distance: int = 2) -> Optional[Tuple[int, Tokens]]:
+        """The closest indexed sequence, as (distance, tokens), or None if none is found within max_distance."""
+        if tokens in self:
+            return 0, tokens
+        if max_distance < 1:
+            return None
+        query_deletions = _deletion_keys(tokens)
+        # The query has one token too many...
+        for i, key in enumerate(query_deletions):
+            shorter = tokens[:i] + tokens[i + 1:]
+            if shorter in _bucket(self.sequences, key):
+                return 1, shorter
+        # ...or one too few
+        for candidate in _bucket(self.deletions, hash(tokens)):
+            if len(candidate) == len(tokens) + 1 and token_distance(tokens, candidate) == 1:
+                return 1, candidate
+        # Same deletion on both sides: equal lengths, so a substitution (1) or an edit on each side (2)
+        best: Optional[Tuple[int, Tokens]] = None
+        for key in set(query_deletions):
+            for candidate in _bucket(self.deletions, key):
+                if len(candidate) != len(tokens):
+                    continue # Hash collision
+                mismatches = sum(1 for a, b in zip(tokens, candidate) if a is not b and a != b)
+                if mismatches == 1:
+                    return 1, candidate
+                if best is None and max_distance >= 2 and token_distance(tokens, candidate) == 2:
+                    best = (2, candidate)
+        return best
+
+def describe_differences(attempt: Tokens, accepted: Tokens) -> List[str]:
+    """Token-level edits that turn the attempt into the accepted answer, in words."""
+    edits = []
+    matcher = difflib.SequenceMatcher(a=attempt, b=accepted, autojunk=False)
+    for operation, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        old, new = " ".join(attempt[a_start:a_end]), " ".join(accepted[b_start:b_end])
+        if operation == "insert":
+            edits.append(f"you're missing `{new}`")
+        elif operation == "delete":
+            edits.append(f"you don't need `{old}`")
+        elif operation == "replace":
+            edits.append(f"try `{new}` instead of `{old}`")
+    return edits
+
+class AcceptedAnswerIndex:
+    """Per-task deletion indexes of accepted commands, for "closest correct answer" feedback.
+
+    Each task's index is seeded with its example solution and the accepted commands stored under
+    the index directory (one JSON string per line, per task), loaded on first use. Newly accepted
+    commands are added to the index and appended to the task's file.
+    """
+
+    def __init__(self, directory: Optional[str] = ANSWER_INDEX_DIR):
+        self.directory = directory
+        self.indexes: Dict[str, DeletionIndex] = {}
+
+    def _answers_path(self, task_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", task_id) + ".jsonl")
+
+    def index(self, task: Task) -> DeletionIndex:
+        index = self.indexes.get(task.id)
+        if index is not None:
+            return index
+        index = DeletionIndex()
+        if task.example_solution:
+            index.add(command_tokens(task.example_solution))
+        if self.directory and os.path.exists(self._answers_path(task.id)):
+            try:
+                with open(self._answers_path(task.id), 'r') as f:
+                    for line in f:
+                        try:
+                            index.add(command_tokens(json.loads(line)))
+                        except (json.JSONDecodeError, TypeError, AttributeError):
+                            continue # Torn or corrupt line
+            except IOError as e:
+                print(f"{Colors.RED}Error reading accepted answers for {task.id}: {e}{Colors.ENDC}")
+        self.indexes[task.id] = index
+        return index
+
+    def forget(self, task_ids: Iterable[str]):
+        """Drops the loaded indexes of changed or removed tasks; a changed task is re-seeded
+        with its new example solution on next use.
+        """
+        for task_id in task_ids:
+            self.indexes.pop(task_id, None)
+
+    def add(self, task: Task, command: str) -> bool:
+        """Records an accepted command. Returns True if it was new for the task."""
+        if not self.index(task).add(command_tokens(command)):
+            return False
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._answers_path(task.id), 'a') as f:
+                    f.write(json.dumps(command) + "\n")
+            except IOError as e:
+                print(f"{Colors.RED}Error saving accepted answer: {e}{Colors.ENDC}")
+        return True
+
+    def feedback(self, task: Task, command: str) -> Optional[str]:
+        """How the attempt differs from the closest accepted answer, or None if none is close."""
+        attempt = command_tokens(command)
+        max_distance = min(MAX_FEEDBACK_DISTANCE, max(1, len(attempt) // 2))
+        match = self.index(task).nearest(attempt, max_distance)
+        if match is None and task.example_solution: # Two edits the index cannot see, e.g. two missing flags
+            solution = command_tokens(task.example_solution)
+            distance = token_distance(attempt, solution)
+            match = (distance, solution) if distance <= max_distance else None
+        if match is None:
+            return None
+        if match[0] == 0: # Same words after shell parsing, e.g. `*.tmp` where an answer had '*.tmp'
+            return "Close! Your command has the same words as an accepted answer; check its quoting and escaping."
+        edits = describe_differences(attempt, match[1])
+        if not edits:
+            return None
+        return f"Close! Compared to an accepted answer, {'; '.join(edits)}."
+
+def answer_index_from_env() -> Optional[AcceptedAnswerIndex]:
+    """Returns the accepted-answer index unless disabled through the environment."""
+    setting = os.environ.get(ANSWER_INDEX_ENV_VAR, "")
+    if setting in ("0", "false", "no"):
+        return None
+    if setting and setting not in ("1", "true", "yes"):
+        return AcceptedAnswerIndex(setting)
+    return AcceptedAnswerIndex()
+
+def rebuild_from_event_log(index: AcceptedAnswerIndex, tasks: Dict[str, Task], log_directory: str) -> int:
+    """Adds every correct command in the attempt log to the index. Returns how many were new."""
+    added = 0
+    for segment_path in list_segments(log_directory):
+        for event in iter_events(segment_path):
+            task = tasks.get(event.get("task_id"))
+            if task is not None and event.get("verdict") == VERDICT_CORRECT and event.get("command"):
+                added += index.add(task, event["command"])
+    return added
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import accepted commands from the attempt log into the answer index.")
+    parser.add_argument("--log-dir", default=event_log_directory() or EVENT_LOG_DIR, help="Attempt log directory")
+    args = parser.parse_args(argv)
+
+    index = answer_index_from_env()
+    if index is None:
+        print(f"{Colors.YELLOW}The answer index is disabled ({ANSWER_INDEX_ENV_VAR}).{Colors.ENDC}")
+        return 1
+    added = rebuild_from_event_log(index, {task.id: task for task in load_all_tasks()}, args.log_dir)
+    print(f"{Colors.GREEN}Added {added} new accepted answer(s) to {index.directory}.{Colors.ENDC}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
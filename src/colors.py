@@ -0,0 +1,11 @@
+# ANSI escape codes for colors
+class Colors:
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m' # For hints or warnings
+    RED = '\033[91m'    # For errors or incorrect answers
+    ENDC = '\033[0m'    # Resets color
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+    CYAN = '\033[96m'   # For stdout/stderr distinctions
@@ -0,0 +1,247 @@
+import shlex
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .safe_regex import safe_search
+
+# Operators as produced by shlex with punctuation_chars=True
+PIPE_OPERATORS = {"|", "|&"}
+CONTROL_OPERATORS = {"&&", "||", ";", "&", ";;"}
+REDIRECT_OPERATORS = {">", ">>", "<", ">&", "<&", "&>", ">|", "<<", "<<<", "<>"}
+
+# Programs that run another program given in their arguments, e.g. `xargs wc -l`
+WRAPPER_COMMANDS = {"xargs", "sudo", "env", "time", "nohup", "nice", "command", "exec", "watch"}
+# xargs options that consume the following token as their value
+XARGS_VALUE_FLAGS = {"-n", "-L", "-P", "-I", "-d", "-s", "-E", "-a"}
+# find actions that run a program, terminated by ';' or '+'
+FIND_EXEC_ACTIONS = {"-exec", "-execdir", "-ok", "-okdir"}
+# Short options that take a value, per program: the rest of a bundle (`head -n3`), or else the next word, is the value
+VALUE_OPTIONS: Dict[str, str] = {
+    "head": "nc", "tail": "ncs", "ping": "cisIWwtQ", "grep": "efmABCd", "cut": "dfcb", "sort": "ktoS",
+    "awk": "Fvf", "sed": "ef", "tar": "fCbT", "uniq": "fsw", "split": "lbn", "du": "d", "xargs": "nLPIdsEa",
+}
+# Long options and the short option they stand for, per program, so `wc --lines` satisfies a check for `-l`
+LONG_OPTION_ALIASES: Dict[str, Dict[str, str]] = {
+    "ls": {"--all": "-a", "--almost-all": "-A", "--long": "-l", "--format=long": "-l", "--format=verbose": "-l",
+           "--reverse": "-r", "--recursive": "-R", "--human-readable": "-h"},
+    "wc": {"--lines": "-l", "--words": "-w", "--bytes": "-c", "--chars": "-m"},
+    "head": {"--lines": "-n", "--bytes": "-c"},
+    "tail": {"--lines": "-n", "--bytes": "-c", "--follow": "-f"},
+    "grep": {"--count": "-c", "--ignore-case": "-i", "--invert-match": "-v", "--line-number": "-n",
+             "--recursive": "-r", "--files-with-matches": "-l", "--extended-regexp": "-E"},
+    "ping": {"--count": "-c"},
+    "uniq": {"--count": "-c"},
+    "sort": {"--reverse": "-r", "--numeric-sort": "-n", "--unique": "-u"},
+}
+
+class SimpleCommand:
+    """One program invocation: name, arguments, flags and redirections."""
+
+    def __init__(self, name: str, args: List[str], redirections: List[Tuple[str, str]]):
+        self.name = name
+        self.args = args
+        self.redirections = redirections
+        self.flags = self._collect_flags(name, args)
+        self.nested: List["SimpleCommand"] = self._collect_nested(name, args)
+
+    @staticmethod
+    def _collect_flags(name: str, args: List[str]) -> set:
+        flags = set()
+        value_options = VALUE_OPTIONS.get(name, "")
+        aliases = LONG_OPTION_ALIASES.get(name, {})
+        takes_value = False
+        for arg in args:
+            if takes_value: # The value of the previous option, e.g. the `-3` of `head -n -3`
+                takes_value = False
+                continue
+            if arg.startswith("--") and len(arg) > 2:
+                option = arg.split("=", 1)[0]
+                flags.add(option)
+                short = aliases.get(arg) or aliases.get(option)
+                if short:
+                    flags.add(short)
+            elif arg.startswith("-") and len(arg) > 1:
+                flags.add(arg)
+                # Expand bundled short options so `ls -al` satisfies a check for `-l`
+                for position, char in enumerate(arg[1:], 1):
+                    if not char.isalnum():
+                        break # Attached option value, e.g. awk -F'|'
+                    flags.add(f"-{char}")
+                    if char in value_options: # The rest is its value (`head -n3`), or else the next word is
+                        takes_value = position == len(arg) - 1
+                        break
+        return flags
+
+    @staticmethod
+    def _collect_nested(name: str, args: List[str]) -> List["SimpleCommand"]:
+        nested = []
+        if name == "find":
+            i = 0
+            while i < len(args):
+                if args[i] in FIND_EXEC_ACTIONS:
+                    end = i + 1
+                    while end < len(args) and args[end] not in (";", "+"):
+                        end += 1
+                    if end > i + 1:
+                        nested.append(SimpleCommand(args[i + 1], args[i + 2:end], []))
+                    i = end
+                i += 1
+        elif name in WRAPPER_COMMANDS:
+            i = 0
+            while i < len(args) and args[i].startswith("-"):
+                if name == "xargs" and args[i] in XARGS_VALUE_FLAGS:
+                    i += 1 # Skip the option's value too
+                i += 1
+            if name == "env":
+                while i < len(args) and "=" in args[i]: # Skip VAR=value assignments
+                    i += 1
+            if i < len(args):
+                nested.append(SimpleCommand(args[i], args[i + 1:], []))
+        return nested
+
+    def walk(self) -> Iterator["SimpleCommand"]:
+        """Yields this command and every command it runs on its behalf."""
+        yield self
+        for nested_command in self.nested:
+            yield from nested_command.walk()
+
+    def __repr__(self) -> str:
+        return f"<SimpleCommand name='{self.name}' args={self.args} redirections={self.redirections}>"
+
+class Pipeline:
+    """Commands connected by pipes."""
+
+    def __init__(self, commands: List[SimpleCommand]):
+        self.commands = commands
+
+    def __repr__(self) -> str:
+        return f"<Pipeline {' | '.join(cmd.name for cmd in self.commands)}>"
+
+class CommandAnalysis:
+    """Lightweight AST of a shell command line: pipelines joined by control operators."""
+
+    def __init__(self, pipelines: List[Pipeline], operators: List[str]):
+        self.pipelines = pipelines
+        self.operators = operators # Control operators between consecutive pipelines, e.g. ["&&"]
+
+    def all_commands(self) -> Iterator[SimpleCommand]:
+        for pipeline in self.pipelines:
+            for command in pipeline.commands:
+                yield from command.walk()
+
+    def invoked_programs(self) -> List[str]:
+        return [command.name for command in self.all_commands()]
+
+    def uses_flag(self, program: str, flag: str) -> bool:
+        return any(command.name == program and flag in command.flags for command in self.all_commands())
+
+    def uses_pipe(self) -> bool:
+        return any(len(pipeline.commands) > 1 for pipeline in self.pipelines)
+
+    def __repr__(self) -> str:
+        return f"<CommandAnalysis pipelines={self.pipelines} operators={self.operators}>"
+
+def tokenize_command(command_str: str) -> List[str]:
+    """Splits a command line into words and shell operators. Raises ValueError on unbalanced quotes."""
+    lexer = shlex.shlex(command_str, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    return list(lexer)
+
+def parse_command(command_str: str) -> Optional[CommandAnalysis]:
+    """Builds a CommandAnalysis for command_str, or returns None if it cannot be tokenized."""
+    try:
+        tokens = tokenize_command(command_str)
+    except ValueError:
+        return None
+
+    pipelines: List[Pipeline] = []
+    operators: List[str] = []
+    current_pipeline: List[SimpleCommand] = []
+    words: List[str] = []
+    redirections: List[Tuple[str, str]] = []
+    in_find_exec = False
+
+    def finish_command():
+        nonlocal words, redirections
+        if words:
+            current_pipeline.append(SimpleCommand(words[0], words[1:], redirections))
+        words, redirections = [], []
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if words and words[0] == "find" and token in FIND_EXEC_ACTIONS:
+            in_find_exec = True
+        if token == ";" and in_find_exec:
+            # shlex drops the backslash of `\;`, so inside find -exec a ';' terminates the action
+            words.append(token)
+            in_find_exec = False
+        elif token in REDIRECT_OPERATORS:
+            # A bare file descriptor right before the operator belongs to it, e.g. `2>/dev/null`
+            if len(words) > 1 and words[-1].isdigit():
+                token = words.pop() + token
+            target = tokens[i + 1] if i + 1 < len(tokens) else ""
+            redirections.append((token, target))
+            i += 1
+        elif token in PIPE_OPERATORS:
+            finish_command()
+        elif token in CONTROL_OPERATORS:
+            finish_command()
+            if current_pipeline:
+                pipelines.append(Pipeline(current_pipeline))
+            current_pipeline = []
+            operators.append(token)
+            in_find_exec = False
+        else:
+            words.append(token)
+        i += 1
+
+    finish_command()
+    if current_pipeline:
+        pipelines.append(Pipeline(current_pipeline))
+    return CommandAnalysis(pipelines, operators)
+
+def check_requirement(check_item: Dict[str, Any], user_command: str, analysis: Optional[CommandAnalysis]) -> bool:
+    """Evaluates one check_command_contains item against the command text and its analysis.
+
+    Supported forms:
+      {"substring": "awk"}                  - plain substring (or regex with "is_regex": true)
+      {"command": "grep"}                   - grep is invoked somewhere (also via xargs / find -exec)
+      {"command": "grep", "flag": "-c"}     - grep is invoked with the -c flag (bundled flags and long aliases such as --count count)
+    """
+    substring = check_item.get("substring")
+    if substring:
+        if check_item.get("is_regex", False):
+            return safe_search(substring, user_command)
+        return substring in user_command
+
+    program = check_item.get("command")
+    if program:
+        if analysis is None: # Unparseable command (e.g. unbalanced quotes), the shell would reject it too
+            return False
+        flag = check_item.get("flag")
+        if flag:
+            return analysis.uses_flag(program, flag)
+        return program in analysis.invoked_programs()
+
+    return True # Items without a recognised requirement are ignored, as before
+
+def command_structure_satisfied(user_command: str, command_checks: Any) -> bool:
+    """Returns False if any mandatory check_command_contains item fails.
+
+    Runs before execution, so commands missing a required part never spawn a process.
+    """
+    if not command_checks or not isinstance(command_checks, list): # Ensure it's a list
+        return True
+
+    analysis = None
+    if any(isinstance(item, dict) and item.get("command") for item in command_checks):
+        analysis = parse_command(user_command) # Only tokenize when a structural check needs it
+
+    for check_item in command_checks:
+        if not isinstance(check_item, dict): # Ensure item is a dict
+            continue
+        if check_item.get("optional", False):
+            continue # Optional checks can never fail the structure check
+        if not check_requirement(check_item, user_command, analysis):
+            return False
+    return True
@@ -0,0 +1,243 @@
+import mmap
+import os
+import selectors
+import subprocess
+import tempfile
+import time
+from typing import List, Optional, Tuple, Union
+
+# Output up to this size stays in memory; larger output spills to an unnamed temp file (mapped for reading)
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Bytes kept per stream. The rest is still read (so the command never blocks on a full pipe) but dropped.
+MAX_CAPTURE_BYTES = 64 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+WHITESPACE = b" \t\n\r\x0b\x0c"
+NEWLINE_COUNT_CHUNK = 1024 * 1024
+TRIM_CHUNK_BYTES = 64 * 1024
+
+def _content_bounds(buffer: Union[bytes, mmap.mmap]) -> Tuple[int, int]:
+    """Start and end of buffer without leading and trailing whitespace.
+
+    Strips bounded slices with bytes.lstrip/rstrip (C speed, at most one chunk copied at a time),
+    so 64 MB of blank lines costs milliseconds, not a Python loop per byte.
+    """
+    start, end = 0, len(buffer)
+    while start < end:
+        chunk = buffer[start:min(end, start + TRIM_CHUNK_BYTES)]
+        stripped = chunk.lstrip(WHITESPACE)
+        start += len(chunk) - len(stripped)
+        if stripped:
+            break
+    while end > start:
+        chunk = buffer[max(start, end - TRIM_CHUNK_BYTES):end]
+        stripped = chunk.rstrip(WHITESPACE)
+        end -= len(chunk) - len(stripped)
+        if stripped:
+            break
+    return start, end
+
+class CommandOutput:
+    """Captured bytes of one output stream (stdout or stderr).
+
+    The bytes stay where the capture put them: a bytes object for small outputs, a read-only mmap
+    of a temp file for large ones. Comparisons and searches run on that buffer; the text is decoded
+    (UTF-8, invalid bytes replaced) only when asked for. Like the old text capture, leading and
+    trailing whitespace is not part of the output.
+    """
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap] = b"", total_bytes: Optional[int] = None,
+                 spill_file=None):
+        self.buffer = buffer
+        self.total_bytes = len(buffer) if total_bytes is None else total_bytes # Including dropped bytes
+        self._spill_file = spill_file
+        self._text: Optional[str] = None
+        self.start, self.end = _content_bounds(buffer) # Bounds of the output without surrounding whitespace
+
+    @classmethod
+    def from_text(cls, text: str) -> "CommandOutput":
+        return cls(text.encode("utf-8", errors="replace"))
+
+    @classmethod
+    def concatenate(cls, outputs: List["CommandOutput"]) -> "CommandOutput":
+        """One output made of several, e.g. of the stages of a command. A single output is returned as is;
+        otherwise the parts are copied (with their surrounding whitespace) and closed.
+        """
+        if len(outputs) == 1:
+            return outputs[0]
+        joined = cls(b"".join(bytes(output.buffer) for output in outputs),
+                     sum(output.total_bytes for output in outputs))
+        for output in outputs:
+            output.close()
+        return joined
+
+    @property
+    def size(self) -> int:
+        """Bytes of output, without surrounding whitespace."""
+        return self.end - self.start
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.buffer)
+
+    @property
+    def in_memory(self) -> bool:
+        return self._spill_file is None
+
+    def view(self) -> memoryview:
+        """Zero-copy view of the output bytes."""
+        return memoryview(self.buffer)[self.start:self.end]
+
+    @property
+    def text(self) -> str:
+        """The output decoded as UTF-8, computed on first use."""
+        if self._text is None:
+            self._text = self.decode(self.start, self.end)
+        return self._text
+
+    def decode(self, start: int, end: int) -> str:
+        """Decodes a byte range of the buffer, e.g. the window shown to the learner."""
+        return self.buffer[start:end].decode("utf-8", errors="replace")
+
+    def preview(self, max_bytes: int) -> str:
+        """The first max_bytes of the output, decoded; for reports that only show a snippet."""
+        return self.decode(self.start, min(self.end, self.start + max_bytes))
+
+    def __bool__(self) -> bool:
+        return self.end > self.start
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"CommandOutput({self.size} bytes{', spilled' if not self.in_memory else ''})"
+
+    def equals(self, expected: bytes) -> bool:
+        return self.size == len(expected) and self.view() == expected
+
+    def startswith(self, prefix: bytes) -> bool:
+        return self.size >= len(prefix) and self.buffer[self.start:self.start + len(prefix)] == prefix
+
+    def find(self, needle: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        """Offset of needle within the output (not the buffer), or -1. Works on the buffer in place."""
+        end = self.size if end is None else min(end, self.size)
+        position = self.buffer.find(needle, self.start + start, self.start + end)
+        return -1 if position == -1 else position - self.start
+
+    def rfind(self, needle: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        end = self.size if end is None else min(end, self.size)
+        position = self.buffer.rfind(needle, self.start + start, self.start + end)
+        return -1 if position == -1 else position - self.start
+
+    def __contains__(self, needle: bytes) -> bool:
+        return self.find(needle) != -1
+
+    def count_lines(self) -> int:
+        if not self:
+            return 0
+        if isinstance(self.buffer, bytes):
+            return self.buffer.count(b"\n", self.start, self.end) + 1
+        count = 1
+        for chunk_start in range(self.start, self.end, NEWLINE_COUNT_CHUNK): # Bounded copies out of the map
+            count += self.buffer[chunk_start:min(chunk_start + NEWLINE_COUNT_CHUNK, self.end)].count(b"\n")
+        return count
+
+    def close(self):
+        """Releases the spill file, if any. The object must not be read afterwards."""
+        if self._spill_file is not None:
+            self.buffer.close()
+            self._spill_file.close()
+            self._spill_file = None
+            self.buffer = b""
+            self.start = self.end = 0
+
+class _StreamCapture:
+    """Collects one pipe's bytes in memory and spills them to a temp file past SPOOL_MEMORY_BYTES."""
+
+    def __init__(self, max_bytes: int = MAX_CAPTURE_BYTES):
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.kept = 0
+        self.total = 0
+        self.spill_file = None
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.max_bytes - self.kept
+        if room <= 0:
+            return
+        if len(chunk) > room:
+            chunk = chunk[:room]
+        self.kept += len(chunk)
+        if self.spill_file is None and self.kept > SPOOL_MEMORY_BYTES:
+            self.spill_file = tempfile.TemporaryFile(prefix="cmd-practice-output-")
+            for previous in self.chunks:
+                self.spill_file.write(previous)
+            self.chunks = []
+        if self.spill_file is not None:
+            self.spill_file.write(chunk)
+        else:
+            self.chunks.append(chunk)
+
+    def discard(self):
+        """Drops what was captured without building an output (e.g. after a timeout)."""
+        self.chunks = []
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def result(self) -> CommandOutput:
+        if self.spill_file is None:
+            return CommandOutput(b"".join(self.chunks), self.total)
+        self.spill_file.flush()
+        mapping = mmap.mmap(self.spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return CommandOutput(mapping, self.total, self.spill_file)
+
+def capture_streams(process: subprocess.Popen, fds: List[int], timeout: float) -> Tuple[List[CommandOutput], bool]:
+    """Reads pipes (read ends: the process's stdout and stderr, or extra pipes it writes to) as raw
+    bytes until all of them close or the timeout passes. POSIX only.
+
+    Returns (one output per fd, timed_out). On a timeout the process is left running; the caller kills it,
+    and all outputs are empty: what was captured is dropped without being scanned.
+    """
+    deadline = time.monotonic() + timeout
+    captures = {fd: _StreamCapture() for fd in fds}
+    timed_out = False
+    with selectors.DefaultSelector() as selector:
+        for fd in captures:
+            selector.register(fd, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, READ_CHUNK_BYTES)
+                if chunk:
+                    captures[key.fd].write(chunk)
+                else: # EOF: the command and everything it started closed this pipe
+                    selector.unregister(key.fd)
+    if not timed_out:
+        try:
+            process.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            timed_out = True
+    if timed_out: # The caller reports the timeout instead, so up to 64 MB per stream is never trimmed or mapped
+        for capture in captures.values():
+            capture.discard()
+        return [CommandOutput() for _ in fds], True
+    return [captures[fd].result() for fd in fds], False
+
+def capture_process_output(process: subprocess.Popen, timeout: float) -> Tuple[CommandOutput, CommandOutput, bool]:
+    """Reads a process's stdout and stderr pipes as raw bytes until both close or the timeout passes.
+
+    Returns (stdout, stderr, timed_out). On a timeout the process is left running; the caller kills it,
+    and both outputs are empty: what was captured is dropped without being scanned.
+    """
+    if os.name != "posix": # selectors cannot wait on pipes on Windows
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return CommandOutput(), CommandOutput(), True
+        return CommandOutput(stdout or b""), CommandOutput(stderr or b""), False
+    (stdout, stderr), timed_out = capture_streams(process, [process.stdout.fileno(), process.stderr.fileno()], timeout)
+    return stdout, stderr, timed_out
@@ -1,10 +1,28 @@
 import subprocess
 import shlex
 import os
-import shutil 
+import signal
+import time
 import re 
 from .task_loader import Task 
-from typing import Tuple, List, Any
+from .verdict_cache import VerdictCache, working_directory_state
+from .command_analysis import command_structure_satisfied
+from .profiling import stage
+from .evaluator_plugins import EvaluationContext, run_evaluator, register_evaluator
+from .task_timeouts import DEFAULT_TIMEOUT_SECONDS, task_timeout
+from .isolation import get_isolation_backend
+from .command_output import CommandOutput, capture_process_output, capture_streams
+from .stage_evaluation import (STAGED_METHOD, PlannedStage, pipeline_script, plan_stages, report_skipped, report_stage,
+                               stage_context, stage_failure)
+from typing import Tuple, List, Any, Optional, Dict
+
+# Bump whenever evaluation semantics change, so cached verdicts from older versions are not reused.
+EVALUATOR_VERSION = "8"
+
+PRESCREEN_REJECTION_MESSAGE = "Command not executed: it does not use the command structure this task requires (try 'hint')."
+TIMEOUT_MESSAGE_PREFIX = "Error: Command timed out"
+NORMALIZED_ENV_VAR = "CMD_PRACTICE_NORMALIZED_ENV" # "0" runs commands with the caller's own environment
+EXECUTION_USER = "learner"
 
 # If Task is only needed for evaluate_command tests, MockTask can be self-contained for execute_command tests.
 # For now, let's assume Task might be used by execute_command indirectly or by future tests.
@@ -21,12 +39,40 @@ except ImportError:
     print("Warning: .task_loader.Task not found, MockTask will be a basic object.")
     pass 
 
-def execute_command(command_str: str, working_directory: str = ".") -> Tuple[str, str, int]:
-    """Executes a shell command and returns its stdout, stderr, and return code."""
-    if not command_str: # Handle empty command string
-        return "", "Error: No command entered.", 1
+def execution_environment(working_directory: str) -> Optional[Dict[str, str]]:
+    """The environment commands run with: the same on every host and for every learner, so the
+    same command prints the same bytes. None (inherit everything) if disabled.
 
+    LC_ALL=C fixes sort order, messages and date formats (and makes sort and grep faster);
+    HOME is the working directory, so `~` stays in the sandbox.
+    """
+    if os.environ.get(NORMALIZED_ENV_VAR, "") in ("0", "false", "no"):
+        return None
+    return {
+        "PATH": os.environ.get("PATH", os.defpath),
+        "LC_ALL": "C", "LANG": "C", "TZ": "UTC",
+        "HOME": os.path.abspath(working_directory),
+        "USER": EXECUTION_USER, "LOGNAME": EXECUTION_USER,
+    }
+
+def run_command(command_str: str, working_directory: str = ".",
+                timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Tuple[CommandOutput, CommandOutput, int]:
+    """Executes a shell command and returns its stdout, stderr (as raw-byte CommandOutputs) and return code.
+    stdin is closed, so a stray `cat` or `grep pattern` without a file ends at once instead of waiting.
+    """
+    stdout, stderr, return_code, _ = run_command_with_channels(command_str, working_directory, timeout, [])
+    return stdout, stderr, return_code
+
+def run_command_with_channels(command_str: str, working_directory: str, timeout: float,
+                              channels: List[Tuple[int, int]]) -> Tuple[CommandOutput, CommandOutput, int, List[CommandOutput]]:
+    """Like run_command, for a command that also writes to channels: pipes, as (read end, write end)
+    from os.pipe(), whose write ends it inherits (e.g. as /dev/fd/N). Also returns what was written to
+    each channel (nothing after a timeout). POSIX only; the pipes are closed afterwards.
+    """
+    open_fds = [fd for channel in channels for fd in channel]
     try:
+        if not command_str: # Handle empty command string
+            return CommandOutput(), CommandOutput(b"Error: No command entered."), 1, [CommandOutput() for _ in channels]
         # Ensure working directory exists, or default to current if not specified or invalid
         if not os.path.isdir(working_directory):
             print(f"Warning: Working directory '{working_directory}' not found. Using current directory instead.")
@@ -34,174 +80,186 @@ def execute_command(command_str: str, working_directory: str = ".") -> Tuple[str
         else:
             cwd = working_directory
 
-        process = subprocess.run(
-            command_str, 
-            shell=True, # Using shell=True to allow pipes, redirection, etc.
-            capture_output=True, 
-            text=True, 
+        # Namespace isolation (when available) wraps the command in `unshare ... sh -c`; otherwise
+        # shell=True runs it directly, to allow pipes, redirection, etc.
+        args, use_shell = get_isolation_backend().wrap(command_str, cwd)
+        with subprocess.Popen(
+            args,
+            shell=use_shell,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
             cwd=cwd, # Set the working directory
-            timeout=10 # Add a timeout to prevent hanging commands
-        )
-        return process.stdout.strip(), process.stderr.strip(), process.returncode
-    except subprocess.TimeoutExpired:
-        return "", "Error: Command timed out.", 1 # Arbitrary non-zero return code
+            env=execution_environment(cwd),
+            pass_fds=[write_end for _, write_end in channels],
+            start_new_session=True # Own process group, so a timeout can kill the whole pipeline
+        ) as process:
+            for _, write_end in channels: # Only the command holds them now, so each channel ends when it is done with it
+                os.close(write_end)
+                open_fds.remove(write_end)
+            # Raw bytes, spilled to a temp file when large; nothing is decoded until someone asks
+            if channels:
+                outputs, timed_out = capture_streams(
+                    process, [process.stdout.fileno(), process.stderr.fileno()] + [read_end for read_end, _ in channels], timeout)
+                stdout, stderr, channel_outputs = outputs[0], outputs[1], outputs[2:]
+            else:
+                stdout, stderr, timed_out = capture_process_output(process, timeout) # Prevents hanging commands
+                channel_outputs = []
+            if timed_out:
+                # Killing only the shell would leave e.g. `tail -f log | grep x` running and holding the pipes.
+                # Under namespace isolation, killing unshare also kills everything in the command's PID namespace.
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+                process.wait()
+                # Arbitrary non-zero return code
+                return (CommandOutput(), CommandOutput(f"{TIMEOUT_MESSAGE_PREFIX} after {timeout:g}s.".encode()), 1,
+                        channel_outputs)
+        return stdout, stderr, process.returncode, channel_outputs
     except FileNotFoundError: # This might occur if the command itself is not found and shell=False
-        return "", f"Error: Command or program not found: {shlex.split(command_str)[0]}", 127
+        return (CommandOutput(), CommandOutput(f"Error: Command or program not found: {shlex.split(command_str)[0]}".encode()), 127,
+                [CommandOutput() for _ in channels])
     except Exception as e:
-        return "", f"Error executing command: {e}", 1
-
-def evaluate_command(user_command: str, task: Task) -> Tuple[bool, str, str]:
+        return CommandOutput(), CommandOutput(f"Error executing command: {e}".encode()), 1, [CommandOutput() for _ in channels]
+    finally:
+        for fd in open_fds:
+            os.close(fd)
+
+def execute_command(command_str: str, working_directory: str = ".",
+                    timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Tuple[str, str, int]:
+    """Like run_command, with stdout and stderr decoded to text."""
+    stdout, stderr, return_code = run_command(command_str, working_directory, timeout)
+    return stdout.text, stderr.text, return_code
+
+def run_stage_pipeline(commands: List[str], working_directory: str,
+                       timeout: float) -> List[Tuple[CommandOutput, CommandOutput, int]]:
+    """Runs stages the learner joined with `|` as the one pipeline they are, so a consumer that stops
+    early (`yes | head`) stops its producer as in the shell, and no output is held between stages.
+    Every stage but the last also writes its output, stderr and exit status to channels of its own.
+    Returns (stdout, stderr, return code) per stage; after a timeout, each has the timeout message.
     """
-    Evaluates the user's command against the task's criteria.
-    Returns: (is_correct, actual_stdout, actual_stderr)
+    if len(commands) == 1:
+        return [run_command(commands[0], working_directory, timeout)]
+    channels = [os.pipe() for _ in range(3 * (len(commands) - 1))]
+    write_ends = [write_end for _, write_end in channels]
+    stage_channels = [tuple(write_ends[i:i + 3]) for i in range(0, len(write_ends), 3)]
+    stdout, stderr, return_code, outputs = run_command_with_channels(
+        pipeline_script(commands, stage_channels), working_directory, timeout, channels)
+    if stderr.startswith(TIMEOUT_MESSAGE_PREFIX.encode()):
+        return [(CommandOutput(), stderr, return_code) for _ in commands]
+    results = []
+    for i in range(0, len(outputs), 3):
+        stage_stdout, stage_stderr, status = outputs[i:i + 3]
+        results.append((stage_stdout, stage_stderr, int(status.text) if status.text.isdigit() else 1))
+    return results + [(stdout, stderr, return_code)]
+
+def run_stages(task: Task, plan: List[PlannedStage],
+               timeout: float) -> Tuple[bool, CommandOutput, CommandOutput]:
+    """Runs a staged task's command part by part, checking each stage as soon as its part completes.
+
+    Stages joined by `|` run together, as a real pipeline (see run_stage_pipeline); a stage after `&&`
+    runs only if the previous one succeeded. The first failing stage ends the attempt: later stages
+    are not checked, and the parts after it not run. All parts share the task's timeout. Returns what
+    the learner sees: the output of the stages checked (without the output piped on) and their stderr.
     """
-    actual_stdout, actual_stderr, return_code = execute_command(
-        user_command, 
-        task.input_details.get("working_directory", ".")
-    )
-
-    command_structure_ok = True
-    command_checks = task.evaluation.get("check_command_contains")
-    if command_checks and isinstance(command_checks, list): # Ensure it's a list
-        for check_item in command_checks:
-            if not isinstance(check_item, dict): # Ensure item is a dict
-                continue
-            substring = check_item.get("substring")
-            is_optional = check_item.get("optional", False)
-            use_regex = check_item.get("is_regex", False)
-
-            if not substring: # Skip if substring is not defined
+    working_directory = task.input_details.get("working_directory", ".")
+    deadline = time.monotonic() + timeout
+    shown_stdout: List[CommandOutput] = []
+    shown_stderr: List[CommandOutput] = []
+    failure = None
+    start = 0
+    while start < len(plan) and failure is None:
+        end = start
+        while plan[end].connector == "|": # The last stage's connector is ""
+            end += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timeout_message = f"{TIMEOUT_MESSAGE_PREFIX} after {timeout:g}s.".encode()
+            results = [(CommandOutput(), CommandOutput(timeout_message), 1) for _ in plan[start:end + 1]]
+        else:
+            with stage(f"execute_command.stage{start + 1}"):
+                results = run_stage_pipeline([planned.command for planned in plan[start:end + 1]], working_directory, remaining)
+        for index, (stdout, stderr, return_code) in enumerate(results, start):
+            if failure is not None: # Ran in the same pipeline as the failing stage, but not checked
+                report_skipped(index, len(plan), plan[index].name)
+                stdout.close()
+                stderr.close()
                 continue
-
-            found = False
-            if use_regex:
-                if re.search(substring, user_command):
-                    found = True
-            else:
-                if substring in user_command:
-                    found = True
-            
-            if not found and not is_optional:
-                command_structure_ok = False
-                break
-
-    eval_method = task.evaluation.get("method")
-    expected_stdout = task.evaluation.get("expected_stdout", "")
-    # Normalize expected_stdout newlines if they were escaped in JSON
-    if isinstance(expected_stdout, str):
-        expected_stdout = expected_stdout.replace('\\n', '\n').strip()
-
-    is_correct = False # Initialize is_correct
-
-    if eval_method == "exact_match":
-        # For exact match, we usually expect no errors and specific stdout
-        exact_match_output_conditions_met = False
-        if return_code == 0 and actual_stdout == expected_stdout and not actual_stderr:
-            exact_match_output_conditions_met = True
-        # Allow for tasks that expect specific stderr
-        elif return_code !=0 and task.evaluation.get("expected_stderr") and actual_stderr == task.evaluation.get("expected_stderr") and actual_stdout == expected_stdout:
-             exact_match_output_conditions_met = True
-        elif return_code == 0 and actual_stdout == expected_stdout and task.evaluation.get("allow_stderr_if_stdout_matches", False):
-            exact_match_output_conditions_met = True
-        
-        if exact_match_output_conditions_met and command_structure_ok: # Combine with command structure check
-            is_correct = True
-
-    elif eval_method == "contains_substring":
-        # For contains_substring, we primarily check stdout. Stderr might be ignored or checked separately.
-        contains_substring_output_conditions_met = False
-        if return_code == 0: # Usually expect success for this
-            expected_stdout_substrings: List[str] = task.evaluation.get("expected_stdout_substrings", [])
-            
-            if not expected_stdout_substrings: # If no output substrings to check, command success is enough for this part
-                contains_substring_output_conditions_met = True
+            planned = plan[index]
+            shown_stderr.append(stderr)
+            if stderr.startswith(TIMEOUT_MESSAGE_PREFIX.encode()):
+                failure = "timed out"
             else:
-                all_output_substrings_found = True
-                for sub in expected_stdout_substrings:
-                    if sub not in actual_stdout:
-                        all_output_substrings_found = False
-                        break
-                if all_output_substrings_found: # This implies expected_stdout_substrings is not empty
-                    contains_substring_output_conditions_met = True
-            
-        if contains_substring_output_conditions_met and command_structure_ok: # Combine with command structure check
-            is_correct = True
-    
-    elif eval_method == "complex_script_evaluation": 
-        filesystem_conditions_met = False # Assume false until proven true
-        stdout_condition_met = False
-        stderr_condition_met = False
-
-        # 1. Filesystem check
-        eval_config = task.evaluation
-        fs_check_config = eval_config.get("check_destination_dir_contents")
-        
-        if fs_check_config and isinstance(fs_check_config, dict):
-            working_dir = task.input_details.get("working_directory", ".")
-            # For this task, the target directory to check is 'data/destination_dir'
-            # This could be generalized by adding a "target_dir" field to fs_check_config in the JSON
-            target_dir_name = "data/destination_dir" # Specific to current task structure
-            full_target_dir_path = os.path.join(working_dir, target_dir_name)
-
-            if not os.path.isdir(full_target_dir_path):
-                print(f"Evaluator: Target directory for checks '{full_target_dir_path}' does not exist.")
-                filesystem_conditions_met = False
+                with stage(f"evaluate.stage{index + 1}"):
+                    context = stage_context(EvaluationContext(task, planned.command, stdout, stderr, return_code), planned.config)
+                    failure = stage_failure(context, must_succeed=planned.connector in ("&&", ""))
+            report_stage(index, len(plan), planned.name, failure)
+            if failure is not None or planned.connector != "|":
+                shown_stdout.append(stdout)
             else:
-                actual_files_in_target_dir = os.listdir(full_target_dir_path)
-                
-                expected_files_ok = True
-                expected_file_paths = fs_check_config.get("expected_files", [])
-                if not expected_file_paths: # If empty, it's trivially true for this part
-                    pass
-                else:
-                    for item_path in expected_file_paths:
-                        basename_to_check = os.path.basename(item_path)
-                        if basename_to_check not in actual_files_in_target_dir:
-                            expected_files_ok = False
-                            # print(f"Evaluator: Expected file '{basename_to_check}' not found in '{full_target_dir_path}'.")
-                            break
-                
-                unexpected_files_ok = True
-                if expected_files_ok: # Only proceed if expected files were okay
-                    unexpected_file_paths = fs_check_config.get("unexpected_files", [])
-                    if not unexpected_file_paths: # If empty, it's trivially true
-                        pass
-                    else:
-                        for item_path in unexpected_file_paths:
-                            basename_to_check = os.path.basename(item_path)
-                            if basename_to_check in actual_files_in_target_dir:
-                                unexpected_files_ok = False
-                                # print(f"Evaluator: Unexpected file '{basename_to_check}' found in '{full_target_dir_path}'.")
-                                break
-                
-                if expected_files_ok and unexpected_files_ok:
-                    filesystem_conditions_met = True
-        else:
-            # If no fs_check_config, consider it passing this condition, or decide if it should be mandatory
-            filesystem_conditions_met = True # Or False if this check is mandatory for this method
-
-        # 2. Stdout check (using regex pattern)
-        expected_stdout_pattern = eval_config.get("expected_stdout_pattern", "")
-        if expected_stdout_pattern:
-            # Using re.MULTILINE if pattern is expected to span multiple lines, which is common for ls output.
-            # Using re.DOTALL if '.' should match newlines, but usually not needed for line-based patterns.
-            if re.search(expected_stdout_pattern, actual_stdout, re.MULTILINE):
-                stdout_condition_met = True
-        elif not actual_stdout: # If no pattern and no stdout, it's a match for stdout.
-            stdout_condition_met = True
-
-
-        # 3. Stderr check
-        expected_stderr = eval_config.get("expected_stderr", "")
-        if actual_stderr == expected_stderr:
-            stderr_condition_met = True
-
-        # 4. Final correctness
-        if command_structure_ok and filesystem_conditions_met and stdout_condition_met and stderr_condition_met:
-            is_correct = True
+                stdout.close()
+        start = end + 1
+    for skipped_index in range(start, len(plan)): # Parts not run
+        report_skipped(skipped_index, len(plan), plan[skipped_index].name)
+    return failure is None, CommandOutput.concatenate(shown_stdout), CommandOutput.concatenate(shown_stderr)
+
+def evaluate_command(user_command: str, task: Task, verdict_cache: Optional[VerdictCache] = None,
+                     timeout: Optional[float] = None) -> Tuple[bool, CommandOutput, CommandOutput]:
+    """
+    Evaluates the user's command against the task's criteria.
+    Commands failing a mandatory check_command_contains item are rejected before execution.
+    If a verdict_cache is given and the task is deterministic, identical submissions against the same
+    working directory contents are served from it; commands that change the directory are never cached.
+    The command runs with the task's timeout (see task_timeouts.task_timeout) unless timeout is given.
+    Returns: (is_correct, actual_stdout, actual_stderr); use .text on the outputs for strings.
+    """
+    # Static pre-screen: a command missing a mandatory part is rejected without being executed
+    with stage("evaluate.prescreen"):
+        command_structure_ok = command_structure_satisfied(user_command, task.evaluation.get("check_command_contains"))
+    if not command_structure_ok:
+        return False, CommandOutput(), CommandOutput.from_text(PRESCREEN_REJECTION_MESSAGE)
+
+    cache_key = working_state = None
+    if verdict_cache is not None and task.deterministic:
+        with stage("evaluate.verdict_cache"):
+            # The working directory is not reset between attempts (an earlier `rm` sticks), so
+            # the key includes what this command will actually find there
+            working_state = working_directory_state(task.input_details.get("working_directory", "."))
+            cache_key = verdict_cache.make_key(task, user_command, EVALUATOR_VERSION, working_state)
+            cached_verdict = verdict_cache.get(cache_key)
+        if cached_verdict is not None:
+            is_correct, cached_stdout, cached_stderr = cached_verdict
+            return is_correct, CommandOutput.from_text(cached_stdout), CommandOutput.from_text(cached_stderr)
 
-    # Add more evaluation methods here as needed (e.g., regex_match, script_check)
-    # For script_check, you might run another script that takes user_stdout and returns true/false
+    eval_method = task.evaluation.get("method")
+    # Multi-stage tasks run the command stage by stage when it splits into the task's stages
+    # (on POSIX hosts, where the stages of a pipeline pass their output on through extra pipes)
+    stage_plan = None
+    if eval_method == STAGED_METHOD and os.name == "posix":
+        stage_plan = plan_stages(user_command, task.evaluation.get("stages") or [])
+    if stage_plan is not None:
+        is_correct, actual_stdout, actual_stderr = run_stages(
+            task, stage_plan, task_timeout(task) if timeout is None else timeout)
+    else:
+        with stage("execute_command"):
+            actual_stdout, actual_stderr, return_code = run_command(
+                user_command, 
+                task.input_details.get("working_directory", "."),
+                task_timeout(task) if timeout is None else timeout
+            )
+
+        # Evaluation methods are in-process plugins (see evaluator_plugins.py); the mandatory
+        # command structure checks already passed in the pre-screen above.
+        with stage(f"evaluate.{eval_method}"):
+            is_correct = run_evaluator(eval_method, EvaluationContext(task, user_command, actual_stdout, actual_stderr, return_code))
+
+    # A timeout says more about the host's load than about the command, so it is never cached.
+    # Neither is a command that changed the working directory: served from the cache, it would
+    # not make its changes, and the learner's files would no longer match the verdict.
+    if (cache_key is not None and not actual_stderr.startswith(TIMEOUT_MESSAGE_PREFIX.encode())
+            and working_directory_state(task.input_details.get("working_directory", ".")) == working_state):
+        verdict_cache.put(cache_key, (is_correct, actual_stdout.text, actual_stderr.text))
 
     return is_correct, actual_stdout, actual_stderr
 
@@ -215,7 +273,10 @@ if __name__ == '__main__':
     print(f"Cmd: nonexistentcommand -> Stdout: '{stdout}', Stderr: '{stderr}', Retcode: {retcode}")
 
     print("\n--- Testing rm dry-run with globbing ---")
-    test_dir = os.path.join("data", "rm_test_dir")
+    # A managed sandbox instead of data/: discarded below, deleted by the reaper even if this run crashes
+    from .task_setup import SANDBOX_MANAGER
+    rm_test_sandbox = SANDBOX_MANAGER.create("cmd-practice-rm-test-")
+    test_dir = os.path.join(rm_test_sandbox, "rm_test_dir")
     subdir_path = os.path.join(test_dir, "subdir")
 
     # Setup test directory and files
@@ -258,12 +319,8 @@ if __name__ == '__main__':
         print(f"Retcode: {retcode}")
 
     # Teardown test directory
-    try:
-        if os.path.exists(test_dir):
-            shutil.rmtree(test_dir)
-            print(f"\nTest teardown: Removed directory {test_dir}")
-    except Exception as e:
-        print(f"Error during test teardown: {e}")
+    SANDBOX_MANAGER.discard(rm_test_sandbox)
+    print(f"\nTest teardown: Discarded sandbox {rm_test_sandbox}")
 
     # Create a dummy Task object for testing evaluate_command
     class MockTask(Task):
@@ -315,4 +372,279 @@ if __name__ == '__main__':
     print(f"Test 6 (Exact Match Newline): Correct={correct}, Out='{out}', Err='{err}'")
     assert correct == True
 
+    # Test 7: Verdict cache serves repeated submissions without re-executing
+    import shutil
+    import tempfile
+    from .task_setup import setup_task_environment
+    memory_only_cache = VerdictCache(cache_dir=None)
+    cache_dir = tempfile.mkdtemp(prefix="cmd-practice-cache-test-")
+    task7 = MockTask("test7", "Test Head", "", "", "", [{"action": "create_file", "path": "sample1.txt", "content": "a\nb\nc\nd"}],
+                     {"working_directory": cache_dir}, {"method": "exact_match", "expected_stdout": "a\\nb\\nc"}, [])
+    setup_task_environment(task7)
+    first = evaluate_command("  head -n 3 sample1.txt ", task7, memory_only_cache)
+    second = evaluate_command("head -n 3 sample1.txt", task7, memory_only_cache) # Same command after trimming
+    print(f"Test 7 (Verdict Cache): First={first[0]}, '{first[1]}', Second={second[0]}, '{second[1]}', Stats={memory_only_cache.stats()}")
+    assert [first[0], first[1].text, first[2].text] == [second[0], second[1].text, second[2].text] and memory_only_cache.hits == 1
+    assert first[0] == True
+    # Spacing inside a command is part of its words, so these two never share a verdict
+    task7_words = MockTask("test7w", "Test Words", "", "", "", [], {"working_directory": cache_dir},
+                           {"method": "exact_match", "expected_stdout": "x yz"}, [])
+    joined = evaluate_command("echo 'x y'z", task7_words, memory_only_cache)
+    split = evaluate_command("echo 'x y' z", task7_words, memory_only_cache)
+    print(f"Test 7 (Verdict Cache, quoted words): joined={joined[0]}, '{joined[1]}', split={split[0]}, '{split[1]}'")
+    assert joined[0] == True and split[0] == False and split[1].text == "x y z"
+
+    # Test 7b: A learner's command that changes the shared directory is never cached, and a verdict
+    # computed against the changed directory is never served once setup has restored it
+    mutating = evaluate_command("rm sample1.txt; head -n 3 sample1.txt", task7, memory_only_cache)
+    after_rm = evaluate_command("head -n 3 sample1.txt", task7, memory_only_cache)
+    assert mutating[0] == False and after_rm[0] == False and "sample1.txt" in after_rm[2].text
+    setup_task_environment(task7) # The next learner gets a fresh setup
+    restored = evaluate_command("head -n 3 sample1.txt", task7, memory_only_cache)
+    evaluate_command("rm sample1.txt; head -n 3 sample1.txt", task7, memory_only_cache)
+    print(f"Test 7b (Verdict Cache, mutated directory): after rm={after_rm[0]}, restored={restored[0]}, rm re-run removed file={not os.path.exists(os.path.join(cache_dir, 'sample1.txt'))}")
+    assert restored[0] == True and restored[1].text == "a\nb\nc"
+    assert not os.path.exists(os.path.join(cache_dir, "sample1.txt")) # The rm ran again instead of being served
+    shutil.rmtree(cache_dir)
+
+    # Test 8: Structural pre-screen rejects without executing
+    task5_eval = {"method": "exact_match", "expected_stdout": "1",
+                  "check_command_contains": [{"command": "grep", "flag": "-c"}]}
+    task5 = MockTask("test5", "Test Grep Count", "", "", "", [], {"working_directory": "data"}, task5_eval, [])
+    correct, out, err = evaluate_command("grep apple words_and_numbers.csv | wc -l", task5)
+    print(f"Test 8 (Pre-screen Reject): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == False and err.text == PRESCREEN_REJECTION_MESSAGE
+    correct, out, err = evaluate_command("grep -ic apple words_and_numbers.csv", task5)
+    print(f"Test 9 (Pre-screen Bundled Flag): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == True
+    correct, out, err = evaluate_command("grep --count apple words_and_numbers.csv", task5)
+    print(f"Test 9b (Pre-screen Long Option): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == True
+    assert not command_structure_satisfied("head -n3 words_and_numbers.csv", [{"command": "head", "flag": "-3"}]) # A value, not a flag
+
+    # Test 10: A registered in-process plugin evaluates the captured output
+    @register_evaluator("test_line_count")
+    def line_count_plugin(context):
+        return len(context.stdout.splitlines()) == context.config["lines"]
+    task7 = MockTask("test7", "Test Plugin", "", "", "", [], {"working_directory": "."},
+                     {"method": "test_line_count", "lines": 2}, [])
+    correct, out, err = evaluate_command("printf 'a\\nb\\n'", task7)
+    print(f"Test 10 (Evaluator Plugin): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == True
+
+    # Test 11: stdin is closed and the task's timeout applies
+    task8 = MockTask("test8", "Test Timeout", "", "", "", [], {"working_directory": ".", "timeout_seconds": 0.5},
+                     {"method": "exact_match", "expected_stdout": ""}, [])
+    correct, out, err = evaluate_command("cat", task8) # Would wait forever on an open stdin
+    print(f"Test 11a (Closed stdin): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == True
+    started = time.perf_counter()
+    correct, out, err = evaluate_command("sleep 5 | cat", task8)
+    print(f"Test 11b (Task Timeout): Correct={correct}, Out='{out}', Err='{err}'")
+    assert correct == False and err.text.startswith(TIMEOUT_MESSAGE_PREFIX) and time.perf_counter() - started < 2
+
+    # Test 12: under namespace isolation only the sandbox is writable and the network is loopback-only
+    if get_isolation_backend().name == "namespaces":
+        stdout, stderr, rc = execute_command("touch isolation_probe && rm isolation_probe && echo $$", "data")
+        print(f"Test 12a (Isolated sandbox): STDOUT='{stdout}', RC={rc}")
+        assert rc == 0 and stdout == "1" # The command's shell is PID 1 of its own PID namespace
+        stdout, stderr, rc = execute_command("touch ../isolation_escape", "data")
+        print(f"Test 12b (Read-only outside sandbox): STDERR='{stderr}', RC={rc}")
+        assert rc != 0 and not os.path.exists("isolation_escape")
+    else:
+        print("Test 12 (Isolation): skipped, namespace isolation is not available here.")
+
+    # Test 13: output is captured as raw bytes; invalid UTF-8 survives and large output spills to disk
+    stdout, stderr, rc = run_command("printf 'ok\\377\\n'")
+    print(f"Test 13a (Raw Bytes): {bytes(stdout.view())!r} -> '{stdout.text}'")
+    assert bytes(stdout.view()) == b"ok\xff" and stdout.text == "ok\ufffd"
+    stdout, stderr, rc = run_command("head -c 3000000 /dev/zero | tr '\\0' 'x'; echo; echo END")
+    print(f"Test 13b (Spilled Output): {stdout!r}, {stdout.count_lines()} lines, ends with END={stdout.rfind(b'END') == stdout.size - 3}")
+    assert not stdout.in_memory and stdout.size == 3000004 and stdout.count_lines() == 2 and b"xEND" not in stdout
+    stdout.close()
+    started = time.perf_counter()
+    stdout, stderr, rc = run_command("head -c 16000000 /dev/zero | tr '\\0' '\\n'") # Only whitespace: trimmed in C-speed chunks
+    print(f"Test 13c (Blank Output): {stdout!r} in {time.perf_counter() - started:.2f}s")
+    assert not stdout and stdout.total_bytes == 16000000 and time.perf_counter() - started < 1.5
+    stdout.close()
+
+    # Test 14: Author regexes run in the linear-time engine, so a backtracking bomb returns at once
+    task14 = MockTask("test14", "Test Regex", "", "", "", [], {"working_directory": "."},
+                      {"method": "complex_script_evaluation", "expected_stdout_pattern": "^(a+)+$"}, [])
+    started = time.perf_counter()
+    correct, out, err = evaluate_command("printf 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa!'", task14)
+    print(f"Test 14 (Linear Regex): Correct={correct}, {time.perf_counter() - started:.3f}s")
+    assert correct == False and time.perf_counter() - started < 1
+
+    # Test 14b: Long texts are searched in the killable worker: with `re` unless the pattern can backtrack exponentially
+    from .safe_regex import compile_pattern, INLINE_SEARCH_CHARS
+    listing_pattern, bomb_pattern = compile_pattern(r"total .*\n.* app\.log", re.MULTILINE), compile_pattern("^(a+)+$", re.MULTILINE)
+    started = time.perf_counter()
+    found = listing_pattern.search("total 8\n" * INLINE_SEARCH_CHARS + "-rw-r--r-- 1 u u 0 Jan 1 00:00 app.log\n")
+    bombed = bomb_pattern.search("a" * 4 * INLINE_SEARCH_CHARS + "!")
+    print(f"Test 14b (Long Regex Input): engines={listing_pattern.engine}/{bomb_pattern.engine}, found={found}, bombed={bombed}, {time.perf_counter() - started:.3f}s")
+    assert (listing_pattern.engine, bomb_pattern.engine) == ("re", "linear")
+    assert found and not bombed and time.perf_counter() - started < 2
+
+    # Test 15: Sandbox lifecycle: discarded and abandoned sandboxes are reaped, templates evicted over quota
+    import shutil
+    import tempfile
+    from .fixture_store import FixtureStore, reflink_supported
+    from .sandbox_manager import SandboxManager
+    manager_root = tempfile.mkdtemp(prefix="cmd-practice-manager-test-")
+    manager = SandboxManager(os.path.join(manager_root, "sandboxes"), quota_bytes=100)
+    store = FixtureStore(os.path.join(manager_root, "fixtures"))
+    manager.track_fixture_store(store)
+    os.makedirs(manager.root)
+    manager.discard(tempfile.mkdtemp(prefix=f"test-{os.getpid()}-", dir=manager.root)) # As create(), without the reaper thread
+    os.makedirs(os.path.join(manager.root, "test-999999999-dead")) # Owner pid that cannot exist
+    fixture_tasks = [MockTask(f"test15_{i}", "Fixture", "", "", "", [{"action": "create_file", "path": "f.txt", "content": str(i) * 80}],
+                              {"working_directory": "."}, {}, []) for i in range(2)]
+    first_template = store.template_dir(fixture_tasks[0])
+    os.utime(first_template, (1, 1)) # Least recently used
+    store.template_dir(fixture_tasks[1])
+    manager.reap_once()
+    print(f"Test 15 (Sandbox Manager): left={sorted(os.listdir(manager.root))}, templates={len(store.templates())}, stats={manager.stats()}")
+    assert os.listdir(manager.root) == [] and not os.path.exists(first_template) and len(store.templates()) == 1
+    assert manager.stats()["evicted"] == 1 and manager.stats()["abandoned_reaped"] == 1
+    assert manager.stats()["fixture_bytes"] == 80 # Only the template left after the eviction
+    # Test 15b: Sandbox files are reflinks (never hardlinks) of the template, or written directly where
+    # the filesystem cannot reflink; either way writing to one cannot change the template
+    template_file = os.path.join(store.template_dir(fixture_tasks[1]), "f.txt")
+    sandbox_file = os.path.join(manager_root, "sandbox-f.txt")
+    installed = store.install_file(fixture_tasks[1], "f.txt", sandbox_file)
+    print(f"Test 15b (Template Isolation): installed={installed}, reflinks supported={reflink_supported(store.root)}, links={store.link_counts}")
+    assert installed == reflink_supported(store.root) and os.path.exists(sandbox_file) == installed
+    if installed:
+        with open(sandbox_file, "w") as f:
+            f.write("") # As `: > f.txt`, which root can do even to a read-only inode
+        os.utime(sandbox_file, (1, 1))
+        assert os.stat(template_file).st_ino != os.stat(sandbox_file).st_ino
+    assert os.path.getsize(template_file) == 80 and os.stat(template_file).st_mtime != 1
+    shutil.rmtree(manager_root)
+
+    # Test 16: Normalized environment and pinned fixture times: the same command prints the same bytes
+    from .task_setup import setup_task_environment, FIXED_FIXTURE_TIME
+    pinned_dir = tempfile.mkdtemp(prefix="cmd-practice-pinned-test-")
+    task16 = MockTask("test16", "Pinned", "", "", "", [{"action": "create_file", "path": "a.txt", "content": "a"},
+                                                     {"action": "create_file", "path": "old.txt", "content": "b", "last_modified_days_ago": 1},
+                                                     {"action": "create_file", "path": "set.txt", "content": "c", "mtime": "2024-02-01T12:00:00Z"}],
+                      {"working_directory": pinned_dir}, {}, [])
+    setup_task_environment(task16)
+    stdout, stderr, retcode = execute_command("echo $LC_ALL $TZ $USER; ls -lt --time-style=+%F | tail -n +2 | awk '{print $6, $7}'", pinned_dir)
+    print(f"Test 16 (Deterministic Setup): {stdout!r}")
+    assert stdout == "C UTC learner\n2024-02-01 set.txt\n2024-01-01 a.txt\n2023-12-31 old.txt"
+    assert os.stat(os.path.join(pinned_dir, "a.txt")).st_mtime == FIXED_FIXTURE_TIME
+    shutil.rmtree(pinned_dir)
+
+    # Test 17: Staged task: each stage is checked as it completes, later stages are skipped after a failure
+    task17 = MockTask("test17", "Staged", "", "", "", [], {"working_directory": "."},
+                      {"method": "staged", "stages": [{"name": "numbers", "command": "seq", "expected_stdout": "1\\n2\\n3"},
+                                                      {"name": "sum", "expected_stdout": "6", "expected_stderr": ""}]}, [])
+    correct, out, err = evaluate_command("seq 3 | awk '{sum += $1} END {print sum}'", task17)
+    print(f"Test 17a (Staged, correct): Correct={correct}, Output='{out}'")
+    assert correct == True and out.text == "6"
+    correct, out, err = evaluate_command("seq 4 | awk '{sum += $1} END {print sum}'", task17)
+    print(f"Test 17b (Staged, first stage wrong): Correct={correct}, Output='{out}'")
+    assert correct == False and out.text == "1\n2\n3\n4" # The failing stage's output, not the final one
+    correct, out, err = evaluate_command("echo 6", task17)
+    print(f"Test 17c (Staged, not splittable): Correct={correct}, Output='{out}'")
+    assert correct == True
+    # Stages joined by `|` run as the real pipeline: `head` stops `yes`, and no stage's output is capped on its way on
+    task17d = MockTask("test17d", "Staged pipelines", "", "", "", [], {"working_directory": "."},
+                       {"method": "staged", "stages": [{"name": "ys", "command": "yes"}, {"name": "first", "command": "head", "expected_stdout": "y\\ny"},
+                                                       {"name": "numbers", "command": "seq"}, {"name": "count", "expected_stdout": "10000000"}]}, [])
+    started = time.monotonic()
+    correct, out, err = evaluate_command("yes | head -n 2 && seq 10000000 | wc -l", task17d)
+    print(f"Test 17d (Staged, real pipelines): Correct={correct}, Output='{out}', {time.monotonic() - started:.2f}s")
+    assert correct == True and out.text == "y\ny\n10000000"
+
+    # Test 18: A task file added mid-session reaches the index, and a session whose selection it matches
+    import json
+    from . import safe_regex
+    from .task_catalog import TaskCatalog
+    from .task_query import CatalogTaskIndex, matching_tasks, parse_query
+    bank_dir = tempfile.mkdtemp(prefix="cmd-practice-bank-test-")
+    def write_task(task_id: str, command: str, pattern: str):
+        with open(os.path.join(bank_dir, task_id + ".json"), "w") as f:
+            json.dump({"id": task_id, "title": task_id, "description": "", "command_to_practice": command,
+                       "example_solution": command, "difficulty": "easy", "setup_files": [], "hints": [],
+                       "input_details": {"working_directory": "."},
+                       "evaluation": {"method": "exact_match", "expected_stdout_pattern": pattern}}, f)
+    write_task("bank_ls", "ls", "^ls-before$")
+    catalog = TaskCatalog(bank_dir)
+    live_index = CatalogTaskIndex(catalog)
+    catalog.add_listener(lambda changed_ids, removed_ids: safe_regex.retain_task_patterns(catalog.tasks()))
+    session_tasks = live_index.index.query("commands=grep")
+    selection = parse_query("commands=grep")
+    catalog.add_listener(lambda changed_ids, removed_ids: session_tasks.extend(
+        matching_tasks([catalog.get(task_id) for task_id in changed_ids], selection)))
+    write_task("bank_grep", "grep", "^grep-added$")
+    write_task("bank_ls", "ls", "^ls-after$") # Edited: the old pattern is no longer compiled
+    os.utime(os.path.join(bank_dir, "bank_ls.json"), ns=(1, 1)) # A different mtime even on coarse clocks
+    print(f"Test 18 (Task Added Mid-Session): changed={catalog.refresh()}, session={[task.id for task in session_tasks]}")
+    assert [task.id for task in live_index.index.query("commands=grep")] == ["bank_grep"]
+    assert [task.id for task in session_tasks] == ["bank_grep"]
+    assert ("^ls-after$", re.MULTILINE) in safe_regex._compiled and ("^ls-before$", re.MULTILINE) not in safe_regex._compiled
+    with open(os.path.join(bank_dir, "bank_ls.json"), "w") as f:
+        f.write('{"id": "bank_ls", "title"') # Caught mid-write: the last good task stays, and the file is retried
+    torn_refresh = catalog.refresh()
+    write_task("bank_ls", "ls", "^ls-final$")
+    os.utime(os.path.join(bank_dir, "bank_ls.json"), ns=(2, 2))
+    print(f"Test 18b (Torn Task File): torn={torn_refresh}, then={catalog.refresh()}")
+    assert torn_refresh == ([], []) and catalog.get("bank_ls").evaluation["expected_stdout_pattern"] == "^ls-final$"
+    shutil.rmtree(bank_dir)
+
+    # Test 19: A lazy catalog keeps setup contents on disk; a task's sandbox copy reads them for itself only
+    from .task_loader import _NOT_LOADED
+    from .task_setup import private_task_sandbox
+    lazy_task = TaskCatalog(lazy=True).get("awk_extract_column_01")
+    with private_task_sandbox(lazy_task, "cmd-practice-lazy-test-") as sandbox_task:
+        setup_task_environment(sandbox_task)
+        created = os.listdir(sandbox_task.input_details["working_directory"])
+    print(f"Test 19 (Lazy Catalog): created={'students.csv' in created}, released={lazy_task._setup_files is _NOT_LOADED}")
+    assert "students.csv" in created and lazy_task._setup_files is _NOT_LOADED
+    import copy
+    from .task_setup import SANDBOX_MANAGER
+    escaping_dirs = []
+    for working_directory in ("/cmd-practice-absolute-test", "../cmd-practice-parent-test"):
+        escaping_task = copy.copy(lazy_task)
+        escaping_task.input_details = dict(lazy_task.input_details, working_directory=working_directory)
+        with private_task_sandbox(escaping_task, "cmd-practice-escape-test-") as sandbox_task:
+            escaping_dirs.append(sandbox_task.input_details["working_directory"])
+    print(f"Test 19b (Sandbox Working Directory): {escaping_dirs}")
+    assert all(path.startswith(SANDBOX_MANAGER.root + os.sep) for path in escaping_dirs)
+    assert not os.path.exists("/cmd-practice-absolute-test") and not os.path.exists("../cmd-practice-parent-test")
+
+    # Test 20: Each job's lease is renewed before it is graded, unless its batch lease ran out and another worker took it
+    from .work_queue import GradingQueue
+    queue_dir = tempfile.mkdtemp(prefix="cmd-practice-queue-test-")
+    queue = GradingQueue(os.path.join(queue_dir, "queue.sqlite3"))
+    queue.enqueue_many([("t", "true", "a"), ("t", "true", "b")])
+    batch = queue.lease("worker-a", lease_seconds=-1) # Both leases already ran out
+    renewed = queue.renew(batch[0]["id"], "worker-a")
+    taken_over = queue.lease("worker-b")
+    print(f"Test 20 (Lease Renewal): renewed={renewed}, taken over={[job['id'] for job in taken_over]}")
+    assert renewed and [job["id"] for job in taken_over] == [batch[1]["id"]]
+    assert not queue.renew(batch[1]["id"], "worker-a")
+    queue.close()
+    shutil.rmtree(queue_dir)
+
+    # Test 21: Filesystem checks without a target_check_directory look in destination_dir under the working directory
+    from .evaluator_plugins import EvaluationContext, check_directory_contents
+    checked_dir = tempfile.mkdtemp(prefix="cmd-practice-target-test-")
+    os.makedirs(os.path.join(checked_dir, "destination_dir"))
+    open(os.path.join(checked_dir, "destination_dir", "moved.log"), "w").close()
+    task21 = MockTask("test21", "Default target", "", "", "", [], {"working_directory": checked_dir}, {}, [])
+    found = check_directory_contents(EvaluationContext(task21, "", CommandOutput(), CommandOutput(), 0), {"expected_files": ["moved.log"]})
+    print(f"Test 21 (Default Check Directory): found={found}")
+    assert found
+    shutil.rmtree(checked_dir)
+
+    # Test 22: A shell rejecting --version (dash: "Illegal option --") is not taken for a BSD tool
+    from .host_capabilities import FLAVOR_BSD, probe_tool
+    shell_probe = probe_tool("sh")
+    print(f"Test 22 (Shell Probe): {shell_probe}")
+    assert shell_probe["flavor"] != FLAVOR_BSD
+
     print("\nAll basic evaluator tests seemed to pass if no assertions failed.") 
\ No newline at end of file
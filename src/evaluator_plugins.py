@@ -0,0 +1,210 @@
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Callable, Dict, List, Optional, Union
+
+from .command_output import CommandOutput
+from .safe_regex import safe_search
+from .task_loader import Task
+
+PLUGIN_DIR_ENV_VAR = "CMD_PRACTICE_EVALUATOR_PLUGINS" # Directory of trusted plugin modules
+DEFAULT_PLUGIN_DIR = "evaluator_plugins"
+SCRIPT_CHECK_TIMEOUT_SECONDS = 10
+# Target directory (relative to the working directory) for filesystem checks that do not name one
+DEFAULT_TARGET_CHECK_DIRECTORY = "destination_dir"
+
+class EvaluationContext:
+    """Everything an evaluator plugin may look at for one attempt: the task, the captured output
+    and the sandbox (the task's working directory after the command ran).
+
+    stdout_output/stderr_output are the raw captured bytes (see command_output.CommandOutput);
+    stdout/stderr decode them on first use, so byte-level checks never pay for decoding.
+    """
+
+    def __init__(self, task: Task, user_command: str, stdout: Union[str, CommandOutput],
+                 stderr: Union[str, CommandOutput], return_code: int):
+        self.task = task
+        self.user_command = user_command
+        self.stdout_output = CommandOutput.from_text(stdout) if isinstance(stdout, str) else stdout
+        self.stderr_output = CommandOutput.from_text(stderr) if isinstance(stderr, str) else stderr
+        self.return_code = return_code
+        self.config = task.evaluation
+        self.working_directory = task.input_details.get("working_directory", ".")
+        self._snapshot: Optional[Dict[str, int]] = None
+
+    @property
+    def stdout(self) -> str:
+        return self.stdout_output.text
+
+    @property
+    def stderr(self) -> str:
+        return self.stderr_output.text
+
+    def path(self, relative_path: str) -> str:
+        return os.path.join(self.working_directory, relative_path)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Relative path -> size of every file in the sandbox, computed once per attempt."""
+        if self._snapshot is None:
+            self._snapshot = {}
+            for root, _, files in os.walk(self.working_directory):
+                for name in files:
+                    full_path = os.path.join(root, name)
+                    try:
+                        self._snapshot[os.path.relpath(full_path, self.working_directory)] = os.path.getsize(full_path)
+                    except OSError:
+                        continue # Removed while walking
+        return self._snapshot
+
+    def expected_stdout(self) -> str:
+        expected = self.config.get("expected_stdout", "")
+        # Normalize expected_stdout newlines if they were escaped in JSON
+        return expected.replace('\\n', '\n').strip() if isinstance(expected, str) else expected
+
+    def stdout_equals(self, expected: str) -> bool:
+        """Byte comparison against the captured stdout; the output is never decoded."""
+        return self.stdout_output.equals(expected.encode())
+
+    def stderr_equals(self, expected: str) -> bool:
+        return self.stderr_output.equals(expected.encode())
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable view passed to out-of-process checkers."""
+        return {"task_id": self.task.id, "command": self.user_command, "stdout": self.stdout, "stderr": self.stderr,
+                "return_code": self.return_code, "evaluation": self.config,
+                "working_directory": os.path.abspath(self.working_directory)}
+
+EvaluatorPlugin = Callable[[EvaluationContext], bool]
+
+EVALUATOR_PLUGINS: Dict[str, EvaluatorPlugin] = {}
+_LOADED_PLUGIN_DIRS: Dict[str, List[str]] = {} # plugin dir -> modules loaded from it (each loaded once)
+
+def register_evaluator(name: str) -> Callable[[EvaluatorPlugin], EvaluatorPlugin]:
+    """Decorator registering an in-process evaluation method under the name used in task JSON."""
+    def decorator(plugin: EvaluatorPlugin) -> EvaluatorPlugin:
+        EVALUATOR_PLUGINS[name] = plugin
+        return plugin
+    return decorator
+
+def load_plugin_directory(plugin_dir: Optional[str] = None) -> List[str]:
+    """Imports every module in the (trusted) plugin directory once. Returns the module names loaded."""
+    plugin_dir = plugin_dir or os.environ.get(PLUGIN_DIR_ENV_VAR) or DEFAULT_PLUGIN_DIR
+    if plugin_dir in _LOADED_PLUGIN_DIRS:
+        return _LOADED_PLUGIN_DIRS[plugin_dir]
+    loaded = []
+    if os.path.isdir(plugin_dir):
+        for filename in sorted(os.listdir(plugin_dir)):
+            if not filename.endswith(".py") or filename.startswith("_"):
+                continue
+            module_name = f"cmd_practice_plugin_{filename[:-3]}"
+            try:
+                spec = importlib.util.spec_from_file_location(module_name, os.path.join(plugin_dir, filename))
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                spec.loader.exec_module(module) # Plugins call register_evaluator at import
+                loaded.append(module_name)
+            except Exception as e:
+                sys.modules.pop(module_name, None)
+                print(f"Error loading evaluator plugin {filename}: {e}")
+    _LOADED_PLUGIN_DIRS[plugin_dir] = loaded
+    return loaded
+
+def get_evaluator(method: str) -> Optional[EvaluatorPlugin]:
+    plugin = EVALUATOR_PLUGINS.get(method)
+    if plugin is None:
+        load_plugin_directory()
+        plugin = EVALUATOR_PLUGINS.get(method)
+    return plugin
+
+def run_evaluator(method: str, context: EvaluationContext) -> bool:
+    """Runs the named evaluation method. Unknown methods and plugin errors count as incorrect."""
+    plugin = get_evaluator(method)
+    if plugin is None:
+        print(f"Evaluator: Unknown evaluation method '{method}' for task {context.task.id}.")
+        return False
+    try:
+        return bool(plugin(context))
+    except Exception as e: # A broken plugin must not end the session
+        print(f"Evaluator: Evaluation method '{method}' failed for task {context.task.id}: {e}")
+        return False
+
+# --- Built-in evaluation methods ---
+
+@register_evaluator("exact_match")
+def exact_match(context: EvaluationContext) -> bool:
+    """stdout must equal expected_stdout, with no stderr (unless expected or allowed) and a zero exit code."""
+    expected_stdout = context.expected_stdout()
+    expected_stderr = context.config.get("expected_stderr")
+    if not isinstance(expected_stdout, str):
+        return False
+    stdout_matches = context.stdout_equals(expected_stdout)
+    if context.return_code == 0 and stdout_matches and not context.stderr_output:
+        return True
+    # Allow for tasks that expect specific stderr
+    if context.return_code != 0 and expected_stderr and context.stderr_equals(expected_stderr) and stdout_matches:
+        return True
+    return (context.return_code == 0 and stdout_matches
+            and context.config.get("allow_stderr_if_stdout_matches", False))
+
+@register_evaluator("contains_substring")
+def contains_substring(context: EvaluationContext) -> bool:
+    """The command must succeed and stdout must contain every expected substring."""
+    if context.return_code != 0:
+        return False
+    # Searched in the captured bytes, in place (a large output is an mmap)
+    return all(substring.encode() in context.stdout_output
+               for substring in context.config.get("expected_stdout_substrings", []))
+
+def check_directory_contents(context: EvaluationContext, fs_check_config: Dict) -> bool:
+    target_dir = context.path(fs_check_config.get("target_check_directory", DEFAULT_TARGET_CHECK_DIRECTORY))
+    if not os.path.isdir(target_dir):
+        print(f"Evaluator: Target directory for checks '{target_dir}' does not exist.")
+        return False
+    # Paths are relative to the target directory, e.g. "subdir/config.ini"
+    if not all(os.path.lexists(os.path.join(target_dir, path)) for path in fs_check_config.get("expected_files", [])):
+        return False
+    return not any(os.path.lexists(os.path.join(target_dir, path)) for path in fs_check_config.get("unexpected_files", []))
+
+@register_evaluator("complex_script_evaluation")
+def complex_script_evaluation(context: EvaluationContext) -> bool:
+    """Filesystem state of a target directory, a stdout regex and the exact stderr must all match."""
+    fs_check_config = context.config.get("check_destination_dir_contents")
+    if isinstance(fs_check_config, dict) and not check_directory_contents(context, fs_check_config):
+        return False
+
+    expected_stdout_pattern = context.config.get("expected_stdout_pattern", "")
+    if expected_stdout_pattern:
+        # re.MULTILINE, since patterns usually describe line-based output such as ls listings.
+        # Task authors' patterns run over learner output, so never with a backtracking engine unguarded.
+        if not safe_search(expected_stdout_pattern, context.stdout, re.MULTILINE):
+            return False
+    elif context.stdout_output: # No pattern: no stdout is expected
+        return False
+
+    return context.stderr_equals(context.config.get("expected_stderr", ""))
+
+@register_evaluator("script_check")
+def script_check(context: EvaluationContext) -> bool:
+    """Runs an untrusted checker script in a subprocess; exit code 0 means correct.
+
+    The attempt is passed as JSON on stdin (see EvaluationContext.to_dict). This costs a fork/exec
+    per attempt, so trusted checks should be plugins in the plugin directory instead.
+    """
+    script = context.config.get("script")
+    if not script:
+        print(f"Evaluator: script_check for task {context.task.id} has no 'script'.")
+        return False
+    script = os.path.abspath(script) # Relative to the project root, while the checker runs in the sandbox
+    command = [sys.executable, script] if script.endswith(".py") else [script]
+    try:
+        process = subprocess.run(
+            command, input=json.dumps(context.to_dict()), capture_output=True, text=True,
+            cwd=context.working_directory if os.path.isdir(context.working_directory) else None,
+            timeout=context.config.get("timeout_seconds", SCRIPT_CHECK_TIMEOUT_SECONDS))
+    except (subprocess.TimeoutExpired, OSError) as e:
+        print(f"Evaluator: Checker script '{script}' failed: {e}")
+        return False
+    return process.returncode == 0
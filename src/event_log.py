@@ -0,0 +1,317 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/event_log.py` as well as `python -m src.event_log`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import atexit
+import bisect
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from .colors import Colors
+from .verdict_cache import normalize_command
+
+EVENT_LOG_ENV_VAR = "CMD_PRACTICE_EVENT_LOG" # "0" disables the log, a directory path relocates it
+EVENT_LOG_DIR = "attempt_log"
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+BUFFERED_EVENTS = 32 # Events kept in memory before they are written out
+SEGMENT_PATTERN = re.compile(r"^events-(\d{6})\.jsonl$")
+ROLLUP_FORMAT_VERSION = 2
+
+VERDICT_CORRECT = "correct"
+VERDICT_INCORRECT = "incorrect"
+VERDICT_SKIPPED = "skipped"
+VERDICT_ANSWER_SHOWN = "answer_shown"
+
+# Time-to-solve histogram: geometric bucket upper bounds from 1s to ~10h (each 30% wider than the last).
+# Histograms have a fixed size and add up across segments, so medians stay cheap to merge.
+TIME_BUCKET_BOUNDS = [round(1.3 ** i, 2) for i in range(36)]
+# Distinct wrong answers tracked per task (space-saving heavy hitters, so memory stays bounded)
+WRONG_ANSWER_SLOTS = 32
+WRONG_ANSWERS_SHOWN = 3
+
+def segment_name(number: int) -> str:
+    return f"events-{number:06d}.jsonl"
+
+def rollup_path(segment_path: str) -> str:
+    return segment_path[:-len(".jsonl")] + ".rollup.json"
+
+def list_segments(directory: str) -> List[str]:
+    """Segment paths in the log directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if SEGMENT_PATTERN.match(name))
+    return [os.path.join(directory, name) for name in names]
+
+_OPEN_EVENT_LOGS: List["EventLog"] = []
+
+def close_event_logs():
+    """Flushes every event log of this process; for exits that skip atexit (os._exit in a forked session)."""
+    for event_log in _OPEN_EVENT_LOGS:
+        event_log.close()
+
+class EventLog:
+    """Buffered, append-only JSON-lines log of attempts, split into size-rotated segments.
+
+    Only the newest segment is ever written to. When it grows past segment_max_bytes it is
+    sealed and a rollup (an AttemptAggregator summary) is stored next to it.
+    """
+
+    def __init__(self, directory: str = EVENT_LOG_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 buffered_events: int = BUFFERED_EVENTS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.buffered_events = buffered_events
+        self._buffer: List[str] = []
+        segments = list_segments(directory)
+        self._segment_number = int(SEGMENT_PATTERN.match(os.path.basename(segments[-1])).group(1)) if segments else 1
+        atexit.register(self.close) # Don't lose buffered events on quit or Ctrl-C
+        _OPEN_EVENT_LOGS.append(self)
+
+    @property
+    def segment_path(self) -> str:
+        return os.path.join(self.directory, segment_name(self._segment_number))
+
+    def append(self, event: Dict[str, Any]):
+        event.setdefault("ts", time.time())
+        self._buffer.append(json.dumps(event, separators=(",", ":")) + "\n")
+        if len(self._buffer) >= self.buffered_events:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = "".join(self._buffer).encode()
+        self._buffer = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # One O_APPEND write per flush, so concurrent sessions never interleave partial lines
+            fd = os.open(self.segment_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"{Colors.RED}Error writing attempt log: {e}{Colors.ENDC}")
+            return
+        if size >= self.segment_max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Seals the current segment, stores its rollup and starts a new segment."""
+        sealed_path = self.segment_path
+        self._segment_number += 1
+        write_rollup(sealed_path)
+
+    def close(self):
+        self.flush()
+
+def iter_events(segment_path: str) -> Iterator[Dict[str, Any]]:
+    """Streams the events of one segment, skipping torn or corrupt lines."""
+    try:
+        with open(segment_path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except IOError as e:
+        print(f"{Colors.RED}Error reading {segment_path}: {e}{Colors.ENDC}")
+
+def _new_task_stats() -> Dict[str, Any]:
+    return {"attempts": 0, "correct": 0, "skipped": 0, "answer_shown": 0, "timeouts": 0,
+            "solve_seconds_histogram": [0] * (len(TIME_BUCKET_BOUNDS) + 1), "wrong_answers": {}}
+
+class AttemptAggregator:
+    """Streaming per-task statistics over attempt events, in memory bounded by the number of tasks.
+
+    Aggregators are mergeable, so per-segment rollups combine into totals without rereading events.
+    Medians come from a fixed histogram and wrong-answer counts are approximate (space-saving).
+    """
+
+    def __init__(self):
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.events = 0
+
+    def add(self, event: Dict[str, Any]):
+        task_id = event.get("task_id")
+        if not task_id:
+            return
+        self.events += 1
+        stats = self.tasks.setdefault(task_id, _new_task_stats())
+        verdict = event.get("verdict")
+        if verdict in (VERDICT_CORRECT, VERDICT_INCORRECT):
+            stats["attempts"] += 1
+        if event.get("timed_out"):
+            stats["timeouts"] += 1
+        if verdict == VERDICT_CORRECT:
+            stats["correct"] += 1
+            seconds = event.get("seconds_since_task_start", 0.0)
+            stats["solve_seconds_histogram"][bisect.bisect_left(TIME_BUCKET_BOUNDS, seconds)] += 1
+        elif verdict == VERDICT_INCORRECT:
+            self._count_wrong_answer(stats["wrong_answers"], normalize_command(event.get("command", "")), 1)
+        elif verdict == VERDICT_SKIPPED:
+            stats["skipped"] += 1
+        elif verdict == VERDICT_ANSWER_SHOWN:
+            stats["answer_shown"] += 1
+
+    @staticmethod
+    def _count_wrong_answer(counters: Dict[str, int], command: str, count: int):
+        if command in counters or len(counters) < WRONG_ANSWER_SLOTS:
+            counters[command] = counters.get(command, 0) + count
+            return
+        # Space-saving: the new answer takes over the smallest counter, inheriting its count
+        smallest = min(counters, key=counters.get)
+        counters[command] = counters.pop(smallest) + count
+
+    def merge(self, other: "AttemptAggregator"):
+        self.events += other.events
+        for task_id, other_stats in other.tasks.items():
+            stats = self.tasks.setdefault(task_id, _new_task_stats())
+            for field in ("attempts", "correct", "skipped", "answer_shown", "timeouts"):
+                stats[field] += other_stats[field]
+            stats["solve_seconds_histogram"] = [a + b for a, b in zip(stats["solve_seconds_histogram"],
+                                                                       other_stats["solve_seconds_histogram"])]
+            for command, count in other_stats["wrong_answers"].items():
+                self._count_wrong_answer(stats["wrong_answers"], command, count)
+
+    @staticmethod
+    def median_solve_seconds(stats: Dict[str, Any]) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the median time to solve."""
+        histogram = stats["solve_seconds_histogram"]
+        total = sum(histogram)
+        if not total:
+            return None
+        running = 0
+        for bucket, count in enumerate(histogram):
+            running += count
+            if running * 2 >= total:
+                return TIME_BUCKET_BOUNDS[bucket] if bucket < len(TIME_BUCKET_BOUNDS) else float("inf")
+        return None
+
+    def report(self) -> List[Dict[str, Any]]:
+        """One row per task: pass rate, median time to solve and the most common wrong answers."""
+        rows = []
+        for task_id in sorted(self.tasks):
+            stats = self.tasks[task_id]
+            wrong_answers = sorted(stats["wrong_answers"].items(), key=lambda item: item[1], reverse=True)
+            rows.append({
+                "task_id": task_id,
+                "attempts": stats["attempts"],
+                "pass_rate": stats["correct"] / stats["attempts"] if stats["attempts"] else 0.0,
+                "median_solve_seconds": self.median_solve_seconds(stats),
+                "skipped": stats["skipped"],
+                "answer_shown": stats["answer_shown"],
+                "timeouts": stats["timeouts"],
+                "common_wrong_answers": wrong_answers[:WRONG_ANSWERS_SHOWN],
+            })
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"events": self.events, "tasks": self.tasks}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AttemptAggregator":
+        aggregator = cls()
+        aggregator.events = data.get("events", 0)
+        aggregator.tasks = data.get("tasks", {})
+        return aggregator
+
+def aggregate_segment(segment_path: str) -> AttemptAggregator:
+    aggregator = AttemptAggregator()
+    for event in iter_events(segment_path):
+        aggregator.add(event)
+    return aggregator
+
+def write_rollup(segment_path: str) -> Optional[AttemptAggregator]:
+    """Aggregates a sealed segment and stores the result next to it."""
+    try:
+        segment_size = os.path.getsize(segment_path)
+    except OSError:
+        return None
+    aggregator = aggregate_segment(segment_path)
+    path = rollup_path(segment_path)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": ROLLUP_FORMAT_VERSION, "segment_size": segment_size,
+                       "aggregate": aggregator.to_dict()}, f)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        print(f"{Colors.RED}Error saving rollup for {segment_path}: {e}{Colors.ENDC}")
+    return aggregator
+
+def load_rollup(segment_path: str) -> Optional[AttemptAggregator]:
+    """Returns the stored rollup of a segment, or None if missing or out of date."""
+    try:
+        with open(rollup_path(segment_path), 'r') as f:
+            data = json.load(f)
+        if data.get("version") != ROLLUP_FORMAT_VERSION or data.get("segment_size") != os.path.getsize(segment_path):
+            return None
+        return AttemptAggregator.from_dict(data["aggregate"])
+    except (IOError, OSError, json.JSONDecodeError, KeyError):
+        return None
+
+def aggregate_log(directory: str = EVENT_LOG_DIR) -> AttemptAggregator:
+    """Totals over the whole log: stored rollups for sealed segments, a raw scan of the newest one."""
+    total = AttemptAggregator()
+    segments = list_segments(directory)
+    for index, segment_path in enumerate(segments):
+        is_active = index == len(segments) - 1
+        aggregator = None if is_active else load_rollup(segment_path)
+        if aggregator is None:
+            # The active segment is still growing; sealed ones without a rollup (e.g. after a crash) get one now
+            aggregator = aggregate_segment(segment_path) if is_active else write_rollup(segment_path)
+        if aggregator is not None:
+            total.merge(aggregator)
+    return total
+
+def event_log_directory() -> Optional[str]:
+    """The attempt log directory configured through the environment, or None if logging is disabled."""
+    setting = os.environ.get(EVENT_LOG_ENV_VAR, "")
+    if setting in ("0", "false", "no"):
+        return None
+    if setting and setting not in ("1", "true", "yes"):
+        return setting
+    return EVENT_LOG_DIR
+
+def event_log_from_env() -> Optional[EventLog]:
+    """Returns the attempt log unless disabled through the environment."""
+    directory = event_log_directory()
+    return EventLog(directory) if directory else None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize the attempt log: pass rates, time to solve, common wrong answers.")
+    parser.add_argument("--dir", default=event_log_directory() or EVENT_LOG_DIR, help="Attempt log directory")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    aggregator = aggregate_log(args.dir)
+    rows = aggregator.report()
+    if args.json:
+        print(json.dumps(rows, indent=4))
+        return 0
+    if not rows:
+        print(f"{Colors.YELLOW}No attempts logged in {args.dir}.{Colors.ENDC}")
+        return 0
+    print(f"{Colors.HEADER}{Colors.BOLD}Attempt log: {aggregator.events} event(s) across {len(rows)} task(s){Colors.ENDC}")
+    for row in rows:
+        median = row["median_solve_seconds"]
+        median_text = "-" if median is None else f"<={median:.0f}s"
+        print(f"{Colors.CYAN}{row['task_id']}{Colors.ENDC}: {row['attempts']} attempt(s), "
+              f"pass rate {row['pass_rate']:.0%}, median time to solve {median_text}, "
+              f"{row['skipped']} skip(s), {row['answer_shown']} answer(s) shown, {row['timeouts']} timeout(s)")
+        for command, count in row["common_wrong_answers"]:
+            print(f"    {count:5d}x  {command}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
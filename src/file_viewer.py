@@ -0,0 +1,193 @@
+import mmap
+import os
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+DEFAULT_SHOW_LINES = 40
+MAX_SEARCH_MATCHES = 50
+BINARY_SNIFF_BYTES = 8192
+# Offsets of every Nth line start are remembered, so jumping to a line costs at most N line scans
+# while the index stays tiny (a 2 GB log with 20M lines needs ~20k entries).
+LINE_INDEX_STRIDE = 1024
+NEWLINE_COUNT_CHUNK = 1024 * 1024
+
+class MappedFile:
+    """Read-only, mmap-backed view of a file with a sparse line-offset index.
+
+    Only the lines that are actually viewed are copied out of the mapping.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map empty files; an empty view needs no mapping anyway
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._checkpoints = array('q', [0]) # _checkpoints[k] = offset of line k * LINE_INDEX_STRIDE (0-based)
+        self._indexed_to_eof = self.size == 0
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "MappedFile":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_binary(self) -> bool:
+        if self._map is None:
+            return False
+        return self._map.find(b"\0", 0, min(self.size, BINARY_SNIFF_BYTES)) != -1
+
+    def _next_line_start(self, offset: int) -> int:
+        newline = self._map.find(b"\n", offset)
+        return self.size if newline == -1 else newline + 1
+
+    def _line_offset(self, line_index: int) -> Optional[int]:
+        """Byte offset where the 0-based line_index starts, or None past the end of the file."""
+        checkpoint = line_index // LINE_INDEX_STRIDE
+        # Extend the sparse index lazily, only as far as the requested line
+        while checkpoint >= len(self._checkpoints) and not self._indexed_to_eof:
+            offset = self._checkpoints[-1]
+            for _ in range(LINE_INDEX_STRIDE):
+                offset = self._next_line_start(offset)
+                if offset >= self.size:
+                    break
+            if offset >= self.size:
+                self._indexed_to_eof = True
+            else:
+                self._checkpoints.append(offset)
+        if checkpoint >= len(self._checkpoints):
+            return None
+        offset = self._checkpoints[checkpoint]
+        for _ in range(line_index - checkpoint * LINE_INDEX_STRIDE):
+            offset = self._next_line_start(offset)
+            if offset >= self.size:
+                return None
+        return offset
+
+    def lines(self, start: int, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yields lines start..end (1-based, inclusive) without their newline."""
+        if self._map is None:
+            return
+        offset = self._line_offset(max(start, 1) - 1)
+        line_number = max(start, 1)
+        while offset is not None and offset < self.size and (end is None or line_number <= end):
+            next_offset = self._next_line_start(offset)
+            yield self._map[offset:next_offset].rstrip(b"\n")
+            offset = next_offset
+            line_number += 1
+
+    def has_line(self, line_number: int) -> bool:
+        if self._map is None:
+            return False
+        offset = self._line_offset(line_number - 1)
+        return offset is not None and offset < self.size
+
+    def tail(self, count: int) -> List[bytes]:
+        """Returns the last count lines, scanning backwards from the end of the file."""
+        if self._map is None or count <= 0:
+            return []
+        end = self.size
+        if self._map[end - 1:end] == b"\n":
+            end -= 1 # Ignore the final newline
+        start = end
+        for _ in range(count):
+            newline = self._map.rfind(b"\n", 0, start)
+            if newline == -1:
+                start = 0
+                break
+            start = newline
+        else:
+            start += 1
+        return self._map[start:end].split(b"\n") if start < end else []
+
+    def _count_newlines(self, start: int, end: int) -> int:
+        count = 0
+        for chunk_start in range(start, end, NEWLINE_COUNT_CHUNK): # Bounded copies, never the whole file
+            count += self._map[chunk_start:min(chunk_start + NEWLINE_COUNT_CHUNK, end)].count(b"\n")
+        return count
+
+    def search(self, needle: bytes, max_matches: int = MAX_SEARCH_MATCHES) -> Iterator[Tuple[int, bytes]]:
+        """Yields (line_number, line) for lines containing needle, at most max_matches of them."""
+        if self._map is None or not needle:
+            return
+        matches = 0
+        counted_to, line_number = 0, 1
+        position = self._map.find(needle)
+        while position != -1 and matches < max_matches:
+            line_start = self._map.rfind(b"\n", 0, position) + 1
+            line_number += self._count_newlines(counted_to, line_start)
+            counted_to = line_start
+            line_end = self._next_line_start(position)
+            yield line_number, self._map[line_start:line_end].rstrip(b"\n")
+            matches += 1
+            position = self._map.find(needle, line_end) # One result per line
+
+def parse_view_spec(args: List[str]) -> Tuple[str, Tuple]:
+    """Parses the arguments after `show <file>` into a view.
+
+    Supported: "" (first DEFAULT_SHOW_LINES lines), "start:end" (1-based, inclusive, either side
+    optional), "head [n]", "tail [n]" and "/text" (search). Raises ValueError on anything else.
+    """
+    if not args:
+        return "head", (DEFAULT_SHOW_LINES,)
+    first = args[0]
+    if first in ("head", "tail"):
+        count = int(args[1]) if len(args) > 1 else DEFAULT_SHOW_LINES
+        if count <= 0:
+            raise ValueError("line count must be positive")
+        return first, (count,)
+    if first.startswith("/"):
+        needle = " ".join(args)[1:]
+        if not needle:
+            raise ValueError("search text is empty")
+        return "search", (needle,)
+    if ":" in first:
+        start_text, end_text = first.split(":", 1)
+        start = int(start_text) if start_text else 1
+        end = int(end_text) if end_text else None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"invalid line range '{first}'")
+        return "range", (start, end)
+    raise ValueError(f"unknown view '{first}'")
+
+def render_view(path: str, view: str, params: Tuple, display_name: str = "<file>",
+                view_command: Optional[str] = None) -> Tuple[List[str], str]:
+    """Returns (lines to print, note) for a view of the file at path.
+    Notes suggest follow-up views as view_command (default "show <display_name>") plus a view.
+    """
+    view_command = view_command or f"show {display_name}"
+    with MappedFile(path) as mapped:
+        if mapped.is_binary():
+            return [], f"Binary file ({mapped.size} bytes), not shown."
+        note = ""
+        if view == "head":
+            count = params[0]
+            raw_lines = list(mapped.lines(1, count))
+            if mapped.has_line(count + 1):
+                note = (f"Showing lines 1-{count}. Use '{view_command} {count + 1}:{count * 2}', "
+                        f"'{view_command} tail' or '{view_command} /text' for more.")
+        elif view == "tail":
+            raw_lines = mapped.tail(params[0])
+        elif view == "range":
+            start, end = params
+            if end is None:
+                end = start + DEFAULT_SHOW_LINES - 1 # Open-ended ranges still show a bounded window
+            raw_lines = list(mapped.lines(start, end))
+            if not raw_lines:
+                note = f"The file has fewer than {start} lines."
+            elif mapped.has_line(end + 1):
+                note = f"Showing lines {start}-{end}. Use '{view_command} {end + 1}:{end + end - start + 1}' for more."
+        else: # search
+            needle = params[0]
+            results = list(mapped.search(needle.encode()))
+            raw_lines = [b"%d: %s" % (line_number, line) for line_number, line in results]
+            if not results:
+                note = f"No lines contain '{needle}'."
+            elif len(results) == MAX_SEARCH_MATCHES:
+                note = f"Showing the first {MAX_SEARCH_MATCHES} matching lines."
+        return [line.decode('utf-8', errors='replace') for line in raw_lines], note
@@ -0,0 +1,180 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .colors import Colors
+from .task_loader import Task
+
+FIXTURE_STORE_ENV_VAR = "CMD_PRACTICE_FIXTURE_STORE" # "1" for the default location, or a directory path
+FIXTURE_STORE_SUBDIR = "cmd-practice-fixtures"
+TOUCH_INTERVAL_SECONDS = 60.0 # At most one mtime update per template and minute
+READ_ONLY_MODE = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH # 0o444
+
+# ioctl request number for FICLONE on Linux (reflink a whole file on btrfs/xfs)
+FICLONE = 0x40049409
+
+def default_store_root() -> str:
+    """Next to the sandboxes (<temp dir>/cmd-practice-sandboxes): a reflink only works within one filesystem."""
+    return os.path.join(tempfile.gettempdir(), FIXTURE_STORE_SUBDIR)
+
+def template_key(task: Task) -> str:
+    """Content hash of the files a task creates. Tasks with identical fixtures share a template."""
+    file_actions = [action for action in task.setup_files if action.get("action") == "create_file"]
+    return hashlib.sha256(json.dumps(file_actions, sort_keys=True).encode()).hexdigest()[:32]
+
+def _safe_relative_path(relative_path: str) -> Optional[str]:
+    normalized = os.path.normpath(relative_path)
+    if os.path.isabs(normalized) or normalized == ".." or normalized.startswith(".." + os.sep):
+        return None
+    return normalized
+
+def _reflink(source: str, destination: str) -> bool:
+    try:
+        import fcntl
+    except ImportError: # Not available on Windows
+        return False
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(destination)
+        except OSError:
+            pass
+        return False
+
+def reflink_supported(directory: str) -> bool:
+    """Whether files in directory can be reflinked to each other (btrfs, XFS; not ext4 or tmpfs)."""
+    os.makedirs(directory, exist_ok=True)
+    probe_dir = tempfile.mkdtemp(prefix=".probe-", dir=directory)
+    try:
+        source = os.path.join(probe_dir, "source")
+        with open(source, 'w') as f:
+            f.write("probe")
+        return _reflink(source, os.path.join(probe_dir, "clone"))
+    finally:
+        shutil.rmtree(probe_dir, ignore_errors=True)
+
+class FixtureStore:
+    """Builds each task's setup files once into a shared read-only template directory.
+
+    Sandbox files are reflinks of the template's: they share its blocks (on disk and in the page
+    cache) until written, so the footprint does not grow with the number of graders. A file is
+    only installed from the template on the template's own filesystem; elsewhere install_file
+    declines and task setup writes the content itself, since a full copy would cost more than
+    that. Never a hardlink: read-only mode bits do not stop root (or the namespace root of an
+    isolated command) from writing through a shared inode, and task setup sets each file's times.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or default_store_root()
+        self._built: Dict[str, str] = {} # template key -> template dir, for this process
+        self._touched: Dict[str, float] = {} # template key -> when this process last refreshed its mtime
+        self.link_counts = {"reflink": 0, "declined": 0}
+
+    def template_dir(self, task: Task) -> str:
+        """Returns the task's template directory, building it on first use."""
+        key = template_key(task)
+        now = time.time()
+        if key in self._built and now - self._touched.get(key, 0) < TOUCH_INTERVAL_SECONDS:
+            return self._built[key]
+        final_dir = os.path.join(self.root, key)
+        if not os.path.isdir(final_dir): # Not built yet, or evicted by the sandbox manager
+            self._build_template(task, final_dir)
+        try:
+            os.utime(final_dir) # The mtime is the template's last use, for LRU eviction across processes
+        except OSError:
+            pass
+        self._built[key] = final_dir
+        self._touched[key] = now
+        return final_dir
+
+    def forget(self, template_path: str):
+        """Drops a template that was evicted from this process's cache."""
+        for key, path in list(self._built.items()):
+            if path == template_path:
+                del self._built[key]
+                self._touched.pop(key, None)
+
+    def _build_template(self, task: Task, final_dir: str):
+        os.makedirs(self.root, exist_ok=True)
+        # Build in a private directory and rename it into place, so concurrent graders
+        # never see a half-written template. Whoever renames first wins.
+        build_dir = tempfile.mkdtemp(prefix=".build-", dir=self.root)
+        try:
+            for action in task.setup_files:
+                if action.get("action") != "create_file":
+                    continue
+                relative_path = _safe_relative_path(action.get("path", ""))
+                if not relative_path:
+                    continue
+                file_path = os.path.join(build_dir, relative_path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, 'w') as f:
+                    f.write(action.get("content", ""))
+                os.chmod(file_path, READ_ONLY_MODE)
+            os.rename(build_dir, final_dir)
+        except OSError as e:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY): # Another process built it first
+                raise
+
+    def _same_filesystem(self, path: str) -> bool:
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            return os.stat(path).st_dev == os.stat(self.root).st_dev
+        except OSError:
+            return False
+
+    def install_file(self, task: Task, relative_path: str, destination: str) -> bool:
+        """Reflinks the template copy of relative_path to destination. Returns False (and leaves
+        destination alone) if the file is not in the template or cannot be reflinked there.
+        """
+        safe_path = _safe_relative_path(relative_path)
+        dir_name = os.path.dirname(destination) or "."
+        os.makedirs(dir_name, exist_ok=True)
+        if not safe_path or not self._same_filesystem(dir_name):
+            self.link_counts["declined"] += 1
+            return False
+        source = os.path.join(self.template_dir(task), safe_path)
+        if not os.path.isfile(source):
+            return False
+
+        # Remove the previous file (or link) first; an older version of the store left read-only hardlinks
+        if os.path.lexists(destination):
+            os.remove(destination)
+        if not _reflink(source, destination):
+            self.link_counts["declined"] += 1
+            return False
+        self.link_counts["reflink"] += 1
+        return True
+
+    def templates(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in os.listdir(self.root) if not name.startswith(".")]
+
+def fixture_store_from_env() -> Optional[FixtureStore]:
+    """Returns a FixtureStore if enabled through the environment and its filesystem supports
+    reflinks, else None: without them, templates would only add a copy of every fixture.
+    """
+    setting = os.environ.get(FIXTURE_STORE_ENV_VAR, "")
+    if not setting or setting in ("0", "false", "no"):
+        return None
+    root = default_store_root() if setting in ("1", "true", "yes") else setting
+    try:
+        supported = reflink_supported(root)
+    except OSError:
+        supported = False
+    if not supported:
+        print(f"{Colors.YELLOW}Warning: {root} does not support reflinks; the fixture store is disabled "
+              f"and task setup writes files directly.{Colors.ENDC}")
+        return None
+    return FixtureStore(root)
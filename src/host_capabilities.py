@@ -0,0 +1,165 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .command_analysis import parse_command
+from .task_loader import Task, get_task_individual_commands
+
+HOST_CAPABILITIES_CACHE_FILE = ".host_capabilities_cache.json" # Next to .path_executables_cache.json
+PROBE_CACHE_MAX_AGE_SECONDS = 24 * 60 * 60 # 1 day, like the PATH cache
+PROBE_TIMEOUT_SECONDS = 2
+CACHE_FORMAT_VERSION = 2 # 2: shells are no longer labelled BSD for rejecting --version
+
+FLAVOR_GNU = "gnu"
+FLAVOR_BUSYBOX = "busybox"
+FLAVOR_TOYBOX = "toybox"
+FLAVOR_IPUTILS = "iputils"
+FLAVOR_BSD = "bsd"
+FLAVOR_UNKNOWN = "unknown"
+# Markers searched in `<tool> --version` output, in order
+FLAVOR_MARKERS = [("BusyBox", FLAVOR_BUSYBOX), ("toybox", FLAVOR_TOYBOX), ("iputils", FLAVOR_IPUTILS), ("GNU", FLAVOR_GNU)]
+# BSD tools reject --version with an option error followed by their usage message
+BSD_REJECTION_MARKERS = ("illegal option", "unrecognized option")
+BSD_USAGE_MARKER = "usage:"
+# Shells reject --version too (dash: "Illegal option --"), whatever system they come from
+SHELLS = {"sh", "dash", "ash", "bash", "ksh", "mksh", "zsh"}
+VERSION_PATTERN = re.compile(r"(\d+(?:\.\d+)+|\d{8})")
+# Shell builtins never need to be on PATH
+SHELL_BUILTINS = {"cd", "echo", "printf", "pwd", "test", "[", "true", "false", "export", "set", "read", "exit", "type"}
+
+def _run_probe(command: List[str], cwd: str) -> Optional[subprocess.CompletedProcess]:
+    try:
+        return subprocess.run(command, capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECONDS,
+                              stdin=subprocess.DEVNULL, env=dict(os.environ, LC_ALL="C"), cwd=cwd)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+
+def probe_tool(name: str) -> Dict[str, Any]:
+    """Finds a tool on PATH and works out its flavor (GNU, BusyBox, BSD, ...) and version."""
+    path = shutil.which(name)
+    if path is None:
+        return {"available": name in SHELL_BUILTINS, "path": None, "mtime_ns": None,
+                "flavor": FLAVOR_UNKNOWN, "version": None}
+    real_path = os.path.realpath(path)
+    info = {"available": True, "path": path, "mtime_ns": os.stat(real_path).st_mtime_ns,
+            "flavor": FLAVOR_UNKNOWN, "version": None}
+    if os.path.basename(real_path) in (FLAVOR_BUSYBOX, FLAVOR_TOYBOX): # Multi-call binaries, no need to run them
+        info["flavor"] = os.path.basename(real_path)
+        return info
+
+    # In an empty directory: a tool that ignores the flag must not act on the repository
+    with tempfile.TemporaryDirectory(prefix="cmd-practice-probe-") as probe_dir:
+        for version_flag in ("--version", "-V"): # iputils ping only understands -V
+            process = _run_probe([path, version_flag], probe_dir)
+            if process is None:
+                continue
+            output = process.stdout + process.stderr
+            flavor = next((flavor for marker, flavor in FLAVOR_MARKERS if marker in output), None)
+            if flavor or process.returncode == 0: # Classified, or the flag was understood: no need to try the next
+                info["flavor"] = flavor or FLAVOR_UNKNOWN
+                version = VERSION_PATTERN.search(output)
+                info["version"] = version.group(1) if version else None
+                return info
+            lowered = output.lower()
+            if (name not in SHELLS and os.path.basename(real_path) not in SHELLS and BSD_USAGE_MARKER in lowered
+                    and any(marker in lowered for marker in BSD_REJECTION_MARKERS)):
+                info["flavor"] = FLAVOR_BSD
+                return info
+    return info
+
+def required_tools(task: Task) -> List[str]:
+    """Tools a task needs: its `requires` list, or the programs its example solution runs."""
+    if task.requires is not None:
+        return list(task.requires)
+    analysis = parse_command(task.example_solution)
+    programs = analysis.invoked_programs() if analysis else []
+    return sorted(set(programs) | set(get_task_individual_commands(task.command_to_practice)))
+
+class HostCapabilities:
+    """Which tools this host has and what flavor they are, probed once and cached on disk.
+
+    A cached entry is reused while the tool's resolved path and mtime are unchanged, so an
+    upgraded or replaced tool is re-probed on the next run.
+    """
+
+    def __init__(self, cache_file: Optional[str] = HOST_CAPABILITIES_CACHE_FILE):
+        self.cache_file = cache_file
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error reading host capability cache: {e}. Re-probing...")
+            return
+        if (data.get("version") == CACHE_FORMAT_VERSION and data.get("path_env") == os.environ.get("PATH", "")
+                and time.time() - data.get("timestamp", 0) < PROBE_CACHE_MAX_AGE_SECONDS):
+            self.tools = data.get("tools", {})
+
+    def save(self):
+        if not self._dirty or not self.cache_file:
+            return
+        data = {"version": CACHE_FORMAT_VERSION, "timestamp": time.time(),
+                "path_env": os.environ.get("PATH", ""), "tools": self.tools}
+        try:
+            tmp_path = f"{self.cache_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.cache_file)
+            self._dirty = False
+        except IOError as e:
+            print(f"Error saving host capability cache: {e}")
+
+    def _is_current(self, info: Dict[str, Any], name: str) -> bool:
+        path = shutil.which(name)
+        if path != info.get("path"):
+            return False
+        if path is None:
+            return True
+        try:
+            return os.stat(os.path.realpath(path)).st_mtime_ns == info.get("mtime_ns")
+        except OSError:
+            return False
+
+    def tool(self, name: str) -> Dict[str, Any]:
+        info = self.tools.get(name)
+        if info is None or not self._is_current(info, name):
+            info = probe_tool(name)
+            self.tools[name] = info
+            self._dirty = True
+        return info
+
+    def has(self, name: str) -> bool:
+        return self.tool(name)["available"]
+
+    def flavor(self, name: str) -> str:
+        return self.tool(name)["flavor"]
+
+    def prepare_task(self, task: Task) -> Optional[str]:
+        """Adapts a task to this host. Returns why the task cannot run here, or None if it can.
+
+        Missing tools hide the task. Otherwise the first entry of evaluation["variants"] whose
+        tool has this host's flavor is merged over the task's evaluation, e.g.
+        {"tool": "ping", "flavor": "bsd", "expected_stdout_substrings": [...]}.
+        """
+        missing = [name for name in required_tools(task) if not self.has(name)]
+        if missing:
+            return f"needs {', '.join(missing)}"
+        variants = task.evaluation.get("variants")
+        if variants:
+            for variant in variants:
+                if self.flavor(variant.get("tool", "")) == variant.get("flavor"):
+                    overrides = {key: value for key, value in variant.items() if key not in ("tool", "flavor")}
+                    task.evaluation = dict(task.evaluation, **overrides)
+                    break
+        return None
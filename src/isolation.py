@@ -0,0 +1,110 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple, Union
+
+ISOLATION_ENV_VAR = "CMD_PRACTICE_ISOLATION" # "auto" (default), "namespaces" or "none"
+ISOLATION_AUTO = "auto"
+ISOLATION_NAMESPACES = "namespaces"
+ISOLATION_NONE = "none"
+PROBE_TIMEOUT_SECONDS = 5
+# Pseudo filesystems stay as they are; everything else outside the sandbox becomes read-only
+SKIPPED_MOUNT_PREFIXES = ("/proc", "/sys", "/dev")
+
+# Runs as root of a fresh user namespace. $1 is the sandbox, $2 the learner's command, the rest
+# are mount points to make read-only. The sandbox is bind-mounted onto itself first, so it is a
+# separate mount that stays writable.
+NAMESPACE_SETUP_SCRIPT = """
+sandbox="$1"; command="$2"; shift 2
+{ ip link set lo up || ifconfig lo up; } >/dev/null 2>&1
+mount --bind "$sandbox" "$sandbox" || exit 125
+for mount_point in "$@"; do
+    mount -o remount,bind,ro "$mount_point" 2>/dev/null
+done
+mount -t tmpfs -o mode=1777 tmpfs /dev/shm 2>/dev/null
+case "$sandbox/" in
+    /tmp/*) ;; # A private /tmp would hide the sandbox itself
+    *) mount -t tmpfs -o mode=1777 tmpfs /tmp 2>/dev/null ;;
+esac
+cd "$sandbox" || exit 125
+exec /bin/sh -c "$command"
+"""
+
+def _decode_mount_path(path: str) -> str:
+    # /proc/self/mountinfo escapes spaces, tabs, newlines and backslashes as octal
+    return path.replace("\\040", " ").replace("\\011", "\t").replace("\\012", "\n").replace("\\134", "\\")
+
+def read_only_mount_points() -> List[str]:
+    """Mount points to remount read-only inside the namespace, parents before children."""
+    mount_points = []
+    try:
+        with open("/proc/self/mountinfo", 'r') as f:
+            for line in f:
+                mount_point = _decode_mount_path(line.split()[4])
+                if not mount_point.startswith(SKIPPED_MOUNT_PREFIXES):
+                    mount_points.append(mount_point)
+    except (IOError, IndexError):
+        return ["/"]
+    return list(dict.fromkeys(mount_points))
+
+class NoIsolation:
+    """Runs commands directly through the shell, as the grader's own user."""
+    name = ISOLATION_NONE
+
+    def wrap(self, command_str: str, working_directory: str) -> Tuple[Union[str, List[str]], bool]:
+        """Returns (args, shell) for subprocess.Popen."""
+        return command_str, True
+
+class NamespaceIsolation:
+    """Runs each command in new user, mount, PID and network namespaces via util-linux `unshare`.
+
+    The command sees the filesystem read-only except its sandbox (the task's working directory),
+    gets private /tmp and /dev/shm, a loopback-only network, and its own PID space. PID 1 of
+    that space is killed with the wrapper, so a timeout reaps every process the command started.
+    """
+    name = ISOLATION_NAMESPACES
+
+    def __init__(self, unshare_path: str):
+        self.unshare_path = unshare_path
+        self.mount_points = read_only_mount_points()
+
+    def wrap(self, command_str: str, working_directory: str) -> Tuple[Union[str, List[str]], bool]:
+        sandbox = os.path.abspath(working_directory)
+        mount_points = [path for path in self.mount_points if path != sandbox]
+        args = [self.unshare_path, "--user", "--map-root-user", "--mount", "--pid", "--fork", "--kill-child",
+                "--mount-proc", "--net", "--", "/bin/sh", "-c", NAMESPACE_SETUP_SCRIPT, "isolate", sandbox,
+                command_str] + mount_points
+        return args, False
+
+    def probe(self) -> bool:
+        """True if namespaces actually work here (kernels and containers may forbid them)."""
+        sandbox = tempfile.mkdtemp(prefix="cmd-practice-isolation-probe-")
+        try:
+            args, _ = self.wrap("touch probe && ! touch /probe-outside-sandbox 2>/dev/null", sandbox)
+            process = subprocess.run(args, capture_output=True, stdin=subprocess.DEVNULL, timeout=PROBE_TIMEOUT_SECONDS)
+            return process.returncode == 0 and os.path.exists(os.path.join(sandbox, "probe"))
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+        finally:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+_BACKEND: Optional[Union[NoIsolation, NamespaceIsolation]] = None
+
+def get_isolation_backend() -> Union[NoIsolation, NamespaceIsolation]:
+    """The isolation backend for this process, chosen (and probed) once."""
+    global _BACKEND
+    if _BACKEND is not None:
+        return _BACKEND
+    setting = os.environ.get(ISOLATION_ENV_VAR, ISOLATION_AUTO).lower()
+    _BACKEND = NoIsolation()
+    if setting in (ISOLATION_NONE, "0", "false", "no"):
+        return _BACKEND
+    unshare_path = shutil.which("unshare")
+    if unshare_path and os.path.exists("/proc/self/ns/user"):
+        backend = NamespaceIsolation(unshare_path)
+        if backend.probe():
+            _BACKEND = backend
+    if setting == ISOLATION_NAMESPACES and _BACKEND.name != ISOLATION_NAMESPACES:
+        print("Warning: Namespace isolation was requested but is not available here. Running commands without isolation.")
+    return _BACKEND
@@ -0,0 +1,162 @@
+import heapq
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from .task_loader import Task, get_task_individual_commands
+
+LEARNER_HISTORY_DIR = "learner_history" # One JSON file per learner
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Spaced repetition (SM-2 style) parameters
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# How far (in seconds) a fully "weak" task is pulled ahead of its due date
+WEAKNESS_WEIGHT_SECONDS = SECONDS_PER_DAY
+# Weakness assumed for commands the learner has never practiced
+UNSEEN_COMMAND_WEAKNESS = 0.5
+
+OUTCOME_SOLVED = "solved"
+OUTCOME_SKIPPED = "skipped"
+OUTCOME_ANSWER_SHOWN = "answer_shown"
+
+def _history_path(user: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', user) or "_"
+    return os.path.join(LEARNER_HISTORY_DIR, f"{safe_name}.json")
+
+def empty_history() -> Dict[str, Any]:
+    return {"tasks": {}, "commands": {}}
+
+def load_learner_history(user: str) -> Dict[str, Any]:
+    """Loads a learner's history, or returns an empty one if none is stored yet."""
+    path = _history_path(user)
+    if not os.path.exists(path):
+        return empty_history()
+    try:
+        with open(path, 'r') as f:
+            history = json.load(f)
+        history.setdefault("tasks", {})
+        history.setdefault("commands", {})
+        return history
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Error loading learner history for {user}: {e}. Starting with empty history.")
+        return empty_history()
+
+def save_learner_history(user: str, history: Dict[str, Any]):
+    """Writes a learner's history atomically."""
+    path = _history_path(user)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(LEARNER_HISTORY_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(history, f, indent=4)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        print(f"Error saving learner history for {user}: {e}")
+
+def _answer_quality(attempts: int, hints_used: int) -> int:
+    """Maps a solved task to an SM-2 quality grade between 3 and 5."""
+    if attempts <= 1:
+        quality = 5
+    elif attempts <= 2:
+        quality = 4
+    else:
+        quality = 3
+    return max(3, quality - min(hints_used, 2))
+
+def record_task_outcome(history: Dict[str, Any], task: Task, outcome: str, attempts: int,
+                        hints_used: int, seconds_spent: float, now: Optional[float] = None):
+    """Updates the per-task and per-command statistics and schedules the task's next review."""
+    now = time.time() if now is None else now
+    stats = history["tasks"].setdefault(task.id, {
+        "attempts": 0, "solved": 0, "failures": 0, "hints": 0, "skips": 0,
+        "total_solve_seconds": 0.0, "ease": DEFAULT_EASE, "interval_days": 0, "streak": 0,
+        "last_seen": 0.0, "due": 0.0,
+    })
+    stats["attempts"] += attempts
+    stats["hints"] += hints_used
+    stats["last_seen"] = now
+    solved = outcome == OUTCOME_SOLVED
+    # When solved, every attempt before the correct one was wrong; otherwise all of them were
+    failed_attempts = max(attempts - 1, 0) if solved else attempts
+    stats["failures"] += failed_attempts
+
+    if solved:
+        stats["solved"] += 1
+        stats["total_solve_seconds"] += seconds_spent
+        quality = _answer_quality(attempts, hints_used)
+        stats["ease"] = max(MIN_EASE, stats["ease"] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        stats["streak"] += 1
+        if stats["streak"] == 1:
+            stats["interval_days"] = 1
+        elif stats["streak"] == 2:
+            stats["interval_days"] = 3
+        else:
+            stats["interval_days"] = round(stats["interval_days"] * stats["ease"])
+    else:
+        stats["skips"] += 1
+        stats["ease"] = max(MIN_EASE, stats["ease"] - 0.2)
+        stats["streak"] = 0
+        stats["interval_days"] = 0 # Due again right away
+    stats["due"] = now + stats["interval_days"] * SECONDS_PER_DAY
+
+    for command in get_task_individual_commands(task.command_to_practice):
+        command_stats = history["commands"].setdefault(command, {"attempts": 0, "solved": 0, "failures": 0})
+        command_stats["attempts"] += attempts
+        command_stats["solved"] += 1 if solved else 0
+        command_stats["failures"] += failed_attempts
+
+def _failure_ratio(stats: Dict[str, Any]) -> float:
+    attempts = stats.get("attempts", 0) + stats.get("hints", 0) * 0.5 + stats.get("skips", 0)
+    if attempts <= 0:
+        return UNSEEN_COMMAND_WEAKNESS
+    failures = stats.get("failures", 0) + stats.get("hints", 0) * 0.5 + stats.get("skips", 0)
+    return min(failures / attempts, 1.0)
+
+class TaskScheduler:
+    """Priority queue that orders tasks by due date, pulling weak tasks forward.
+
+    Unseen tasks are due immediately and ranked by how weak the learner is on their commands.
+    push/pop are O(log n), so selecting the next task stays cheap over large banks.
+    """
+
+    def __init__(self, tasks: List[Task], history: Dict[str, Any], now: Optional[float] = None):
+        self.history = history
+        self.now = time.time() if now is None else now
+        self._heap: List[Any] = []
+        for task in tasks:
+            self.push(task)
+
+    def priority(self, task: Task) -> float:
+        task_stats = self.history["tasks"].get(task.id)
+        if task_stats is None:
+            commands = get_task_individual_commands(task.command_to_practice)
+            command_ratios = [_failure_ratio(self.history["commands"].get(cmd, {})) for cmd in commands]
+            weakness = sum(command_ratios) / len(command_ratios) if command_ratios else UNSEEN_COMMAND_WEAKNESS
+            due = self.now
+        else:
+            weakness = _failure_ratio(task_stats)
+            due = task_stats.get("due", self.now)
+        return due - weakness * WEAKNESS_WEIGHT_SECONDS
+
+    def push(self, task: Task):
+        # The random tie-breaker keeps equally ranked tasks in a different order every session
+        heapq.heappush(self._heap, (self.priority(task), random.random(), task.id, task))
+
+    def pop_next(self) -> Optional[Task]:
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[-1]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def ordered(self) -> List[Task]:
+        """Drains the queue and returns the tasks in scheduled order."""
+        ordered_tasks = []
+        while self._heap:
+            ordered_tasks.append(self.pop_next())
+        return ordered_tasks
@@ -11,27 +11,39 @@ if __name__ == "__main__" and (__package__ is None or __package__ == ''):
     # Set __package__ to tell Python that this module is part of the 'src' package
     __package__ = "src"
 
-from .task_loader import load_all_tasks, Task
-from .evaluator import evaluate_command, execute_command
-from typing import List, Dict
+# Imported first: with CMD_PRACTICE_PROFILE set, profiling starts before the other modules load
+from .profiling import stage, start_profiling, PROFILE_MODE_FULL, PROFILE_MODE_TIMERS
+from .task_loader import Task
+from .task_catalog import TaskCatalog, TaskWatcher
+from .task_query import CatalogTaskIndex, TaskIndex, TaskQuery, matching_tasks, parse_query
+from .safe_regex import retain_task_patterns
+from .host_capabilities import HostCapabilities
+from .task_timeouts import TaskTimeouts, task_timeout
+from .colors import Colors
+from .task_setup import private_task_sandbox, setup_task_environment
+from .evaluator import evaluate_command, execute_command, TIMEOUT_MESSAGE_PREFIX
+from .command_output import CommandOutput
+from .verdict_cache import verdict_cache_from_env
+from .answer_index import answer_index_from_env
+from .event_log import (event_log_from_env, VERDICT_CORRECT, VERDICT_INCORRECT, VERDICT_SKIPPED,
+                        VERDICT_ANSWER_SHOWN)
+from .file_viewer import parse_view_spec, render_view, DEFAULT_SHOW_LINES
+from .output_view import OutputRenderer, OUTPUT_STREAMS
+from .man_search import ManIndex, load_or_build_man_index
+from .learner_history import (load_learner_history, save_learner_history, record_task_outcome, TaskScheduler,
+                              OUTCOME_SOLVED, OUTCOME_SKIPPED, OUTCOME_ANSWER_SHOWN)
+from typing import List, Dict, Optional, Tuple
 import readline # For autocompletion
+import argparse
+import contextlib
 import os
+import sys
 import glob
 import json # For caching
 import time # For cache timestamp
 import random # For shuffling tasks
-
-# ANSI escape codes for colors
-class Colors:
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m' # For hints or warnings
-    RED = '\033[91m'    # For errors or incorrect answers
-    ENDC = '\033[0m'    # Resets color
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
-    CYAN = '\033[96m'   # For stdout/stderr distinctions
+import queue # Catalog changes, from the watcher thread to the session loop
+import uuid # For attempt log session ids
 
 # --- Autocompletion Setup ---
 COMMAND_KEYWORDS = ['hint', 'skip', 'quit', 'show', 'help', 'answer']
@@ -43,6 +55,8 @@ HIGHSCORE_FILE = "highscores.json"
 MAN_PAGES_FILE = "man_pages.json" # Added constant
 
 MAN_PAGES_DATA: Dict[str, str] = {} # Added global for man page data
+MAN_INDEX: ManIndex | None = None # Full-text index over the man pages, built on first use
+MAN_SEARCH_RESULTS_SHOWN = 5
 
 def load_man_pages():
     """Loads man page information from the JSON file."""
@@ -60,6 +74,25 @@ def load_man_pages():
         print(f"{Colors.RED}Error loading man pages: {e}. Man command might not work as expected.{Colors.ENDC}")
         MAN_PAGES_DATA = {}
 
+def get_man_index() -> ManIndex:
+    """Returns the man page search index, loading it from disk or building it on first use."""
+    global MAN_INDEX
+    if MAN_INDEX is None:
+        MAN_INDEX = load_or_build_man_index(MAN_PAGES_FILE)
+    return MAN_INDEX
+
+def print_man_search_results(query: str) -> bool:
+    """Prints ranked man page entries for a free-text query. Returns False if nothing matched."""
+    results = get_man_index().search(query, limit=MAN_SEARCH_RESULTS_SHOWN)
+    if not results:
+        return False
+    print(f"\n{Colors.HEADER}Man pages matching '{query}':{Colors.ENDC}")
+    for score, doc in results:
+        summary = doc["text"].strip().splitlines()[0] if doc["text"].strip() else ""
+        source_note = " (system)" if doc["source"] == "system" else ""
+        print(f"  {Colors.CYAN}{doc['name']}{source_note}{Colors.ENDC} - {summary[:100]}")
+    return True
+
 def load_highscores() -> Dict[str, int]:
     """Loads highscores from the JSON file."""
     if not os.path.exists(HIGHSCORE_FILE):
@@ -152,8 +185,10 @@ def update_path_executables():
     print(f"{Colors.YELLOW}Finished scanning PATH.{Colors.ENDC}")
 
 # Call once at the start
-update_path_executables()
-load_man_pages() # Call to load man pages
+with stage("startup.path_executables"):
+    update_path_executables()
+with stage("startup.man_pages"):
+    load_man_pages() # Call to load man pages
 
 CURRENT_TASK_WORKING_DIR = "."
 
@@ -263,60 +298,6 @@ else:
     readline.parse_and_bind("tab: complete")
 readline.set_completer(path_completer)
 
-def setup_task_environment(task: Task):
-    """Sets up the environment for a given task, e.g., creating files and directories."""
-    if not task.setup_files:
-        return
-
-    print(f"{Colors.YELLOW}Setting up task environment...{Colors.ENDC}")
-    
-    base_working_dir = task.input_details.get("working_directory", ".")
-    try:
-        if base_working_dir != ".": # Avoid creating the current directory if it's "."
-            os.makedirs(base_working_dir, exist_ok=True)
-            print(f"{Colors.BLUE}  Ensured base working directory exists: {base_working_dir}{Colors.ENDC}")
-    except OSError as e:
-        print(f"{Colors.RED}  Error creating base working directory {base_working_dir}: {e}. Setup might fail.{Colors.ENDC}")
-        # Decide if we should return or try to continue
-        # For now, let's try to continue, individual file/dir ops will show further errors.
-
-    for setup_action in task.setup_files:
-        action = setup_action.get("action")
-        relative_path = setup_action.get("path") # Path relative to working_directory
-        content = setup_action.get("content", "")
-
-        if not relative_path:
-            print(f"{Colors.RED}Error in task setup: Action '{action}' missing 'path'. Skipping.{Colors.ENDC}")
-            continue
-            
-        # Construct the full path using the task's working directory
-        full_path = os.path.join(base_working_dir, relative_path)
-
-        if action == "create_file":
-            try:
-                # Ensure parent directory of the file exists
-                dir_name = os.path.dirname(full_path)
-                if dir_name:
-                    os.makedirs(dir_name, exist_ok=True)
-                
-                with open(full_path, 'w') as f:
-                    f.write(content)
-                print(f"{Colors.GREEN}  Created/Overwritten file: {full_path}{Colors.ENDC}")
-            except IOError as e:
-                print(f"{Colors.RED}  Error creating/writing file {full_path}: {e}{Colors.ENDC}")
-            except OSError as e: # Catch potential errors from makedirs for file's parent
-                print(f"{Colors.RED}  Error ensuring directory for file {full_path}: {e}{Colors.ENDC}")
-
-        elif action == "create_directory":
-            try:
-                os.makedirs(full_path, exist_ok=True)
-                print(f"{Colors.GREEN}  Ensured directory: {full_path}{Colors.ENDC}")
-            except OSError as e:
-                print(f"{Colors.RED}  Error creating directory {full_path}: {e}{Colors.ENDC}")
-        else:
-            print(f"{Colors.YELLOW}  Unknown setup action '{action}' for path '{relative_path}'. Skipping.{Colors.ENDC}")
-    print(f"{Colors.YELLOW}Task environment setup complete.{Colors.ENDC}")
-
 def display_task(task: Task):
     """Displays the task information to the user with colors."""
     global CURRENT_TASK_WORKING_DIR
@@ -333,31 +314,100 @@ def display_task(task: Task):
         print(f"{Colors.BLUE}Relevant file(s): {Colors.YELLOW}{', '.join(task.input_details['required_files_for_task'])}{Colors.ENDC}")
     print(f"{Colors.BLUE}{'-'*(len(task.description) if len(task.description) < 40 else 40)}{Colors.ENDC}")
 
-def run_practice_session():
-    """Main function to run the command-line practice session."""
+def is_more_command(user_command: str) -> bool:
+    """True for the in-session `more [stdout|stderr] [view]`; `more notes.txt` still runs the real more."""
+    args = user_command.split()
+    if not args or args[0] != "more":
+        return False
+    if len(args) == 1 or args[1].lower() in OUTPUT_STREAMS:
+        return True
+    try:
+        parse_view_spec(args[1:])
+        return True
+    except ValueError:
+        return False
+
+def show_file(display_name: str, full_path: str, view: str = "head", params: tuple = (DEFAULT_SHOW_LINES,),
+              view_command: str | None = None) -> bool:
+    """Prints a bounded, mmap-backed view of a file. Returns True if something was displayed."""
+    if os.path.isdir(full_path):
+        print(f"{Colors.YELLOW}Skipping directory: {display_name}{Colors.ENDC}")
+        return False
+    try:
+        lines, note = render_view(full_path, view, params, display_name, view_command)
+    except IOError as e:
+        print(f"{Colors.RED}Error reading file {display_name}: {e}{Colors.ENDC}")
+        return False
+    except Exception as e:
+        print(f"{Colors.RED}An unexpected error occurred while trying to show {display_name}: {e}{Colors.ENDC}")
+        return False
+    print(f"{Colors.CYAN}File: {display_name}{Colors.ENDC}")
+    print(f"{Colors.BLUE}{'-'*20}{Colors.ENDC}")
+    if lines:
+        print("\n".join(lines))
+    print(f"{Colors.BLUE}{'-'*20}{Colors.ENDC}")
+    if note:
+        print(f"{Colors.YELLOW}{note}{Colors.ENDC}")
+    return True
+
+def run_practice_session(query: str | None = None, task_catalog: TaskCatalog | None = None,
+                         task_index: TaskIndex | None = None, forked: bool = False):
+    """Main function to run the command-line practice session.
+    A session server passes the catalog and task index it preloaded and sets forked (see session_server.py):
+    the session re-scans the catalog before each task, and each task runs in a private sandbox, since many
+    sessions share one project directory.
+    """
     print(f"{Colors.GREEN}{Colors.BOLD}Welcome to the Command-Line Practice Tool!{Colors.ENDC}")
     display_highscores() # Display highscores at the start
-    all_tasks = load_all_tasks()
+    # The catalog is kept up to date by a background watcher (or a re-scan before each task in
+    # a forked session), so tasks edited or added while the session runs are picked up without a restart.
+    if task_catalog is None:
+        with stage("load_tasks"):
+            # Tasks needing tools this host lacks are hidden; per-flavor variants are applied
+            task_catalog = TaskCatalog(host=HostCapabilities(), timeouts=TaskTimeouts())
+    if task_catalog.hidden:
+        hidden_list = ", ".join(f"{task_id} ({reason})" for task_id, reason in sorted(task_catalog.hidden.items()))
+        print(f"{Colors.YELLOW}Hidden {len(task_catalog.hidden)} task(s) that cannot run on this host: {hidden_list}{Colors.ENDC}")
+    if not forked: # One watcher per session would be one inotify instance per learner; the server refreshes before each fork
+        TaskWatcher(task_catalog).start()
+    all_tasks = task_catalog.tasks()
 
     if not all_tasks:
         print(f"{Colors.RED}No tasks found. Please add some task files to the 'tasks' directory.{Colors.ENDC}")
         return
 
+    # Facet bitsets over the bank; menu counts and filters below are set operations on these.
+    # Listeners keep them, and the compiled regexes, in step with the catalog as tasks change.
+    with stage("build_task_index"):
+        live_index = CatalogTaskIndex(task_catalog, task_index)
+    task_catalog.add_listener(lambda changed_ids, removed_ids: retain_task_patterns(task_catalog.tasks()))
+
+    if query is not None:
+        try:
+            selection = parse_query(query)
+            tasks = live_index.index.tasks_for(live_index.index.select(selection))
+        except ValueError as e:
+            print(f"{Colors.RED}Invalid task query '{query}': {e}{Colors.ENDC}")
+            return
+        if not tasks:
+            print(f"{Colors.RED}No tasks match the query '{query}'. Exiting.{Colors.ENDC}")
+            return
+        random.shuffle(tasks) # Reordered per learner below
+        print(f"{Colors.GREEN}Starting session with {len(tasks)} task(s) matching '{query}'...{Colors.ENDC}")
+    else:
+        tasks, selection = select_tasks_interactively(live_index.index)
+        if not tasks:
+            return
+
+    run_task_loop(tasks, task_catalog, private_sandboxes=forked, selection=selection, refresh_catalog=forked)
+
+def select_tasks_interactively(task_index: TaskIndex) -> Tuple[List[Task], TaskQuery]:
+    """Asks for command(s) and a difficulty level. Returns the selected tasks (shuffled), or no tasks to exit,
+    and the selection as a query, so tasks added to the bank later can join the session.
+    """
     # --- Command Selection ---
-    def get_task_individual_commands(command_str: str) -> List[str]:
-        if not command_str:
-            return []
-        # Split by comma, strip whitespace from each part, filter out empty strings, then unique and sort.
-        return sorted(list(set(c.strip() for c in command_str.split(',') if c.strip())))
-
-    all_unique_individual_commands = set()
-    if all_tasks:
-        for task in all_tasks:
-            for cmd_part in get_task_individual_commands(task.command_to_practice):
-                all_unique_individual_commands.add(cmd_part)
-    
     # This is the list of unique individual commands like ["awk", "find", "grep", "ls", "mv", ...]
-    available_individual_commands = sorted(list(all_unique_individual_commands))
+    available_individual_commands = task_index.values("commands")
     
     selected_commands_list: List[str] = [] # Stores user's chosen *individual* commands
     filter_by_all_commands = False
@@ -366,13 +416,8 @@ def run_practice_session():
         while True:
             print(f"\n{Colors.HEADER}Select command(s) to practice (optional):{Colors.ENDC}")
             
-            command_task_counts_display = {"all": len(all_tasks)}
-            for ind_cmd in available_individual_commands:
-                count = 0
-                for task in all_tasks:
-                    if ind_cmd in get_task_individual_commands(task.command_to_practice):
-                        count += 1
-                command_task_counts_display[ind_cmd] = count
+            command_task_counts_display = {"all": len(task_index.tasks)}
+            command_task_counts_display.update(task_index.facet_counts("commands"))
 
             # options_display will be like ["all", "awk", "find", "grep", ...]
             options_display = ["all"] + available_individual_commands
@@ -448,56 +493,36 @@ def run_practice_session():
         filter_by_all_commands = True 
 
     # Task Filtering Logic
-    filtered_by_command_tasks: List[Task] = []
     command_display_name = "All Commands" 
 
     if filter_by_all_commands or not selected_commands_list: # If "all" or no specific commands were effectively chosen
-        filtered_by_command_tasks = all_tasks
+        command_mask = task_index.all_mask
         # command_display_name remains "All Commands"
     else:
-        temp_filtered_list = []
-        for task in all_tasks:
-            task_inds = get_task_individual_commands(task.command_to_practice)
-            # Include task if any of its individual commands are in the user's selected list
-            if any(sel_cmd in task_inds for sel_cmd in selected_commands_list):
-                temp_filtered_list.append(task)
-        filtered_by_command_tasks = temp_filtered_list
-        if selected_commands_list: # Ensure display name is updated only if there are selections
-             command_display_name = ", ".join([cmd.capitalize() for cmd in selected_commands_list])
-
-    if not filtered_by_command_tasks:
+        # Include task if any of its individual commands are in the user's selected list
+        command_mask = task_index.any_of("commands", selected_commands_list)
+        command_display_name = ", ".join([cmd.capitalize() for cmd in selected_commands_list])
+
+    if not command_mask:
         if filter_by_all_commands or not selected_commands_list : # No specific filter applied or filter yielded nothing from all_tasks
              print(f"{Colors.RED}No tasks found at all. Please check the 'tasks' directory or your filter.{Colors.ENDC}")
         else: # Specific commands were selected, but no tasks matched them
              print(f"{Colors.RED}No tasks found for the selected command(s): {command_display_name}. Exiting.{Colors.ENDC}")
-        return
+        return [], {}
     # --- End Command Selection ---
 
     # --- Difficulty Selection ---
-    available_difficulties = sorted(list(set(task.difficulty for task in filtered_by_command_tasks if task.difficulty)))
-    
-    # Define the desired order for difficulties
-    difficulty_order = ["easy", "medium", "hard"]
-    
-    # Sort available_difficulties according to difficulty_order
-    # Start with levels that are in our defined order
-    custom_sorted_difficulties = [d for d in difficulty_order if d in available_difficulties]
-    # Add any other difficulties not in our predefined order (e.g., if a new one was added to a task file)
-    # These will be appended at the end, sorted alphabetically among themselves.
-    for d in available_difficulties:
-        if d not in custom_sorted_difficulties:
-            custom_sorted_difficulties.append(d)
+    # Levels in easy/medium/hard order, followed by any other levels found in task files
+    custom_sorted_difficulties = task_index.values("difficulty", command_mask)
+    # Task counts for each difficulty within the command-filtered tasks
+    task_counts = {"all": task_index.count(command_mask)}
+    task_counts.update(task_index.facet_counts("difficulty", command_mask))
             
     prompt_options = ["all"] + custom_sorted_difficulties
     difficulty_choice = ""
 
     while True:
         print(f"\n{Colors.HEADER}Select a difficulty level to practice (for command(s): {command_display_name}):{Colors.ENDC}")
-        # Calculate task counts for each difficulty based on already filtered tasks
-        task_counts = {"all": len(filtered_by_command_tasks)}
-        for diff_level in custom_sorted_difficulties:
-            task_counts[diff_level] = sum(1 for task in filtered_by_command_tasks if task.difficulty == diff_level)
-
         for i, level in enumerate(prompt_options):
             count = task_counts.get(level, 0) # Use .get for safety if a difficulty level has 0 tasks after command filtering
             print(f"  {Colors.YELLOW}{i + 1}. {level.capitalize()} ({count} task{'s' if count != 1 else ''}){Colors.ENDC}")
@@ -526,20 +551,41 @@ def run_practice_session():
         except ValueError as e:
             print(f"{Colors.RED}Invalid input: {e}. Please enter a valid number or name.{Colors.ENDC}")
 
-    tasks: List[Task] = []
     if difficulty_choice == "all":
-        tasks = filtered_by_command_tasks # Use command-filtered tasks
+        selected_mask = command_mask # Use command-filtered tasks
     else:
-        tasks = [task for task in filtered_by_command_tasks if task.difficulty == difficulty_choice]
+        selected_mask = command_mask & task_index.posting("difficulty", difficulty_choice)
+    tasks = task_index.tasks_for(selected_mask)
 
     if not tasks:
         print(f"{Colors.RED}No tasks found for the selected command(s) '{command_display_name}' and difficulty '{difficulty_choice.capitalize()}'. Exiting.{Colors.ENDC}")
-        return
+        return [], {}
     
-    random.shuffle(tasks) # Randomize the order of the selected tasks
+    random.shuffle(tasks) # Randomize the order of the selected tasks (reordered per learner below)
     
     print(f"{Colors.GREEN}Starting session with {len(tasks)} task(s) (Command(s): {command_display_name}, Difficulty: {difficulty_choice.capitalize()})...{Colors.ENDC}")
     # --- End Difficulty Selection ---
+    selection: TaskQuery = {}
+    if not filter_by_all_commands and selected_commands_list:
+        selection["commands"] = [[(False, command)] for command in selected_commands_list]
+    if difficulty_choice != "all":
+        selection["difficulty"] = [[(False, difficulty_choice)]]
+    return tasks, selection
+
+def run_task_loop(tasks: List[Task], task_catalog: TaskCatalog, private_sandboxes: bool = False,
+                  selection: Optional[TaskQuery] = None, refresh_catalog: bool = False):
+    """Runs the practice loop over the selected tasks until they are done or the learner quits.
+    With private_sandboxes, each task is set up and graded in its own copy of its working directory.
+    Tasks added to the bank during the session join it when they match selection. With refresh_catalog
+    (a session no watcher keeps current), the catalog is re-scanned before each task.
+    """
+
+    verdict_cache = verdict_cache_from_env() # Opt-in via CMD_PRACTICE_VERDICT_CACHE=1
+    answer_index = answer_index_from_env() # Disable with CMD_PRACTICE_ANSWER_INDEX=0
+    # Listeners run on the watcher thread; the session's own state only changes here, between tasks
+    catalog_changes: "queue.SimpleQueue[Tuple[List[str], List[str]]]" = queue.SimpleQueue()
+    task_catalog.add_listener(lambda changed_ids, removed_ids: catalog_changes.put((changed_ids, removed_ids)))
+    output_renderer = OutputRenderer()
 
     # Initialize session statistics
     session_stats = {
@@ -556,19 +602,88 @@ def run_practice_session():
     if not user_name:
         user_name = "Anonymous"
 
+    # Order tasks by the learner's history: due and weak tasks first, well-known ones later.
+    # Guests get the random order and nothing is persisted for them.
+    learner_history = None
+    if user_name != "guest":
+        learner_history = load_learner_history(user_name)
+        if learner_history["tasks"] or learner_history["commands"]:
+            tasks = TaskScheduler(tasks, learner_history).ordered()
+            print(f"{Colors.YELLOW}Tasks ordered using your practice history.{Colors.ENDC}")
+
+    def record_outcome(outcome: str):
+        """Stores the outcome of the current task in the learner's history."""
+        if learner_history is None:
+            return
+        record_task_outcome(learner_history, task, outcome, current_task_attempts, hint_level,
+                            time.time() - task_start_time)
+        save_learner_history(user_name, learner_history)
+
+    attempt_log = event_log_from_env() # Disable with CMD_PRACTICE_EVENT_LOG=0
+    session_id = uuid.uuid4().hex[:12]
+
+    def log_attempt(verdict: str, command: str = "", evaluation_seconds: float = 0.0,
+                    stdout: Optional[CommandOutput] = None, stderr: Optional[CommandOutput] = None):
+        """Appends the current attempt to the attempt log."""
+        if attempt_log is None:
+            return
+        stdout, stderr = stdout or CommandOutput(), stderr or CommandOutput()
+        attempt_log.append({
+            "session": session_id, "user": user_name, "task_id": task.id, "verdict": verdict,
+            "command": command, "attempt": current_task_attempts, "hint_level": hint_level,
+            "seconds_since_task_start": round(time.time() - task_start_time, 3),
+            "evaluation_seconds": round(evaluation_seconds, 4),
+            "stdout_bytes": stdout.size, "stderr_bytes": stderr.size,
+            "timeout_seconds": task_timeout(task), "timed_out": stderr.startswith(TIMEOUT_MESSAGE_PREFIX.encode()),
+        })
+
+    def add_new_tasks(changed_ids: List[str], removed_ids: List[str]):
+        """Catalog listener: appends tasks added to the bank that match the session's selection."""
+        session_ids = {session_task.id for session_task in tasks}
+        added = [task_catalog.get(task_id) for task_id in changed_ids if task_id not in session_ids]
+        tasks.extend(matching_tasks([added_task for added_task in added if added_task is not None], selection))
+
+    def apply_catalog_changes():
+        """Applies the catalog changes queued since the last call to the session's tasks and answer index."""
+        while True:
+            try:
+                changed_ids, removed_ids = catalog_changes.get_nowait()
+            except queue.Empty:
+                return
+            if answer_index is not None: # A changed task's example solution seeds its index anew
+                answer_index.forget(changed_ids + removed_ids)
+            if selection is not None:
+                add_new_tasks(changed_ids, removed_ids)
+
     current_task_index = 0
     hint_level = 0
     user_command = "" # Initialize user_command
+    task_sandbox = contextlib.ExitStack() # The current task's private sandbox, if any
 
-    while current_task_index < len(tasks):
-        task = tasks[current_task_index]
+    while True:
+        if refresh_catalog:
+            task_catalog.refresh() # One stat per task file; queues the changes if something changed
+        apply_catalog_changes()
+        if current_task_index >= len(tasks):
+            break
+        # Use the latest version of the task in case its file changed since the session started
+        task = task_catalog.get(tasks[current_task_index].id)
+        if task is None:
+            print(f"{Colors.YELLOW}Task '{tasks[current_task_index].id}' was removed from the task bank. Skipping.{Colors.ENDC}")
+            current_task_index += 1
+            continue
+        task_sandbox.close() # Discards the previous task's sandbox
+        if private_sandboxes:
+            task = task_sandbox.enter_context(private_task_sandbox(task, "cmd-practice-session-"))
         current_task_attempts = 0 # Track attempts for this specific task
         # Only increment session_tasks_attempted once per task when the user first sees it or makes an attempt.
         # For simplicity, let's count an attempt when they submit their first command for this task instance.
         # A more precise way would be upon first display, but this is fine.
         
-        setup_task_environment(task)
+        with stage("setup_task_environment"):
+            setup_task_environment(task)
         display_task(task)
+        task_start_time = time.time()
 
         while True: # Inner loop for retrying the current task
             prompt_text = task.input_details.get("prompt_for_command", "Enter your command")
@@ -588,24 +703,30 @@ def run_practice_session():
                 break 
             elif user_command_lower == 'skip':
                 print(f"{Colors.YELLOW}Skipping task.{Colors.ENDC}")
+                current_task_attempts -= 1 # 'skip' itself is not an attempt
+                record_outcome(OUTCOME_SKIPPED)
+                log_attempt(VERDICT_SKIPPED)
                 current_task_index += 1
                 hint_level = 0
                 # Ensure task is marked as attempted but not correct if skipped
                 # (Already handled by tasks_attempted incrementing on first command submit)
                 # If difficulty tracking is per task, ensure it's also marked for this difficulty
-                session_stats["difficulties_attempted"].setdefault(difficulty_choice, {"correct": 0, "total": 0})["total"] = \
-                    session_stats["difficulties_attempted"].get(difficulty_choice, {}).get("total", 0) + 1
+                session_stats["difficulties_attempted"].setdefault(task.difficulty, {"correct": 0, "total": 0})["total"] = \
+                    session_stats["difficulties_attempted"].get(task.difficulty, {}).get("total", 0) + 1
                 break
             elif user_command_lower == 'answer':
                 print(f"{Colors.HEADER}{Colors.BOLD}--- Task Answer ---{Colors.ENDC}")
                 print(f"{Colors.GREEN}The example solution is: {task.example_solution}{Colors.ENDC}")
                 print(f"{Colors.YELLOW}No points awarded for this task.{Colors.ENDC}")
+                current_task_attempts -= 1 # 'answer' itself is not an attempt
+                record_outcome(OUTCOME_ANSWER_SHOWN)
+                log_attempt(VERDICT_ANSWER_SHOWN)
                 
                 # Update session stats: task attempted, but not correct
                 # tasks_attempted is already incremented on first command submission
                 # Ensure difficulty tracking reflects an attempt for this difficulty
-                session_stats["difficulties_attempted"].setdefault(difficulty_choice, {"correct": 0, "total": 0})["total"] = \
-                    session_stats["difficulties_attempted"].get(difficulty_choice, {}).get("total", 0) + 1
+                session_stats["difficulties_attempted"].setdefault(task.difficulty, {"correct": 0, "total": 0})["total"] = \
+                    session_stats["difficulties_attempted"].get(task.difficulty, {}).get("total", 0) + 1
                 
                 current_task_index += 1
                 hint_level = 0
@@ -640,26 +761,9 @@ def run_practice_session():
                             full_path = os.path.join(CURRENT_TASK_WORKING_DIR, file_path_from_task)
                         
                         if os.path.exists(full_path):
-                            try:
-                                # Check if it's a directory first
-                                if os.path.isdir(full_path):
-                                    print(f"{Colors.YELLOW}Skipping directory: {file_path_from_task}{Colors.ENDC}")
-                                    # Optionally, list directory contents if desired in future
-                                    # print(f"{Colors.BLUE}Contents of directory {file_path_from_task}:{Colors.ENDC}")
-                                    # for item in os.listdir(full_path):
-                                    #     print(f"  {item}")
-                                    continue
-                                with open(full_path, 'r') as f:
-                                    content = f.read()
-                                print(f"{Colors.CYAN}File: {file_path_from_task}{Colors.ENDC}")
-                                print(f"{Colors.BLUE}{'-'*20}{Colors.ENDC}")
-                                print(content.strip()) # .strip() to remove trailing newlines from print
-                                print(f"{Colors.BLUE}{'-'*20}{Colors.ENDC}")
+                            # Only the first DEFAULT_SHOW_LINES lines; 'show <file> ...' pages through the rest
+                            if show_file(file_path_from_task, full_path):
                                 files_shown_count += 1
-                            except IOError as e:
-                                print(f"{Colors.RED}Error reading file {file_path_from_task}: {e}{Colors.ENDC}")
-                            except Exception as e:
-                                print(f"{Colors.RED}An unexpected error occurred while trying to show {file_path_from_task}: {e}{Colors.ENDC}")
                         else:
                             # Check if it was a setup file to show its intended content
                             found_in_setup = False
@@ -691,13 +795,57 @@ def run_practice_session():
                      session_stats["tasks_attempted"] -=1
                 # No need to increment session_stats["total_attempts_overall"] for 'show'
                 continue
+            elif user_command_lower.startswith("show "):
+                # show <file> [start:end | head [n] | tail [n] | /text]
+                show_args = user_command.split()[1:]
+                file_arg = show_args[0]
+                full_path = file_arg if os.path.isabs(file_arg) else os.path.join(CURRENT_TASK_WORKING_DIR, file_arg)
+                try:
+                    view, params = parse_view_spec(show_args[1:])
+                except ValueError as e:
+                    print(f"{Colors.RED}Invalid show arguments: {e}. Usage: show <file> [start:end | head [n] | tail [n] | /text]{Colors.ENDC}")
+                    view = None
+                if view is not None:
+                    if os.path.exists(full_path):
+                        show_file(file_arg, full_path, view, params)
+                    else:
+                        print(f"{Colors.YELLOW}File not found: {file_arg} (at {full_path}){Colors.ENDC}")
+                current_task_attempts -=1 
+                if current_task_attempts < 0: current_task_attempts = 0
+                if session_stats["tasks_attempted"] > 0 and current_task_attempts == 0:
+                     session_stats["tasks_attempted"] -=1
+                continue
+            elif is_more_command(user_command):
+                # more [stdout|stderr] [start:end | head [n] | tail [n] | /text]
+                more_args = user_command.split()[1:]
+                stream_name = more_args.pop(0).lower() if more_args and more_args[0].lower() in OUTPUT_STREAMS else "stdout"
+                spooled_path = output_renderer.spooled_path(stream_name)
+                try:
+                    view, params = parse_view_spec(more_args)
+                except ValueError as e:
+                    print(f"{Colors.RED}Invalid more arguments: {e}. Usage: more [stdout|stderr] [start:end | head [n] | tail [n] | /text]{Colors.ENDC}")
+                    view = None
+                if view is not None:
+                    if spooled_path:
+                        more_command = "more" if stream_name == "stdout" else f"more {stream_name}"
+                        show_file(f"last {stream_name}", spooled_path, view, params, more_command)
+                    else:
+                        print(f"{Colors.YELLOW}The last command's {stream_name} was shown in full.{Colors.ENDC}")
+                current_task_attempts -=1 
+                if current_task_attempts < 0: current_task_attempts = 0
+                if session_stats["tasks_attempted"] > 0 and current_task_attempts == 0:
+                     session_stats["tasks_attempted"] -=1
+                continue
             elif user_command_lower == 'help':
                 print(f"\n{Colors.HEADER}{Colors.BOLD}--- Available Commands ---{Colors.ENDC}")
                 print(f"{Colors.CYAN}help{Colors.ENDC}                - Show this help message.")
                 print(f"{Colors.CYAN}hint{Colors.ENDC}                - Get a hint for the current task.")
-                print(f"{Colors.CYAN}show{Colors.ENDC}                - Show relevant files for the current task.")
+                print(f"{Colors.CYAN}show{Colors.ENDC}                - Show relevant files for the current task (first {DEFAULT_SHOW_LINES} lines each).")
+                print(f"{Colors.CYAN}show <file> [view]{Colors.ENDC}  - Page through a file: 'start:end', 'head [n]', 'tail [n]' or '/text' to search.")
+                print(f"{Colors.CYAN}more [stderr] [view]{Colors.ENDC}- Page through the full output of the last command (same views as 'show').")
                 print(f"{Colors.CYAN}answer{Colors.ENDC}              - Show the answer for the current task (no points).")
                 print(f"{Colors.CYAN}man <command_name>{Colors.ENDC}  - Show manual page info for a specific command.")
+                print(f"{Colors.CYAN}man -k <words>{Colors.ENDC}      - Search the manual page info, e.g. man -k field separator.")
                 print(f"{Colors.CYAN}skip{Colors.ENDC}                - Skip the current task.")
                 print(f"{Colors.CYAN}quit{Colors.ENDC}                - Exit the practice tool.")
                 print(f"{Colors.HEADER}{Colors.BOLD}------------------------{Colors.ENDC}")
@@ -708,10 +856,20 @@ def run_practice_session():
                 continue
             elif user_command_lower.startswith("man "):
                 command_name = user_command.split(" ", 1)[1].strip()
-                if command_name in MAN_PAGES_DATA:
+                if command_name.startswith("-k"):
+                    # man -k "field separator": ranked full-text search
+                    query = command_name[2:].strip().strip("'\"")
+                    if not query or not print_man_search_results(query):
+                        print(f"{Colors.YELLOW}No man page info matches '{query}'.{Colors.ENDC}")
+                elif command_name in MAN_PAGES_DATA:
                     print(f"\n{Colors.GREEN}{MAN_PAGES_DATA[command_name]}{Colors.ENDC}")
                 else:
-                    print(f"{Colors.YELLOW}No man page info found for '{command_name}'. Try \'man {command_name}\' in your actual terminal.{Colors.ENDC}")
+                    closest_names = get_man_index().closest_names(command_name)
+                    if closest_names and closest_names[0] in MAN_PAGES_DATA:
+                        print(f"{Colors.YELLOW}No man page info found for '{command_name}'. Showing '{closest_names[0]}':{Colors.ENDC}")
+                        print(f"\n{Colors.GREEN}{MAN_PAGES_DATA[closest_names[0]]}{Colors.ENDC}")
+                    elif not print_man_search_results(command_name):
+                        print(f"{Colors.YELLOW}No man page info found for '{command_name}'. Try \'man {command_name}\' in your actual terminal.{Colors.ENDC}")
                 current_task_attempts -=1
                 if current_task_attempts < 0: current_task_attempts = 0 # Ensure not negative
                 if session_stats["tasks_attempted"] > 0 and current_task_attempts == 0: # if it was the first action and now it's not an attempt
@@ -722,16 +880,14 @@ def run_practice_session():
             # If we reach here, the command is an attempt to solve the task
             session_stats["total_attempts_overall"] += 1
 
-            is_correct, actual_stdout, actual_stderr = evaluate_command(user_command, task)
+            evaluation_started = time.perf_counter()
+            with stage("evaluate_command"):
+                is_correct, actual_stdout, actual_stderr = evaluate_command(user_command, task, verdict_cache)
+            log_attempt(VERDICT_CORRECT if is_correct else VERDICT_INCORRECT, user_command,
+                        time.perf_counter() - evaluation_started, actual_stdout, actual_stderr)
 
-            print(f"\n{Colors.BOLD}--- Output ---{Colors.ENDC}")
-            if actual_stdout:
-                print(f"{Colors.CYAN}Stdout:{Colors.ENDC}")
-                print(actual_stdout)
-            if actual_stderr:
-                print(f"{Colors.RED}Stderr:{Colors.ENDC}")
-                print(actual_stderr)
-            print(f"{Colors.BOLD}--------------{Colors.ENDC}")
+            # Bounded to a head/tail window; the full output stays available through 'more'
+            output_renderer.render(actual_stdout, actual_stderr)
 
             if is_correct:
                 print(f"\n{Colors.GREEN}{Colors.BOLD}Correct! Well done.{Colors.ENDC}")
@@ -740,20 +896,30 @@ def run_practice_session():
                     session_stats["tasks_correct_first_try"] += 1
                     print(f"{Colors.GREEN}{Colors.BOLD}Solved on the first try!{Colors.ENDC}")
                 session_stats["commands_practiced"].add(user_command)
-                session_stats["difficulties_attempted"].setdefault(difficulty_choice, {"correct": 0, "total": 0})["correct"] += 1
-                session_stats["difficulties_attempted"].setdefault(difficulty_choice, {"correct": 0, "total": 0})["total"] += 1
+                if answer_index is not None:
+                    answer_index.add(task, user_command)
+                session_stats["difficulties_attempted"].setdefault(task.difficulty, {"correct": 0, "total": 0})["correct"] += 1
+                session_stats["difficulties_attempted"].setdefault(task.difficulty, {"correct": 0, "total": 0})["total"] += 1
+                record_outcome(OUTCOME_SOLVED)
                 current_task_index += 1
                 hint_level = 0
                 input(f"{Colors.GREEN}Press Enter to continue to the next task...{Colors.ENDC}")
                 break # Breaks inner (retry) loop, advances to next task
             else:
                 print(f"\n{Colors.RED}{Colors.BOLD}Incorrect. Please try again.{Colors.ENDC}")
+                feedback = answer_index.feedback(task, user_command) if answer_index is not None else None
+                if feedback:
+                    print(f"{Colors.YELLOW}{feedback}{Colors.ENDC}")
                 # User will be prompted by the 'Try again or type...' input at the start of the inner loop
                 # No need for specific retry/skip/quit here as the main input handles it.
         
         if user_command.lower().strip() == 'quit': # If quit was chosen, break outer (tasks) loop too
             break
                 
+    task_sandbox.close()
+    if attempt_log is not None:
+        attempt_log.flush()
+
     if current_task_index >= len(tasks) and (not user_command or user_command.lower().strip() != 'quit'):
         print(f"\n{Colors.GREEN}{Colors.BOLD}Congratulations! You've completed all available tasks for this session.{Colors.ENDC}")
 
@@ -814,9 +980,30 @@ def exit_app(status_code=0):
     print(f"{Colors.YELLOW}Exiting application...{Colors.ENDC}") # Optional exit message
     sys.exit(status_code)
 
-if __name__ == "__main__":
+def main(argv: List[str] | None = None, task_catalog: TaskCatalog | None = None, task_index: TaskIndex | None = None,
+         forked: bool = False):
+    """Entry point for the `cmd-practice` console script (and for sessions forked by the session server)."""
+    parser = argparse.ArgumentParser(description="An interactive command-line tool to practice shell commands.")
+    parser.add_argument("--selftest", action="store_true",
+                        help="Check every task's example_solution against its own evaluation and exit. "
+                             "Remaining arguments are passed to the self-test (see python -m src.selftest --help).")
+    parser.add_argument("--query", metavar="QUERY",
+                        help="Practice the tasks matching a query instead of choosing from the menus, "
+                             "e.g. \"commands=grep&awk difficulty=hard\" or \"tags=pipes&!destructive\".")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_MODE_FULL, choices=[PROFILE_MODE_FULL, PROFILE_MODE_TIMERS],
+                        help="Time each stage and write a report at exit. 'full' (the default) also runs cProfile "
+                             "and tracemalloc. Set CMD_PRACTICE_PROFILE instead to include startup work.")
+    args, remaining_args = parser.parse_known_args(argv)
+
+    if args.profile:
+        start_profiling(args.profile)
+
+    if args.selftest:
+        from .selftest import main as selftest_main
+        sys.exit(selftest_main(remaining_args))
+
     try:
-        run_practice_session()
+        run_practice_session(args.query, task_catalog, task_index, forked)
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Session interrupted by user. Exiting...{Colors.ENDC}")
     finally:
@@ -824,3 +1011,6 @@ if __name__ == "__main__":
         # For example, ensuring readline history is saved if you implement that
         pass # No specific cleanup in this version
     # display_summary_and_exit is now called from within run_practice_session before quit_event is set
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import bisect
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+MAN_INDEX_FILE = ".man_index.json"
+SYSTEM_MAN_ENV_VAR = "CMD_PRACTICE_SYSTEM_MAN" # Set to "1" to also index the host's man pages
+INDEX_FORMAT_VERSION = 1
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query terms not in the vocabulary are expanded to close terms, with a lower weight
+PREFIX_MATCH_WEIGHT = 0.8
+TYPO_MATCH_WEIGHT = 0.6
+MAX_TERM_EXPANSIONS = 8
+NAME_MATCH_BONUS = 2.0
+MAX_NAME_TYPO_DISTANCE = 2
+
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "e", "for", "from", "g", "how", "i", "in",
+             "is", "it", "of", "on", "or", "the", "this", "to", "use", "with"}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+OVERSTRIKE_PATTERN = re.compile(r".\x08") # Bold/underline in raw man output
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def edit_distance(a: str, b: str) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, so `srot` is 1 away from `sort`."""
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        previous_previous, previous = previous, current
+    return previous[len(b)]
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def render_system_man_page(command: str) -> Optional[str]:
+    """Renders the host's man page for command as plain text, or None if unavailable."""
+    if not shutil.which("man"):
+        return None
+    try:
+        process = subprocess.run(["man", command], capture_output=True, text=True, timeout=10,
+                                 env=dict(os.environ, MANPAGER="cat", PAGER="cat", MANWIDTH="80"))
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    if process.returncode != 0 or not process.stdout:
+        return None
+    return OVERSTRIKE_PATTERN.sub("", process.stdout)
+
+class ManIndex:
+    """Inverted index with BM25 ranking over man page entries.
+
+    Documents come from man_pages.json and, optionally, the rendered system man pages of the
+    same commands. The index is persisted to MAN_INDEX_FILE and reused until a source changes.
+    """
+
+    def __init__(self, docs: List[Dict[str, str]]):
+        self.docs = docs # [{"name": ..., "source": "man_pages.json" | "system", "text": ...}]
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list) # term -> [(doc id, term frequency)]
+        self.doc_lengths: List[int] = []
+        for doc_id, doc in enumerate(docs):
+            counts = Counter(tokenize(doc["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((doc_id, frequency))
+        self._finish()
+
+    def _finish(self):
+        self.average_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        self.vocabulary = sorted(self.postings)
+        self.name_docs: Dict[str, List[int]] = defaultdict(list)
+        for doc_id, doc in enumerate(self.docs):
+            self.name_docs[doc["name"]].append(doc_id)
+        # Deletion neighbourhoods find terms one typo away without scanning the vocabulary
+        self.delete_map: Dict[str, List[str]] = defaultdict(list)
+        for term in self.vocabulary:
+            for deleted in _deletes(term):
+                self.delete_map[deleted].append(term)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ManIndex":
+        index = cls.__new__(cls)
+        index.docs = data["docs"]
+        index.postings = defaultdict(list, {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()})
+        index.doc_lengths = data["doc_lengths"]
+        index._finish()
+        return index
+
+    def to_dict(self) -> Dict:
+        return {"docs": self.docs, "postings": self.postings, "doc_lengths": self.doc_lengths}
+
+    def names(self) -> List[str]:
+        return sorted(self.name_docs)
+
+    def expand_term(self, term: str) -> Dict[str, float]:
+        """Maps a query term to indexed terms with weights: exact, prefix, then one-typo matches."""
+        if term in self.postings:
+            return {term: 1.0}
+        expansions: Dict[str, float] = {}
+        position = bisect.bisect_left(self.vocabulary, term)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(term) \
+                and len(expansions) < MAX_TERM_EXPANSIONS:
+            expansions[self.vocabulary[position]] = PREFIX_MATCH_WEIGHT
+            position += 1
+        candidates = set(self.delete_map.get(term, [])) # Indexed terms with one extra character
+        for deleted in _deletes(term):
+            if deleted in self.postings: # Indexed terms missing one character
+                candidates.add(deleted)
+            candidates.update(self.delete_map.get(deleted, [])) # Substitutions and transpositions
+        for candidate in sorted(candidates):
+            if len(expansions) >= MAX_TERM_EXPANSIONS:
+                break
+            if candidate not in expansions and edit_distance(term, candidate) <= 1:
+                expansions[candidate] = TYPO_MATCH_WEIGHT
+        return expansions
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, str]]]:
+        """Returns up to limit (score, doc) pairs ranked by BM25."""
+        scores: Dict[int, float] = defaultdict(float)
+        doc_count = len(self.docs)
+        for query_term in tokenize(query):
+            for term, weight in self.expand_term(query_term).items():
+                postings = self.postings.get(term, [])
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings:
+                    length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (self.average_length or 1)
+                    scores[doc_id] += weight * idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+            for doc_id in self.name_docs.get(query_term, []):
+                scores[doc_id] += NAME_MATCH_BONUS
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, self.docs[doc_id]) for doc_id, score in ranked]
+
+    def closest_names(self, name: str) -> List[str]:
+        """Command names within a small edit distance of name, closest first (e.g. 'srot' -> ['sort'])."""
+        distances = [(edit_distance(name, candidate), candidate) for candidate in self.names()]
+        return [candidate for distance, candidate in sorted(distances) if distance <= MAX_NAME_TYPO_DISTANCE]
+
+    def document(self, name: str, source: str = "man_pages.json") -> Optional[Dict[str, str]]:
+        return next((doc for doc in self.docs if doc["name"] == name and doc["source"] == source), None)
+
+def _source_signature(man_pages_file: str, include_system: bool) -> Dict:
+    try:
+        stat_result = os.stat(man_pages_file)
+        file_signature = [stat_result.st_size, stat_result.st_mtime_ns]
+    except OSError:
+        file_signature = None
+    return {"version": INDEX_FORMAT_VERSION, "man_pages_file": file_signature,
+            "system": include_system and shutil.which("man") is not None}
+
+def build_man_index(man_pages_file: str, include_system: bool = False) -> ManIndex:
+    docs: List[Dict[str, str]] = []
+    try:
+        with open(man_pages_file, 'r') as f:
+            man_pages = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        man_pages = {}
+    for name, text in man_pages.items():
+        docs.append({"name": name, "source": "man_pages.json", "text": text})
+    if include_system:
+        for name in man_pages: # Render once; the result is cached in the persisted index
+            text = render_system_man_page(name)
+            if text:
+                docs.append({"name": name, "source": "system", "text": text})
+    return ManIndex(docs)
+
+def load_or_build_man_index(man_pages_file: str, index_file: str = MAN_INDEX_FILE,
+                            include_system: Optional[bool] = None) -> ManIndex:
+    """Loads the persisted index if its sources are unchanged, otherwise rebuilds and saves it."""
+    if include_system is None:
+        include_system = os.environ.get(SYSTEM_MAN_ENV_VAR, "") in ("1", "true", "yes")
+    signature = _source_signature(man_pages_file, include_system)
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("signature") == signature:
+                return ManIndex.from_dict(data)
+        except (json.JSONDecodeError, IOError, KeyError):
+            pass # Corrupt or outdated, rebuild below
+
+    index = build_man_index(man_pages_file, include_system)
+    try:
+        tmp_path = f"{index_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(index.to_dict(), signature=signature), f)
+        os.replace(tmp_path, index_file)
+    except IOError as e:
+        print(f"Warning: Could not save man page index: {e}")
+    return index
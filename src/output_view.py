@@ -0,0 +1,150 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from .colors import Colors
+from .command_output import CommandOutput
+
+OUTPUT_HEAD_LINES_ENV_VAR = "CMD_PRACTICE_OUTPUT_HEAD_LINES"
+OUTPUT_TAIL_LINES_ENV_VAR = "CMD_PRACTICE_OUTPUT_TAIL_LINES"
+DEFAULT_HEAD_LINES = 20
+DEFAULT_TAIL_LINES = 10
+MAX_WINDOW_LINE_CHARS = 500 # A single huge line (minified JSON, binary junk) is cut in the window too
+OUTPUT_STREAMS = ("stdout", "stderr")
+
+def format_size(size: int) -> str:
+    for unit in ("bytes", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def head_tail_window(output: CommandOutput, head_lines: int, tail_lines: int) -> Tuple[str, str, int, bool]:
+    """The first head_lines and last tail_lines lines of the output, found in its bytes.
+
+    Only the two windows are decoded, however large the output is. Returns (head, tail, total
+    lines, truncated); tail is empty when the whole output fits in the head.
+    """
+    total_lines = output.count_lines()
+    if total_lines <= head_lines + tail_lines:
+        return output.text, "", total_lines, False
+    head_end = -1
+    for _ in range(head_lines):
+        head_end = output.find(b"\n", head_end + 1)
+    tail_start = output.size
+    for _ in range(tail_lines):
+        tail_start = output.rfind(b"\n", 0, tail_start)
+    head = output.decode(output.start, output.start + max(head_end, 0))
+    tail = output.decode(output.start + tail_start + 1, output.end) if tail_lines else ""
+    return head, tail, total_lines, True
+
+def clip_long_lines(text: str) -> Tuple[str, bool]:
+    """Cuts lines longer than MAX_WINDOW_LINE_CHARS. Returns (text, whether anything was cut)."""
+    if len(text) <= MAX_WINDOW_LINE_CHARS: # Common case: nothing can be too long
+        return text, False
+    lines = text.split("\n")
+    if all(len(line) <= MAX_WINDOW_LINE_CHARS for line in lines):
+        return text, False
+    return "\n".join(line if len(line) <= MAX_WINDOW_LINE_CHARS
+                     else f"{line[:MAX_WINDOW_LINE_CHARS]}... [{len(line) - MAX_WINDOW_LINE_CHARS} more characters]"
+                     for line in lines), True
+
+_SPOOL_DIRECTORIES: List[str] = []
+
+def remove_spool_directories():
+    """Removes this process's spool directories; for exits that skip atexit (os._exit in a forked session)."""
+    while _SPOOL_DIRECTORIES:
+        shutil.rmtree(_SPOOL_DIRECTORIES.pop(), True)
+
+class OutputSpool:
+    """Keeps the full output of the last attempt in temp files, for the `more` command.
+
+    Only truncated outputs are spooled. The files live in one private temp directory that is
+    removed at exit.
+    """
+
+    def __init__(self):
+        self.directory: Optional[str] = None
+        self.paths: Dict[str, str] = {} # stream name -> file with the last attempt's full output
+
+    def clear(self):
+        for path in self.paths.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.paths.clear()
+
+    def store(self, name: str, output: CommandOutput) -> int:
+        """Writes a stream's full output to the spool, as captured. Returns its size in bytes."""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="cmd-practice-output-")
+            if not _SPOOL_DIRECTORIES:
+                atexit.register(remove_spool_directories)
+            _SPOOL_DIRECTORIES.append(self.directory)
+        path = os.path.join(self.directory, f"{name}.txt")
+        with open(path, 'wb') as f:
+            f.write(output.view()) # Straight from the capture buffer, no decoding
+        self.paths[name] = path
+        return output.size
+
+class OutputRenderer:
+    """Prints command output through one buffered write, bounded to a head/tail window per stream.
+
+    Truncated streams get a summary line and are spooled in full for `more`. Output text itself is
+    written without ANSI colors; only the frame around it is colored.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, head_lines: Optional[int] = None, tail_lines: Optional[int] = None):
+        self.stream = stream
+        self.head_lines = head_lines if head_lines is not None else _env_int(OUTPUT_HEAD_LINES_ENV_VAR, DEFAULT_HEAD_LINES)
+        self.tail_lines = tail_lines if tail_lines is not None else _env_int(OUTPUT_TAIL_LINES_ENV_VAR, DEFAULT_TAIL_LINES)
+        self.spool = OutputSpool()
+
+    def _render_stream(self, chunks: List[str], name: str, label: str, color: str, output: CommandOutput):
+        chunks.append(f"{color}{label}:{Colors.ENDC}\n")
+        head, tail, total_lines, truncated = head_tail_window(output, self.head_lines, self.tail_lines)
+        head, head_clipped = clip_long_lines(head)
+        tail, tail_clipped = clip_long_lines(tail)
+        chunks.append(head + "\n")
+        if not truncated and not head_clipped:
+            return
+        size = self.spool.store(name, output)
+        more_command = "more" if name == "stdout" else f"more {name}"
+        if truncated:
+            hidden_lines = total_lines - self.head_lines - self.tail_lines
+            chunks.append(f"{Colors.YELLOW}... {hidden_lines} more line(s) not shown ({total_lines} lines, "
+                          f"{format_size(size)} in total). Type '{more_command}' to page through all of it.{Colors.ENDC}\n")
+        if tail:
+            chunks.append(tail + "\n")
+        if (head_clipped or tail_clipped) and not truncated:
+            chunks.append(f"{Colors.YELLOW}Long lines were cut. Type '{more_command}' to see them in full.{Colors.ENDC}\n")
+        if output.truncated:
+            chunks.append(f"{Colors.YELLOW}Only the first {format_size(len(output.buffer))} of "
+                          f"{format_size(output.total_bytes)} were kept.{Colors.ENDC}\n")
+
+    def render(self, stdout: CommandOutput, stderr: CommandOutput):
+        """Prints the output frame for one attempt."""
+        self.spool.clear()
+        chunks = [f"\n{Colors.BOLD}--- Output ---{Colors.ENDC}\n"]
+        if stdout:
+            self._render_stream(chunks, "stdout", "Stdout", Colors.CYAN, stdout)
+        if stderr:
+            self._render_stream(chunks, "stderr", "Stderr", Colors.RED, stderr)
+        chunks.append(f"{Colors.BOLD}--------------{Colors.ENDC}\n")
+        # The whole frame in one write (sys.stdout flushes once per write, not once per line)
+        stream = self.stream or sys.stdout
+        stream.write("".join(chunks))
+        stream.flush()
+
+    def spooled_path(self, name: str) -> Optional[str]:
+        return self.spool.paths.get(name)
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        print(f"Warning: {name} must be a number. Using {default}.")
+        return default
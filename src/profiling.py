@@ -0,0 +1,159 @@
+import atexit
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_ENV_VAR = "CMD_PRACTICE_PROFILE" # "timers" for stage timers only, "1"/"full" adds cProfile and tracemalloc
+PROFILE_DIR_ENV_VAR = "CMD_PRACTICE_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = ".profile"
+PROFILE_MODE_TIMERS = "timers"
+PROFILE_MODE_FULL = "full"
+TOP_FUNCTIONS_SHOWN = 15
+TOP_ALLOCATIONS_SHOWN = 15
+
+_NO_STAGE = contextlib.nullcontext()
+_PROFILER: Optional["Profiler"] = None # Set only while profiling; stage() checks nothing else
+
+class _Stage:
+    """Context manager timing one stage. Nested stages form stacks (e.g. session;evaluate;execute_command)."""
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._stack.append(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._record(time.perf_counter() - self.started)
+        return False
+
+class Profiler:
+    """Collects per-stage wall times and, in full mode, a cProfile profile and tracemalloc snapshot."""
+
+    def __init__(self, mode: str = PROFILE_MODE_FULL, output_dir: str = DEFAULT_PROFILE_DIR):
+        self.mode = mode
+        self.output_dir = output_dir
+        self.started = time.perf_counter()
+        self._stack: List[str] = []
+        self.stages: Dict[str, List[float]] = {} # stage name -> [calls, total seconds, max seconds]
+        self.stack_seconds: Dict[Tuple[str, ...], float] = {} # stage stack -> total seconds, children included
+        self.cprofile: Optional[cProfile.Profile] = None
+        if mode == PROFILE_MODE_FULL:
+            tracemalloc.start()
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def _record(self, seconds: float):
+        stack = tuple(self._stack)
+        name = self._stack.pop()
+        totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+        self.stack_seconds[stack] = self.stack_seconds.get(stack, 0.0) + seconds
+
+    def collapsed_stacks(self) -> List[str]:
+        """Stage stacks in the collapsed format read by flamegraph.pl/speedscope, weighted by self time in us."""
+        child_seconds: Dict[Tuple[str, ...], float] = {}
+        for stack, seconds in self.stack_seconds.items():
+            if len(stack) > 1:
+                child_seconds[stack[:-1]] = child_seconds.get(stack[:-1], 0.0) + seconds
+        lines = []
+        for stack, seconds in sorted(self.stack_seconds.items()):
+            self_micros = int((seconds - child_seconds.get(stack, 0.0)) * 1_000_000)
+            if self_micros > 0:
+                lines.append(f"{';'.join(stack)} {self_micros}")
+        return lines
+
+    def summary_lines(self) -> List[str]:
+        wall_seconds = time.perf_counter() - self.started
+        lines = [f"Profile ({self.mode}): {wall_seconds:.3f}s wall",
+                 f"{'stage':<40} {'calls':>7} {'total s':>10} {'mean ms':>10} {'max ms':>10}"]
+        for name, (calls, total, maximum) in sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"{name:<40} {calls:>7} {total:>10.3f} {total / calls * 1000:>10.2f} {maximum * 1000:>10.2f}")
+        return lines
+
+    def write_report(self):
+        """Prints the stage table and writes the profile files. Called once, at exit."""
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        summary = self.summary_lines()
+        base_name = os.path.join(self.output_dir, f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        written = []
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(f"{base_name}.stages.collapsed", 'w') as f:
+                f.write("\n".join(self.collapsed_stacks()) + "\n")
+            written.append(f"{base_name}.stages.collapsed")
+            if self.cprofile is not None:
+                self.cprofile.dump_stats(f"{base_name}.pstats")
+                written.append(f"{base_name}.pstats")
+                summary += ["", f"Top {TOP_FUNCTIONS_SHOWN} functions by cumulative time:"]
+                summary += self._top_functions()
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                summary += ["", f"Memory: {current / 1024:.0f} KiB allocated at exit, {peak / 1024:.0f} KiB peak",
+                            f"Top {TOP_ALLOCATIONS_SHOWN} allocation sites:"]
+                summary += [f"  {stat}" for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS_SHOWN]]
+            with open(f"{base_name}.summary.txt", 'w') as f:
+                f.write("\n".join(summary) + "\n")
+            written.append(f"{base_name}.summary.txt")
+        except IOError as e:
+            print(f"Error writing profile output: {e}", file=sys.stderr)
+        # stderr, so a profiled run's stdout stays the same as an unprofiled one
+        print("\n".join(summary), file=sys.stderr)
+        if written:
+            print(f"Profile written to: {', '.join(written)}", file=sys.stderr)
+
+    def _top_functions(self) -> List[str]:
+        rows = []
+        stats = pstats.Stats(self.cprofile)
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS_SHOWN]
+        for (filename, line, function_name), (_, call_count, _, cumulative, _) in entries:
+            rows.append(f"  {cumulative:9.3f}s {call_count:8d}  {function_name} ({os.path.basename(filename)}:{line})")
+        return rows
+
+def stage(name: str):
+    """Times the enclosed block as a named stage when profiling is on; a shared no-op otherwise."""
+    if _PROFILER is None:
+        return _NO_STAGE
+    return _PROFILER.stage(name)
+
+def start_profiling(mode: str = PROFILE_MODE_FULL, output_dir: Optional[str] = None) -> Profiler:
+    """Turns profiling on for the rest of the process. The report is written at exit."""
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = Profiler(mode, output_dir or os.environ.get(PROFILE_DIR_ENV_VAR) or DEFAULT_PROFILE_DIR)
+        atexit.register(stop_profiling)
+    return _PROFILER
+
+def stop_profiling():
+    """Writes the report and turns profiling off. Runs at exit; call it directly where atexit is skipped."""
+    global _PROFILER
+    if _PROFILER is not None:
+        profiler, _PROFILER = _PROFILER, None
+        profiler.write_report()
+
+def profile_mode_from_env() -> Optional[str]:
+    setting = os.environ.get(PROFILE_ENV_VAR, "").lower()
+    if not setting or setting in ("0", "false", "no"):
+        return None
+    return PROFILE_MODE_TIMERS if setting == PROFILE_MODE_TIMERS else PROFILE_MODE_FULL
+
+# Started at import when set in the environment, so import-time work (PATH scan, man pages) is covered too
+if profile_mode_from_env():
+    start_profiling(profile_mode_from_env())
@@ -0,0 +1,575 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/safe_regex.py` as well as `python -m src.safe_regex`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import multiprocessing
+import re
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .colors import Colors
+from .task_loader import Task, load_all_tasks, TASKS_DIR
+
+# Searches in the worker process (patterns outside the linear-time subset, and long texts) are killed after this long
+FALLBACK_BUDGET_SECONDS = 2.0
+INLINE_SEARCH_CHARS = 65536 # Longer texts are searched in the worker process, under the budget
+MAX_PROGRAM_SIZE = 5000 # NFA instructions; `x{1000}{1000}` and the like use the fallback instead
+MAX_DFA_STATES = 2000 # Cached DFA states per pattern before the cache is flushed
+SUPPORTED_FLAGS = re.MULTILINE
+SIMPLE_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "a": "\a"}
+COUNTED_REPEAT = re.compile(r"\{(\d+)(,(\d*))?\}")
+
+class UnsupportedPattern(Exception):
+    """The pattern uses something the linear-time engine does not implement."""
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+# Character predicates of the class escapes, with Python's str-pattern (Unicode) semantics
+CLASS_ESCAPES: Dict[str, Callable[[str], bool]] = {
+    "d": str.isdecimal, "D": lambda char: not char.isdecimal(),
+    "w": _is_word, "W": lambda char: not _is_word(char),
+    "s": str.isspace, "S": lambda char: not char.isspace(),
+}
+
+# Zero-width assertions. Each depends only on the flags of the position it is checked at.
+AT_TEXT_START, AT_LINE_START, AT_TEXT_END, AT_LINE_END, BEFORE_FINAL_NEWLINE, AT_WORD_BOUNDARY = (1 << i for i in range(6))
+
+def _assertion_holds(kind: str, flags: int, multiline: bool) -> bool:
+    if kind == "^":
+        return bool(flags & (AT_TEXT_START | AT_LINE_START)) if multiline else bool(flags & AT_TEXT_START)
+    if kind == "$":
+        return bool(flags & (AT_TEXT_END | AT_LINE_END)) if multiline else bool(flags & (AT_TEXT_END | BEFORE_FINAL_NEWLINE))
+    if kind == "A":
+        return bool(flags & AT_TEXT_START)
+    if kind == "Z":
+        return bool(flags & AT_TEXT_END)
+    if kind == "b":
+        return bool(flags & AT_WORD_BOUNDARY)
+    return not flags & AT_WORD_BOUNDARY # "B"
+
+def _position_flags(text: str, position: int) -> int:
+    previous = text[position - 1] if position else None
+    following = text[position] if position < len(text) else None
+    flags = 0
+    if previous is None:
+        flags |= AT_TEXT_START
+    elif previous == "\n":
+        flags |= AT_LINE_START
+    if following is None:
+        flags |= AT_TEXT_END
+    elif following == "\n":
+        flags |= AT_LINE_END
+        if position == len(text) - 1:
+            flags |= BEFORE_FINAL_NEWLINE
+    if (previous is not None and _is_word(previous)) != (following is not None and _is_word(following)):
+        flags |= AT_WORD_BOUNDARY
+    return flags
+
+class _Parser:
+    """Parses the supported subset of Python regex syntax into a small AST of tuples.
+
+    Nodes: ("char", predicate), ("cat", [nodes]), ("alt", [nodes]), ("repeat", node, min, max or None)
+    and ("assert", kind). Anything outside the subset raises UnsupportedPattern; the pattern is
+    already known to be valid Python syntax, so the parser can be strict rather than complete.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.pattern[self.position] if self.position < len(self.pattern) else None
+
+    def take(self) -> str:
+        char = self.pattern[self.position]
+        self.position += 1
+        return char
+
+    def parse(self):
+        node = self.alternation()
+        if self.position != len(self.pattern): # An unbalanced ")"; re.compile would have refused it
+            raise UnsupportedPattern(f"unexpected '{self.peek()}'")
+        return node
+
+    def alternation(self):
+        branches = [self.concatenation()]
+        while self.peek() == "|":
+            self.take()
+            branches.append(self.concatenation())
+        return branches[0] if len(branches) == 1 else ("alt", branches)
+
+    def concatenation(self):
+        items = []
+        while self.peek() is not None and self.peek() not in "|)":
+            items.append(self.quantified(self.atom()))
+        return ("cat", items)
+
+    def quantified(self, node):
+        while True:
+            char = self.peek()
+            if char in ("*", "+", "?"):
+                self.take()
+                bounds = {"*": (0, None), "+": (1, None), "?": (0, 1)}[char]
+            elif char == "{" and COUNTED_REPEAT.match(self.pattern, self.position):
+                match = COUNTED_REPEAT.match(self.pattern, self.position)
+                self.position = match.end()
+                low = int(match.group(1))
+                high = low if match.group(2) is None else (int(match.group(3)) if match.group(3) else None)
+                bounds = (low, high)
+            else:
+                return node
+            if node[0] == "assert":
+                raise UnsupportedPattern("quantified assertion")
+            if self.peek() == "?": # Lazy: the same language, and only "is there a match" is asked
+                self.take()
+            elif self.peek() == "+":
+                raise UnsupportedPattern("possessive quantifier")
+            node = ("repeat", node, bounds[0], bounds[1])
+
+    def atom(self):
+        char = self.take()
+        if char == "(":
+            if self.peek() == "?":
+                if self.pattern.startswith("?:", self.position):
+                    self.position += 2
+                else:
+                    raise UnsupportedPattern(f"group extension '(?{self.pattern[self.position + 1:self.position + 2]}'")
+            node = self.alternation()
+            if self.peek() != ")":
+                raise UnsupportedPattern("unclosed group")
+            self.take()
+            return node
+        if char == "[":
+            return ("char", self.character_class())
+        if char == ".":
+            return ("char", lambda c: c != "\n")
+        if char in "^$":
+            return ("assert", char)
+        if char == "\\":
+            return self.escape()
+        if char == "{": # A literal brace that does not start a valid counted repeat
+            raise UnsupportedPattern("literal '{'")
+        if char in "*+?":
+            raise UnsupportedPattern("nothing to repeat")
+        return ("char", char.__eq__)
+
+    def escape(self):
+        if self.peek() is None:
+            raise UnsupportedPattern("trailing backslash")
+        char = self.take()
+        if char in CLASS_ESCAPES:
+            return ("char", CLASS_ESCAPES[char])
+        if char in "bBAZ":
+            return ("assert", char)
+        if char in SIMPLE_ESCAPES:
+            return ("char", SIMPLE_ESCAPES[char].__eq__)
+        if not char.isalnum():
+            return ("char", char.__eq__)
+        raise UnsupportedPattern(f"escape '\\{char}'") # Backreferences, \x, \u, \N{...}, ...
+
+    def class_item(self) -> Tuple[Optional[str], Optional[Callable[[str], bool]]]:
+        """One class member, as (literal character, None) or (None, predicate)."""
+        char = self.take()
+        if char == "[":
+            raise UnsupportedPattern("'[' inside a character class")
+        if char != "\\":
+            return char, None
+        if self.peek() is None:
+            raise UnsupportedPattern("trailing backslash")
+        escaped = self.take()
+        if escaped in CLASS_ESCAPES:
+            return None, CLASS_ESCAPES[escaped]
+        if escaped in SIMPLE_ESCAPES:
+            return SIMPLE_ESCAPES[escaped], None
+        if not escaped.isalnum():
+            return escaped, None
+        raise UnsupportedPattern(f"escape '\\{escaped}' in a character class")
+
+    def character_class(self) -> Callable[[str], bool]:
+        negated = self.peek() == "^"
+        if negated:
+            self.take()
+        literals, ranges, predicates = set(), [], []
+        first = True
+        while True:
+            if self.peek() is None:
+                raise UnsupportedPattern("unclosed character class")
+            if self.peek() == "]" and not first:
+                self.take()
+                break
+            first = False
+            literal, predicate = self.class_item()
+            if predicate is not None:
+                predicates.append(predicate)
+                continue
+            if self.peek() == "-" and self.pattern[self.position + 1:self.position + 2] not in ("]", ""):
+                self.take()
+                high, high_predicate = self.class_item()
+                if high_predicate is not None:
+                    raise UnsupportedPattern("class escape as a range bound")
+                ranges.append((literal, high))
+            else:
+                literals.add(literal)
+
+        def matches(char: str) -> bool:
+            found = (char in literals or any(low <= char <= high for low, high in ranges)
+                     or any(predicate(char) for predicate in predicates))
+            return found != negated
+        return matches
+
+def _backtrack_safe(node, repeated: bool = False) -> bool:
+    """Whether `re` can run the pattern without exponential backtracking: no variable repeat or
+    alternation inside a repeat, so there is only one way for the repeated part to match a run of
+    text (`(a+)+` and `(a|ab)*` are out, `total .*\\n.* app\\.log` is fine).
+    """
+    kind = node[0]
+    if kind in ("char", "assert"):
+        return True
+    if kind == "cat":
+        return all(_backtrack_safe(item, repeated) for item in node[1])
+    if kind == "alt":
+        return not repeated and all(_backtrack_safe(branch, repeated) for branch in node[1])
+    _, inner, low, high = node # repeat
+    variable = high is None or high > low
+    if variable and repeated:
+        return False
+    return _backtrack_safe(inner, repeated or variable or (high or 0) > 1)
+
+class _Program:
+    """A Thompson NFA as a list of instructions:
+    ("char", predicate, next), ("split", a, b), ("assert", kind, next) and ("match",).
+    """
+
+    def __init__(self):
+        self.instructions: List[Any] = []
+
+    def emit(self, instruction) -> int:
+        if len(self.instructions) >= MAX_PROGRAM_SIZE:
+            raise UnsupportedPattern(f"more than {MAX_PROGRAM_SIZE} NFA instructions")
+        self.instructions.append(instruction)
+        return len(self.instructions) - 1
+
+    def patch(self, index: int, instruction):
+        self.instructions[index] = instruction
+
+    def compile(self, node, following: int) -> int:
+        """Emits node so that it continues at instruction `following`. Returns its entry point."""
+        kind = node[0]
+        if kind == "char":
+            return self.emit(("char", node[1], following))
+        if kind == "assert":
+            return self.emit(("assert", node[1], following))
+        if kind == "cat":
+            for item in reversed(node[1]): # Built back to front, so every part knows where it continues
+                following = self.compile(item, following)
+            return following
+        if kind == "alt":
+            entries = [self.compile(branch, following) for branch in node[1]]
+            entry = entries[-1]
+            for branch_entry in reversed(entries[:-1]):
+                entry = self.emit(("split", branch_entry, entry))
+            return entry
+        _, inner, low, high = node # repeat
+        if high is None: # Loop: split back into the node or continue
+            loop = self.emit(None)
+            self.patch(loop, ("split", self.compile(inner, loop), following))
+            following = loop
+        else:
+            for _ in range(high - low): # Optional copies
+                following = self.emit(("split", self.compile(inner, following), following))
+        for _ in range(low): # Mandatory copies
+            following = self.compile(inner, following)
+        return following
+
+class _DfaCache:
+    """The DFA states built so far. Flushing the cache swaps in a new one, so a search already
+    running keeps a consistent set of states.
+    """
+
+    def __init__(self):
+        self.state_ids: Dict[frozenset, int] = {}
+        self.states: List[frozenset] = [] # DFA state id -> NFA instructions it is made of, before closure
+        self.transitions: List[Dict[Any, int]] = []
+
+    def state_id(self, kernel: frozenset) -> int:
+        state = self.state_ids.get(kernel)
+        if state is None:
+            state = len(self.states)
+            self.state_ids[kernel] = state
+            self.states.append(kernel)
+            self.transitions.append({})
+        return state
+
+class LinearPattern:
+    """A regex in the linear-time subset: a Thompson NFA run as a lazily built DFA.
+
+    Every input character costs one transition lookup (states are built on first use), so a
+    search is linear in the text, whatever the pattern. Only whether there is a match is computed.
+    The DFA is pure Python, though, so texts over INLINE_SEARCH_CHARS are searched in the worker
+    process under the time budget: with `re` if the pattern cannot backtrack exponentially, else
+    with the DFA.
+    """
+
+    linear = True
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self.multiline = bool(flags & re.MULTILINE)
+        tree = _Parser(pattern).parse()
+        program = _Program()
+        match_index = program.emit(("match",))
+        self.start = program.compile(tree, match_index)
+        self.instructions = program.instructions
+        self.backtrack_safe = _backtrack_safe(tree)
+        self.has_assertions = any(instruction[0] == "assert" for instruction in self.instructions)
+        self.word_boundaries = any(instruction[0] == "assert" and instruction[1] in "bB" for instruction in self.instructions)
+        self._lock = threading.Lock() # Guards building DFA states, e.g. by grading worker threads
+        self._reset_cache()
+
+    @property
+    def engine(self) -> str:
+        return "re" if self.backtrack_safe else "linear"
+
+    def _reset_cache(self):
+        cache = _DfaCache()
+        cache.state_id(frozenset((self.start,))) # State 0: the start state
+        self._cache = cache
+
+    def _closure(self, kernel: frozenset, flags: int) -> Tuple[List[int], bool]:
+        """Instructions reachable without consuming a character, as (char instructions, reaches match)."""
+        seen, stack, consuming = set(), list(kernel), []
+        while stack:
+            index = stack.pop()
+            if index in seen:
+                continue
+            seen.add(index)
+            instruction = self.instructions[index]
+            kind = instruction[0]
+            if kind == "char":
+                consuming.append(index)
+            elif kind == "split":
+                stack.append(instruction[1])
+                stack.append(instruction[2])
+            elif kind == "assert":
+                if _assertion_holds(instruction[1], flags, self.multiline):
+                    stack.append(instruction[2])
+            else: # match
+                return consuming, True
+        return consuming, False
+
+    def _step(self, cache: _DfaCache, state: int, flags: int, char: str) -> int:
+        """The DFA state after char, or -1 if a match ends before it."""
+        consuming, matched = self._closure(cache.states[state], flags)
+        if matched:
+            return -1
+        # The start instruction is added at every position: an unanchored search
+        following = {self.instructions[index][2] for index in consuming if self.instructions[index][1](char)}
+        following.add(self.start)
+        return cache.state_id(frozenset(following))
+
+    def _transition(self, cache: _DfaCache, state: int, key, flags: int, char: str) -> int:
+        with self._lock: # Only while a state is built; lookups of built states take no lock
+            following = cache.transitions[state].get(key)
+            if following is None:
+                following = self._step(cache, state, flags, char)
+                cache.transitions[state][key] = following
+            return following
+
+    def scan(self, text: str) -> bool:
+        """Runs the DFA over text, in this process."""
+        with self._lock:
+            if len(self._cache.states) > MAX_DFA_STATES:
+                self._reset_cache()
+            cache = self._cache
+        state = 0
+        has_assertions, word_boundaries = self.has_assertions, self.word_boundaries
+        transitions = cache.transitions
+        flags, previous, previous_is_word, last = 0, None, False, len(text) - 1
+        for position, char in enumerate(text):
+            if has_assertions: # _position_flags, computed incrementally
+                flags = AT_TEXT_START if previous is None else (AT_LINE_START if previous == "\n" else 0)
+                if char == "\n":
+                    flags |= AT_LINE_END | (BEFORE_FINAL_NEWLINE if position == last else 0)
+                if word_boundaries:
+                    is_word = char.isalnum() or char == "_"
+                    if is_word != previous_is_word:
+                        flags |= AT_WORD_BOUNDARY
+                    previous_is_word = is_word
+                previous = char
+                key = (flags, char)
+            else:
+                key = char
+            following = transitions[state].get(key)
+            if following is None:
+                following = self._transition(cache, state, key, flags, char)
+            if following == -1:
+                return True
+            state = following
+        return self._closure(cache.states[state], _position_flags(text, len(text)))[1]
+
+    def search(self, text: str, budget: float = FALLBACK_BUDGET_SECONDS) -> bool:
+        if len(text) <= INLINE_SEARCH_CHARS:
+            return self.scan(text)
+        return _budgeted_search(self.engine, self.pattern, self.flags, text, budget)
+
+def _search_worker(connection):
+    """Worker process loop: answers (engine, pattern, flags, text) requests with whether there is a match."""
+    while True:
+        try:
+            engine, pattern, flags, text = connection.recv()
+        except EOFError:
+            return
+        if engine == "linear":
+            connection.send(compile_pattern(pattern, flags).scan(text))
+        else:
+            connection.send(re.search(pattern, text, flags) is not None)
+
+class _SearchWorker:
+    """A process running searches that are killed once they exceed their time budget.
+
+    A catastrophic backtracking pattern can take practically forever and cannot be interrupted
+    inside the process running it; killing a worker process always works.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn" if sys.platform == "darwin" else None)
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_search_worker, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def _kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+        self.process = self.connection = None
+
+    def search(self, engine: str, pattern: str, flags: int, text: str, budget: float) -> Optional[bool]:
+        """A search in the worker; None if it ran past the budget (the worker is then replaced)."""
+        with self.lock:
+            if self.process is None or not self.process.is_alive():
+                self._start()
+            try:
+                self.connection.send((engine, pattern, flags, text))
+                if self.connection.poll(budget):
+                    return self.connection.recv()
+            except (EOFError, OSError): # The worker died, e.g. out of memory
+                pass
+            self._kill()
+            return None
+
+_search_worker_instance = _SearchWorker()
+
+def _budgeted_search(engine: str, pattern: str, flags: int, text: str, budget: float) -> bool:
+    found = _search_worker_instance.search(engine, pattern, flags, text, budget)
+    if found is None:
+        print(f"{Colors.YELLOW}Warning: Regex '{pattern}' ran for more than {budget:g}s and was stopped; "
+              f"treating it as not matching.{Colors.ENDC}")
+        return False
+    return found
+
+class BudgetedPattern:
+    """A regex outside the linear-time subset, searched with `re` under a time budget."""
+
+    linear = False
+    engine = "budgeted"
+
+    def __init__(self, pattern: str, flags: int = 0, reason: str = ""):
+        self.pattern = pattern
+        self.flags = flags
+        self.reason = reason # Why the linear-time engine cannot run it
+
+    def search(self, text: str, budget: float = FALLBACK_BUDGET_SECONDS) -> bool:
+        return _budgeted_search("re", self.pattern, self.flags, text, budget)
+
+_compiled: Dict[Tuple[str, int], Any] = {}
+
+def compile_pattern(pattern: str, flags: int = 0):
+    """Returns a LinearPattern if the pattern is in the linear-time subset, else a BudgetedPattern.
+
+    Both have search(text) -> bool. Results are cached per (pattern, flags). Invalid patterns
+    raise re.error, like re.compile.
+    """
+    key = (pattern, flags)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        re.compile(pattern, flags) # Validates the syntax; the subset parser relies on it
+        try:
+            if flags & ~SUPPORTED_FLAGS:
+                raise UnsupportedPattern("flags other than re.MULTILINE")
+            compiled = LinearPattern(pattern, flags)
+        except UnsupportedPattern as e:
+            compiled = BudgetedPattern(pattern, flags, str(e))
+        except RecursionError: # Absurdly deep nesting
+            compiled = BudgetedPattern(pattern, flags, "nesting too deep")
+        _compiled[key] = compiled
+    return compiled
+
+def safe_search(pattern: str, text: str, flags: int = 0) -> bool:
+    """Whether pattern matches anywhere in text, without risking catastrophic backtracking."""
+    return compile_pattern(pattern, flags).search(text)
+
+def task_patterns(task: Task) -> Iterator[Tuple[str, int]]:
+    """The author-supplied regexes of a task, as (pattern, flags) the evaluator uses them with."""
+    evaluation = task.evaluation or {}
+    pattern = evaluation.get("expected_stdout_pattern")
+    if isinstance(pattern, str) and pattern:
+        yield pattern, re.MULTILINE
+    checks = evaluation.get("check_command_contains")
+    for item in checks if isinstance(checks, list) else []:
+        if isinstance(item, dict) and item.get("is_regex") and isinstance(item.get("substring"), str) and item["substring"]:
+            yield item["substring"], 0
+
+def compile_task_patterns(task: Task) -> bool:
+    """Compiles (and so classifies) a task's regexes at load time. Returns False if one is invalid."""
+    valid = True
+    for pattern, flags in task_patterns(task):
+        try:
+            compile_pattern(pattern, flags)
+        except re.error as e:
+            print(f"{Colors.RED}Error: Task {task.id} has an invalid regex '{pattern}': {e}{Colors.ENDC}")
+            valid = False
+    return valid
+
+def retain_task_patterns(tasks: Iterable[Task]):
+    """Drops compiled patterns no current task uses, e.g. after tasks were edited or removed.
+    Patterns used elsewhere (such as in a task's stages) are simply compiled again on next use.
+    """
+    global _compiled
+    used = {key for task in tasks for key in task_patterns(task)}
+    _compiled = {key: compiled for key, compiled in _compiled.items() if key in used} # Swapped in whole
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Show which engine runs each task's regexes.")
+    parser.add_argument("--tasks-dir", default=TASKS_DIR, help="Task directory")
+    args = parser.parse_args(argv)
+
+    budgeted = 0
+    for task in load_all_tasks(args.tasks_dir):
+        for pattern, flags in task_patterns(task):
+            try:
+                compiled = compile_pattern(pattern, flags)
+            except re.error:
+                continue # Already reported while loading
+            if compiled.linear: # The engine used for long texts; short ones always run in the DFA
+                print(f"{Colors.GREEN}{compiled.engine:<8}{Colors.ENDC} {task.id}: {pattern}")
+            else:
+                budgeted += 1
+                print(f"{Colors.YELLOW}budgeted{Colors.ENDC} {task.id}: {pattern} ({compiled.reason})")
+    print(f"{budgeted} pattern(s) need the time-budgeted fallback.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
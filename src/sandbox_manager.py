@@ -0,0 +1,319 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/sandbox_manager.py` as well as `python -m src.sandbox_manager`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import atexit
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from .colors import Colors
+from .fixture_store import FixtureStore, fixture_store_from_env
+
+SANDBOX_QUOTA_ENV_VAR = "CMD_PRACTICE_SANDBOX_QUOTA_MB" # "0" turns the quota off; reaping still happens
+SANDBOX_ROOT_SUBDIR = "cmd-practice-sandboxes"
+DEFAULT_QUOTA_MB = 1024
+REAP_INTERVAL_SECONDS = 30.0
+# A sandbox whose name carries no owner pid (or a pid that was reused) is only reaped once untouched this long
+ABANDONED_AFTER_SECONDS = 6 * 60 * 60
+TRASH_PREFIX = ".trash-"
+# mkdtemp names: <prefix><owner pid>-<random letters, digits and underscores>
+OWNER_PID_PATTERN = re.compile(r"-(\d+)-[A-Za-z0-9_]+$")
+KIND_SANDBOX = "sandbox"
+KIND_FIXTURE = "fixture"
+
+def default_sandbox_root() -> str:
+    return os.path.join(tempfile.gettempdir(), SANDBOX_ROOT_SUBDIR)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # Someone else's live process
+        return True
+    return True
+
+def directory_size(path: str, seen_inodes: Optional[Set[Tuple[int, int]]] = None) -> int:
+    """Bytes of the files under path. Files already in seen_inodes (hardlinks) are not counted again."""
+    seen_inodes = set() if seen_inodes is None else seen_inodes
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat_result = os.lstat(os.path.join(directory, name))
+            except OSError:
+                continue # Removed while we walked
+            inode = (stat_result.st_dev, stat_result.st_ino)
+            if inode in seen_inodes:
+                continue
+            seen_inodes.add(inode)
+            total += stat_result.st_size
+    return total
+
+class SandboxEntry:
+    """One tracked directory: a sandbox or a fixture template."""
+    __slots__ = ("path", "kind", "size", "last_used", "in_use")
+
+    def __init__(self, path: str, kind: str, last_used: float, in_use: bool = False):
+        self.path = path
+        self.kind = kind
+        self.size = 0 # Measured by the reaper, never in the request path
+        self.last_used = last_used
+        self.in_use = in_use
+
+class SandboxManager:
+    """Owns the lifecycle of sandbox directories and the disk used by fixture templates.
+
+    Sandboxes are created under one root, with the owner's pid in their names. Discarding a
+    sandbox only renames it into the trash (a single rename); a background reaper thread does the
+    slow deletion. The same thread removes sandboxes left behind by processes that died. It also
+    measures what is tracked and evicts the least recently used fixture templates while the total
+    is over the quota. Sandboxes in use are never touched.
+    """
+
+    def __init__(self, root: Optional[str] = None, quota_bytes: Optional[int] = DEFAULT_QUOTA_MB * 1024 * 1024,
+                 reap_interval: float = REAP_INTERVAL_SECONDS):
+        self.root = root or default_sandbox_root()
+        self.quota_bytes = quota_bytes # None: no quota
+        self.reap_interval = reap_interval
+        self.entries: Dict[str, SandboxEntry] = {} # Sandboxes in use by this process, by path
+        self.fixture_stores: List[FixtureStore] = []
+        self.counters = {"created": 0, "discarded": 0, "reaped": 0, "abandoned_reaped": 0, "evicted": 0, "bytes_freed": 0}
+        self.last_usage: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._reap_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Request path: only cheap operations ---
+
+    def create(self, prefix: str = "cmd-practice-sandbox-") -> str:
+        """Makes a new sandbox directory and starts tracking it."""
+        self._start_reaper()
+        os.makedirs(self.root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f"{prefix}{os.getpid()}-", dir=self.root)
+        with self._lock:
+            self.entries[path] = SandboxEntry(path, KIND_SANDBOX, time.time(), in_use=True)
+            self.counters["created"] += 1
+        return path
+
+    def touch(self, path: str):
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                entry.last_used = time.time()
+
+    def discard(self, path: str):
+        """Stops tracking a sandbox and moves it to the trash for the reaper to delete."""
+        with self._lock:
+            self.entries.pop(path, None)
+            self.counters["discarded"] += 1
+        trash_path = os.path.join(self.root, f"{TRASH_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        try:
+            os.rename(path, trash_path)
+        except OSError: # Not under the root (another filesystem): delete it here after all
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        self._wake.set()
+
+    def track_fixture_store(self, store: FixtureStore):
+        """Counts the store's templates against the quota; they are evicted least recently used first."""
+        self.fixture_stores.append(store)
+
+    # --- Reaper ---
+
+    def _start_reaper(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._reap_forever, name="sandbox-reaper", daemon=True)
+        self._thread.start()
+        atexit.register(self.empty_trash, True)
+
+    def _reap_forever(self):
+        while True:
+            try:
+                self.reap_once()
+            except Exception as e: # The reaper must outlive any single bad directory
+                print(f"{Colors.RED}Sandbox reaper error: {e}{Colors.ENDC}")
+            self._wake.wait(self.reap_interval)
+            self._wake.clear()
+
+    def _remove(self, path: str) -> int:
+        size = directory_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self.counters["bytes_freed"] += size
+        return size
+
+    def empty_trash(self, own_only: bool = False):
+        """Deletes discarded sandboxes (only this process's with own_only, e.g. at exit)."""
+        if not os.path.isdir(self.root):
+            return
+        own_prefix = f"{TRASH_PREFIX}{os.getpid()}-"
+        for name in os.listdir(self.root):
+            if not name.startswith(TRASH_PREFIX) or (own_only and not name.startswith(own_prefix)):
+                continue
+            self._remove(os.path.join(self.root, name))
+            with self._lock:
+                self.counters["reaped"] += 1
+
+    def _is_abandoned(self, path: str, name: str, now: float) -> bool:
+        with self._lock:
+            if path in self.entries:
+                return False
+        match = OWNER_PID_PATTERN.search(name)
+        if match and int(match.group(1)) != os.getpid() and not _pid_alive(int(match.group(1))):
+            return True # Its owner died without discarding it
+        try:
+            return now - os.stat(path).st_mtime > ABANDONED_AFTER_SECONDS
+        except OSError:
+            return False
+
+    def reap_abandoned(self) -> int:
+        if not os.path.isdir(self.root):
+            return 0
+        now, reaped = time.time(), 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(TRASH_PREFIX) or not os.path.isdir(path) or not self._is_abandoned(path, name, now):
+                continue
+            self._remove(path)
+            reaped += 1
+        with self._lock:
+            self.counters["abandoned_reaped"] += reaped
+        return reaped
+
+    def fixture_entries(self) -> List[SandboxEntry]:
+        entries = []
+        for store in self.fixture_stores:
+            for name in store.templates():
+                path = os.path.join(store.root, name)
+                try:
+                    entries.append(SandboxEntry(path, KIND_FIXTURE, os.stat(path).st_mtime))
+                except OSError:
+                    continue
+        return entries
+
+    def sandbox_entries(self) -> List[SandboxEntry]:
+        """Every sandbox under the root: this process's (with their last use) and other processes'."""
+        with self._lock:
+            sandboxes = list(self.entries.values())
+        tracked = {entry.path for entry in sandboxes}
+        names = os.listdir(self.root) if os.path.isdir(self.root) else []
+        for name in names:
+            path = os.path.join(self.root, name)
+            if name.startswith(TRASH_PREFIX) or path in tracked:
+                continue
+            try:
+                sandboxes.append(SandboxEntry(path, KIND_SANDBOX, os.stat(path).st_mtime, in_use=True))
+            except OSError:
+                continue
+        return sandboxes
+
+    def measure(self) -> List[SandboxEntry]:
+        """Sizes of all sandboxes and fixture templates."""
+        sandboxes = self.sandbox_entries()
+        fixtures = self.fixture_entries()
+        seen_inodes: Set[Tuple[int, int]] = set()
+        # Files hardlinked to each other (e.g. by a learner's `ln`) are counted once
+        for entry in fixtures + sandboxes:
+            entry.size = directory_size(entry.path, seen_inodes)
+        usage = {KIND_SANDBOX: sum(entry.size for entry in sandboxes), KIND_FIXTURE: sum(entry.size for entry in fixtures)}
+        with self._lock:
+            self.last_usage = usage
+        return fixtures + sandboxes
+
+    def enforce_quota(self, entries: List[SandboxEntry]) -> int:
+        """Evicts least recently used fixture templates until the total fits the quota."""
+        if self.quota_bytes is None:
+            return 0
+        total = sum(entry.size for entry in entries)
+        evicted = 0
+        for entry in sorted((entry for entry in entries if entry.kind == KIND_FIXTURE), key=lambda entry: entry.last_used):
+            if total <= self.quota_bytes:
+                break
+            trash_path = os.path.join(os.path.dirname(entry.path), f"{TRASH_PREFIX}{uuid.uuid4().hex[:8]}")
+            try:
+                os.rename(entry.path, trash_path) # Atomically out of reach; installs fall back to writing files
+            except OSError:
+                continue
+            for store in self.fixture_stores:
+                store.forget(entry.path)
+            shutil.rmtree(trash_path, ignore_errors=True)
+            total -= entry.size
+            evicted += 1
+            with self._lock:
+                self.counters["evicted"] += 1
+                self.counters["bytes_freed"] += entry.size
+                # Keeps stats() in line with what is left, without measuring everything again
+                self.last_usage[KIND_FIXTURE] = max(0, self.last_usage.get(KIND_FIXTURE, 0) - entry.size)
+        if total > self.quota_bytes:
+            print(f"{Colors.YELLOW}Warning: Sandboxes in use take {total // (1024 * 1024)} MB, "
+                  f"over the {self.quota_bytes // (1024 * 1024)} MB quota.{Colors.ENDC}")
+        return evicted
+
+    def reap_once(self):
+        with self._reap_lock: # The reaper thread and explicit callers (e.g. the CLI) take turns
+            self.empty_trash()
+            self.reap_abandoned()
+            self.enforce_quota(self.measure())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_use"] = len(self.entries)
+            stats["sandbox_bytes"] = self.last_usage.get(KIND_SANDBOX, 0)
+            stats["fixture_bytes"] = self.last_usage.get(KIND_FIXTURE, 0)
+        stats["quota_bytes"] = self.quota_bytes or 0
+        return stats
+
+
+def sandbox_manager_from_env(fixture_store: Optional[FixtureStore] = None) -> SandboxManager:
+    """A SandboxManager with the quota from the environment, tracking the given fixture store."""
+    setting = os.environ.get(SANDBOX_QUOTA_ENV_VAR, "")
+    quota_mb = DEFAULT_QUOTA_MB
+    if setting:
+        try:
+            quota_mb = max(0, int(setting))
+        except ValueError:
+            print(f"Warning: {SANDBOX_QUOTA_ENV_VAR} must be a number of megabytes. Using {DEFAULT_QUOTA_MB}.")
+    manager = SandboxManager(quota_bytes=quota_mb * 1024 * 1024 if quota_mb else None)
+    if fixture_store is not None:
+        manager.track_fixture_store(fixture_store)
+    return manager
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Show sandbox and fixture disk usage, or reap now.")
+    parser.add_argument("--reap", action="store_true", help="Delete trash and abandoned sandboxes, then enforce the quota")
+    args = parser.parse_args(argv)
+
+    manager = sandbox_manager_from_env(fixture_store_from_env())
+    if args.reap:
+        manager.reap_once()
+    else:
+        manager.measure()
+    leftover = os.listdir(manager.root) if os.path.isdir(manager.root) else []
+    stats = manager.stats()
+    print(f"{Colors.BOLD}Sandbox root:{Colors.ENDC} {manager.root} ({len(leftover)} entries)")
+    print(f"  Sandboxes: {stats['sandbox_bytes'] / (1024 * 1024):.1f} MB")
+    print(f"  Fixture templates: {stats['fixture_bytes'] / (1024 * 1024):.1f} MB"
+          f"{'' if manager.fixture_stores else f' (fixture store disabled)'}")
+    print(f"  Quota: {f'{manager.quota_bytes // (1024 * 1024)} MB' if manager.quota_bytes else 'none'}")
+    if args.reap:
+        print(f"  Reaped {stats['reaped']} discarded and {stats['abandoned_reaped']} abandoned sandbox(es), "
+              f"evicted {stats['evicted']} template(s), freed {stats['bytes_freed'] / (1024 * 1024):.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/selftest.py` as well as `python -m src.selftest`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from .colors import Colors
+from .evaluator import evaluate_command, EVALUATOR_VERSION
+from .task_loader import TASKS_DIR, Task, load_all_tasks, load_task_from_file
+from .task_query import TaskIndex
+from .host_capabilities import HostCapabilities
+from .task_timeouts import MAX_TIMEOUT_SECONDS, TaskTimeouts
+from .task_setup import private_task_sandbox, setup_task_environment
+from .verdict_cache import fixture_hash
+
+SELFTEST_STATE_FILE = ".selftest_state.json"
+SLOWEST_TASKS_SHOWN = 5
+FAILURE_PREVIEW_BYTES = 200 # Of a failed run's stdout and stderr, as printed in the report
+
+def task_fingerprint(task_path: str, task: Task) -> str:
+    """Changes whenever the task JSON, its fixtures, the evaluator, or the chosen flavor variant change."""
+    digest = hashlib.sha256()
+    with open(task_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(fixture_hash(task).encode())
+    digest.update(EVALUATOR_VERSION.encode())
+    digest.update(json.dumps(task.evaluation, sort_keys=True).encode()) # Includes the host's flavor variant
+    return digest.hexdigest()
+
+def load_selftest_state() -> Dict[str, Any]:
+    if not os.path.exists(SELFTEST_STATE_FILE):
+        return {}
+    try:
+        with open(SELFTEST_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+def save_selftest_state(state: Dict[str, Any]):
+    try:
+        with open(SELFTEST_STATE_FILE, 'w') as f:
+            json.dump(state, f, indent=4)
+    except IOError as e:
+        print(f"{Colors.RED}Error saving self-test state: {e}{Colors.ENDC}")
+
+SandboxRun = Tuple[bool, float, str, str, float] # (passed, wall seconds, stdout, stderr, solution seconds)
+
+def run_in_sandbox(task_path: str) -> SandboxRun:
+    """Runs one task's example_solution in a private copy of its working directory.
+
+    The solution runs with the maximum timeout, since its runtime is what per-task timeouts
+    are learned from. Runs in a worker process.
+    """
+    task = load_task_from_file(task_path)
+    if task is None:
+        return False, 0.0, "", f"Could not load {task_path}", 0.0
+    HostCapabilities().prepare_task(task) # Same per-flavor variant as in a session (probes are cached)
+
+    with private_task_sandbox(task, prefix="cmd-practice-selftest-") as sandbox_task:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # Setup and evaluator chatter is not part of the report
+            setup_task_environment(sandbox_task)
+            solution_started = time.perf_counter()
+            passed, stdout, stderr = evaluate_command(task.example_solution, sandbox_task, timeout=MAX_TIMEOUT_SECONDS)
+            solution_seconds = time.perf_counter() - solution_started
+        # Only a snippet reaches the report; the rest is never decoded (or sent back from the worker)
+        return (passed, time.perf_counter() - started, stdout.preview(FAILURE_PREVIEW_BYTES),
+                stderr.preview(FAILURE_PREVIEW_BYTES), solution_seconds)
+
+def run_selftest(tasks_directory: str = TASKS_DIR, repeats: int = 1, workers: Optional[int] = None,
+                 force: bool = False, task_ids: Optional[List[str]] = None, query: Optional[str] = None) -> bool:
+    """Checks every task's example_solution against its own evaluation. Returns True if all pass.
+
+    Tasks whose fingerprint is unchanged since the last run are not re-executed unless force is set.
+    A task query (see task_query.parse_query) restricts the run to the matching tasks.
+    """
+    state = load_selftest_state()
+    host = HostCapabilities()
+    unsupported: Dict[str, str] = {} # task id -> why it cannot run on this host
+    if query:
+        try:
+            matching_ids = {task.id for task in TaskIndex(load_all_tasks(tasks_directory)).query(query)}
+        except ValueError as e:
+            print(f"{Colors.RED}Invalid task query '{query}': {e}{Colors.ENDC}")
+            return False
+        task_ids = [task_id for task_id in task_ids if task_id in matching_ids] if task_ids else sorted(matching_ids)
+        if not task_ids:
+            print(f"{Colors.YELLOW}No tasks match the query '{query}'.{Colors.ENDC}")
+            return True
+    to_run: Dict[str, Tuple[str, str]] = {} # task id -> (task path, fingerprint)
+    loaded_tasks: Dict[str, Task] = {}
+    skipped: List[str] = []
+
+    for filename in sorted(os.listdir(tasks_directory)):
+        if not filename.endswith(".json"):
+            continue
+        task_path = os.path.join(tasks_directory, filename)
+        task = load_task_from_file(task_path)
+        if task is None or (task_ids and task.id not in task_ids):
+            continue
+        hidden_reason = host.prepare_task(task)
+        if hidden_reason:
+            unsupported[task.id] = hidden_reason
+            continue
+        fingerprint = task_fingerprint(task_path, task)
+        previous = state.get(task.id)
+        if not force and previous and previous.get("fingerprint") == fingerprint and previous.get("repeats", 0) >= repeats:
+            skipped.append(task.id)
+        else:
+            to_run[task.id] = (task_path, fingerprint)
+            loaded_tasks[task.id] = task
+
+    host.save() # Probe results are reused by the worker processes
+    print(f"{Colors.HEADER}{Colors.BOLD}Self-test: {len(to_run)} task(s) to run x{repeats}, "
+          f"{len(skipped)} unchanged task(s) reused from {SELFTEST_STATE_FILE}{Colors.ENDC}")
+    for task_id, reason in sorted(unsupported.items()):
+        print(f"{Colors.YELLOW}SKIP {task_id}: cannot run on this host ({reason}){Colors.ENDC}")
+
+    results: Dict[str, List[SandboxRun]] = {task_id: [] for task_id in to_run}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_in_sandbox, task_path): task_id
+                   for task_id, (task_path, _) in to_run.items()
+                   for _ in range(repeats)}
+        for future in as_completed(futures):
+            task_id = futures[future]
+            try:
+                results[task_id].append(future.result())
+            except Exception as e: # A crashed worker counts as a failed run
+                results[task_id].append((False, 0.0, "", f"Worker error: {e}", 0.0))
+
+    for task_id, runs in results.items():
+        passes = sum(1 for run in runs if run[0])
+        failed_run = next((run for run in runs if not run[0]), None)
+        state[task_id] = {
+            "fingerprint": to_run[task_id][1],
+            "repeats": len(runs),
+            "pass_rate": passes / len(runs) if runs else 0.0,
+            "mean_seconds": sum(run[1] for run in runs) / len(runs) if runs else 0.0,
+            "last_failure": {"stdout": failed_run[2], "stderr": failed_run[3]} if failed_run else None,
+        }
+    save_selftest_state(state)
+
+    # Passing runs are the reference runtimes that per-task timeouts are learned from
+    timeouts = TaskTimeouts()
+    for task_id, runs in results.items():
+        solution_runtimes = [run[4] for run in runs if run[0]]
+        if solution_runtimes:
+            timeouts.record(loaded_tasks[task_id], solution_runtimes)
+    if results:
+        timeouts.save()
+
+    # Report over everything that was considered, including reused results
+    considered = {task_id: state[task_id] for task_id in list(results) + skipped}
+    failing = sorted(task_id for task_id, entry in considered.items() if entry["pass_rate"] == 0.0)
+    flaky = sorted(task_id for task_id, entry in considered.items() if 0.0 < entry["pass_rate"] < 1.0)
+    slowest = sorted(considered.items(), key=lambda item: item[1]["mean_seconds"], reverse=True)[:SLOWEST_TASKS_SHOWN]
+
+    for task_id in failing:
+        failure = considered[task_id]["last_failure"] or {}
+        cached_note = " (unchanged, not re-run)" if task_id in skipped else ""
+        print(f"{Colors.RED}FAIL {task_id}{cached_note}{Colors.ENDC}")
+        if failure.get("stdout"):
+            print(f"  stdout: {failure['stdout'][:FAILURE_PREVIEW_BYTES]}")
+        if failure.get("stderr"):
+            print(f"  stderr: {failure['stderr'][:FAILURE_PREVIEW_BYTES]}")
+    for task_id in flaky:
+        print(f"{Colors.YELLOW}FLAKY {task_id}: pass rate {considered[task_id]['pass_rate']:.0%} "
+              f"over {considered[task_id]['repeats']} run(s){Colors.ENDC}")
+    if slowest:
+        print(f"{Colors.BLUE}Slowest tasks:{Colors.ENDC}")
+        for task_id, entry in slowest:
+            print(f"  {entry['mean_seconds'] * 1000:8.1f} ms  {task_id}")
+
+    passed_count = len(considered) - len(failing) - len(flaky)
+    print(f"{Colors.GREEN if not failing and not flaky else Colors.RED}{passed_count}/{len(considered)} task(s) pass, "
+          f"{len(failing)} failing, {len(flaky)} flaky ({time.perf_counter() - started:.1f}s){Colors.ENDC}")
+    return not failing and not flaky
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run every task's example_solution against its own evaluation.")
+    parser.add_argument("task_ids", nargs="*", help="Only test these task ids")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per task, to detect flaky tasks")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--all", action="store_true", help="Re-run tasks even if they are unchanged")
+    parser.add_argument("--query", help="Only test tasks matching a query, e.g. \"commands=find difficulty=hard\"")
+    args = parser.parse_args(argv)
+    return 0 if run_selftest(repeats=args.repeats, workers=args.workers, force=args.all,
+                              task_ids=args.task_ids, query=args.query) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/session_server.py` as well as `python -m src.session_server`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import errno
+import fcntl
+import gc
+import json
+import os
+import pty
+import random
+import select
+import signal
+import socket
+import struct
+import sys
+import termios
+import time
+import tty
+from typing import List, Optional
+
+# Only lightweight modules at import time: `connect` must start fast. The server imports the rest.
+from .colors import Colors
+
+SESSION_SERVER_SOCKET = ".cmd_practice_session.sock"
+SESSION_SERVER_ENV_VAR = "CMD_PRACTICE_SESSION_SOCKET" # Socket path for `serve` and `connect`
+MAX_HANDSHAKE_BYTES = 64 * 1024
+RELAY_CHUNK_BYTES = 16 * 1024
+REAP_INTERVAL_SECONDS = 1.0
+EOF_CHARACTER = b"\x04" # Ctrl-D: end of input on a terminal in canonical mode
+
+def default_socket_path() -> str:
+    return os.environ.get(SESSION_SERVER_ENV_VAR) or SESSION_SERVER_SOCKET
+
+def _read_handshake(connection: socket.socket) -> Optional[dict]:
+    """The client's first line: JSON with argv, terminal type and window size."""
+    data = b""
+    while b"\n" not in data:
+        chunk = connection.recv(4096)
+        if not chunk or len(data) > MAX_HANDSHAKE_BYTES:
+            return None
+        data += chunk
+    line, _, rest = data.partition(b"\n")
+    try:
+        handshake = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(handshake, dict):
+        return None
+    handshake["pending_input"] = rest # Keystrokes sent right behind the handshake
+    return handshake
+
+def _set_window_size(fd: int, rows: int, columns: int):
+    try:
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, columns, 0, 0))
+    except OSError:
+        pass
+
+def _relay(connection: socket.socket, master_fd: int, pending_input: bytes):
+    """Copies bytes between the client's socket and the session's pty until either side closes."""
+    if pending_input:
+        os.write(master_fd, pending_input)
+    while True:
+        readable, _, _ = select.select([connection, master_fd], [], [])
+        if master_fd in readable:
+            try:
+                data = os.read(master_fd, RELAY_CHUNK_BYTES)
+            except OSError as e: # EIO: the session exited and the pty's slave side is closed
+                if e.errno != errno.EIO:
+                    raise
+                data = b""
+            if not data:
+                return
+            connection.sendall(data)
+        if connection in readable:
+            data = connection.recv(RELAY_CHUNK_BYTES)
+            if not data: # The client left; closing the pty hangs up the session
+                return
+            os.write(master_fd, data)
+
+class SessionServer:
+    """A warm parent process that forks one practice session per learner connection.
+
+    The parent imports the application and loads everything sessions only read: the PATH
+    executables, man pages and man index, the task catalog with its host probes and compiled task
+    regexes, the task index, evaluator plugins and fixture templates. A connection costs a fork; the
+    child shares all of it with the parent through copy-on-write pages. Each session runs on its
+    own pty, relayed to the client over the Unix socket, so readline, colors and Ctrl-C behave as
+    in a local terminal. The parent runs no threads, so forking never copies a held lock.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.listener: Optional[socket.socket] = None
+        self.sessions = 0
+        self.warm()
+
+    def warm(self):
+        started = time.perf_counter()
+        from . import main as app # Scans PATH (or reads its cache), loads man pages, sets up readline
+        from .evaluator_plugins import get_evaluator
+        from .host_capabilities import HostCapabilities
+        from .isolation import get_isolation_backend
+        from .task_catalog import TaskCatalog
+        from .task_query import CatalogTaskIndex
+        from .task_setup import FIXTURE_STORE
+        from .task_timeouts import TaskTimeouts
+
+        self.app = app
+        # Lazy: setup contents, hints and man info stay on disk; each session reads them into its
+        # sandbox copy of a task (see private_task_sandbox), which is discarded with the task
+        self.catalog = TaskCatalog(lazy=True, host=HostCapabilities(), timeouts=TaskTimeouts())
+        self.live_index = CatalogTaskIndex(self.catalog) # Rebuilt by a catalog listener when tasks change
+        app.get_man_index()
+        get_isolation_backend()
+        for task in self.catalog.tasks():
+            get_evaluator(task.evaluation.get("method", ""))
+            if FIXTURE_STORE is not None and task.setup_files:
+                FIXTURE_STORE.template_dir(task)
+            task.release_heavy_fields() # Read back for the template; not kept in the shared pages
+        # Objects that exist now live as long as the server; keeping them out of the collector's
+        # generations means a child's collections never write to (and so copy) their pages.
+        gc.freeze()
+        print(f"{Colors.GREEN}Preloaded {len(self.catalog)} task(s) in {time.perf_counter() - started:.2f}s.{Colors.ENDC}")
+
+    def refresh(self):
+        """Picks up task file changes before a fork, so every session starts from the current bank."""
+        self.catalog.refresh()
+
+    def listen(self):
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.socket_path)
+                except ConnectionRefusedError:
+                    os.remove(self.socket_path) # Left behind by a server that died
+                else:
+                    raise OSError(f"A session server is already listening on {self.socket_path}")
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen(128) # A whole lab connecting at once
+        self.listener.settimeout(REAP_INTERVAL_SECONDS)
+
+    def serve_forever(self):
+        self.listen()
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)) # Still removes the socket below
+        print(f"{Colors.GREEN}Session server listening on {self.socket_path}{Colors.ENDC}")
+        try:
+            while True:
+                self._reap_children()
+                try:
+                    connection, _ = self.listener.accept()
+                except socket.timeout:
+                    continue
+                self.refresh()
+                self._fork_handler(connection)
+        finally:
+            self.listener.close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def _reap_children(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+    def _fork_handler(self, connection: socket.socket):
+        pid = os.fork()
+        if pid:
+            connection.close()
+            self.sessions += 1
+            return
+        # Connection handler: owns one learner's socket and pty
+        status = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.listener.close()
+            connection.settimeout(None)
+            status = self._handle(connection)
+        except Exception as e:
+            print(f"{Colors.RED}Session handler error: {e}{Colors.ENDC}")
+        finally:
+            os._exit(status)
+
+    def _handle(self, connection: socket.socket) -> int:
+        handshake = _read_handshake(connection)
+        if handshake is None:
+            connection.close()
+            return 1
+        pid, master_fd = pty.fork()
+        if pid == 0:
+            connection.close() # Only the handler talks to the client
+            self._run_session(handshake) # Never returns
+        _set_window_size(master_fd, int(handshake.get("rows") or 24), int(handshake.get("columns") or 80))
+        try:
+            _relay(connection, master_fd, handshake["pending_input"])
+        finally:
+            os.close(master_fd) # Hangs up the session if it is still running
+            connection.close()
+            _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else 0
+
+    def _run_session(self, handshake: dict):
+        """Runs in the session process, with the pty as stdin, stdout and stderr."""
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            if handshake.get("term"):
+                os.environ["TERM"] = handshake["term"]
+            # The parent's streams were set up for wherever the server's output went; these are the pty
+            sys.stdin = open(0, "r", closefd=False)
+            sys.stdout = open(1, "w", buffering=1, closefd=False)
+            sys.stderr = open(2, "w", buffering=1, closefd=False)
+            random.seed() # Otherwise every session would shuffle its tasks the same way
+            argv = [str(arg) for arg in handshake.get("argv", [])]
+            self.app.main(argv, task_catalog=self.catalog, task_index=self.live_index.index, forked=True)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 0
+        except BaseException as e:
+            print(f"{Colors.RED}Session error: {e}{Colors.ENDC}")
+            status = 1
+        finally:
+            self._finish_session()
+            os._exit(status)
+
+    @staticmethod
+    def _finish_session():
+        """What atexit would do at the end of a session: os._exit skips it (and must, in a forked
+        child, where the parent's handlers are not the session's). A sandbox left behind belongs to
+        a dead pid and is reaped by the sandbox manager.
+        """
+        from .event_log import close_event_logs
+        from .output_view import remove_spool_directories
+        from .profiling import stop_profiling
+        for finish in (close_event_logs, stop_profiling, remove_spool_directories):
+            try:
+                finish()
+            except Exception as e:
+                print(f"{Colors.RED}Session cleanup error: {e}{Colors.ENDC}")
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+def connect(argv: List[str], socket_path: Optional[str] = None) -> int:
+    """Runs a practice session on a session server, relaying this terminal to it."""
+    socket_path = socket_path or default_socket_path()
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError as e:
+        print(f"{Colors.RED}Could not connect to the session server at {socket_path}: {e}{Colors.ENDC}")
+        return 1
+    columns, rows = os.get_terminal_size(sys.stdout.fileno()) if sys.stdout.isatty() else (80, 24)
+    handshake = {"argv": argv, "term": os.environ.get("TERM", ""), "rows": rows, "columns": columns}
+    connection.sendall(json.dumps(handshake).encode() + b"\n")
+
+    stdin_fd, stdout_fd = sys.stdin.fileno(), sys.stdout.fileno()
+    interactive = os.isatty(stdin_fd)
+    saved_attributes = termios.tcgetattr(stdin_fd) if interactive else None
+    if interactive:
+        tty.setraw(stdin_fd) # The session's pty does the line editing and echo
+    watched = [connection, stdin_fd]
+    try:
+        while True:
+            readable, _, _ = select.select(watched, [], [])
+            if connection in readable:
+                data = connection.recv(RELAY_CHUNK_BYTES)
+                if not data:
+                    return 0
+                os.write(stdout_fd, data)
+            if stdin_fd in readable:
+                data = os.read(stdin_fd, RELAY_CHUNK_BYTES)
+                if not data: # Piped input ran out: pass on an end of input, then wait for the session to end
+                    connection.sendall(EOF_CHARACTER)
+                    watched.remove(stdin_fd)
+                    continue
+                connection.sendall(data)
+    except (ConnectionError, OSError) as e:
+        print(f"\n{Colors.RED}Connection to the session server lost: {e}{Colors.ENDC}")
+        return 1
+    finally:
+        if saved_attributes is not None:
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, saved_attributes)
+        connection.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve practice sessions from one preloaded process, or join one.")
+    parser.add_argument("--socket", default=None, help=f"Unix socket path (default: ${SESSION_SERVER_ENV_VAR} or {SESSION_SERVER_SOCKET})")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    subparsers.add_parser("serve", help="Preload everything and fork a session per connection")
+    subparsers.add_parser("connect", help="Start a session on the server; other arguments go to cmd-practice (e.g. --query)")
+    args, session_args = parser.parse_known_args(argv)
+
+    if args.action == "connect":
+        return connect(session_args, args.socket)
+    try:
+        SessionServer(args.socket).serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Session server stopped.{Colors.ENDC}")
+    except OSError as e:
+        print(f"{Colors.RED}{e}{Colors.ENDC}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .colors import Colors
+from .command_analysis import parse_command
+from .evaluator_plugins import EvaluationContext, check_directory_contents, register_evaluator
+from .safe_regex import safe_search
+
+STAGED_METHOD = "staged"
+STAGE_CHECK_WORKERS = 4
+# Constructs the splitter does not take apart; commands using them are run and graded whole
+UNSPLITTABLE_OPERATORS = ("||", "|&", ";;", "<<")
+# Builtins whose effect (directory, variables, ...) a later stage, run by a separate shell, would not see
+SHELL_STATE_BUILTINS = {"cd", "pushd", "popd", "export", "unset", "set", "source", ".", "alias", "umask",
+                        "shopt", "declare", "local", "readonly", "eval", "exec"}
+STDOUT_REDIRECTIONS = {">", ">>", ">|", "&>", ">&", "1>", "1>>", "1>|", "1>&"}
+
+def split_command_segments(command: str) -> Optional[List[Tuple[str, str]]]:
+    """Splits a command line at its top-level `|`, `&&` and `;` into (segment, operator after it)
+    pairs; the last segment's operator is "". Quotes, escapes and `(...)`/`$(...)` are respected.
+    Returns None for anything it does not take apart safely: `||`, `&`, `|&`, heredocs, backticks,
+    `{ ...; }` groups, comments, several lines or unbalanced quotes.
+    """
+    segments: List[Tuple[str, str]] = []
+    current: List[str] = []
+    quote = None
+    depth = 0
+    i = 0
+
+    def finish(operator: str) -> bool:
+        segment = "".join(current).strip()
+        current.clear()
+        if not segment:
+            return False
+        segments.append((segment, operator))
+        return True
+
+    while i < len(command):
+        char = command[i]
+        if quote == "'":
+            quote = None if char == "'" else quote
+        elif char == "\\":
+            current.append(command[i:i + 2]) # An escaped character is never an operator, e.g. `\;` or `\|`
+            i += 2
+            continue
+        elif quote == '"':
+            quote = None if char == '"' else quote
+        elif char in "'\"":
+            quote = char
+        elif char in "`\n":
+            return None
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 0:
+            pair = command[i:i + 2]
+            previous = command[i - 1] if i else ""
+            at_word_start = not current or current[-1][-1:].isspace()
+            if pair in UNSPLITTABLE_OPERATORS:
+                return None
+            if char in "{#" and at_word_start and (char == "#" or command[i + 1:i + 2].isspace()):
+                return None
+            if pair == "&&" or char == ";" or (char == "|" and previous != ">"): # `>|` is a redirection
+                operator = "&&" if pair == "&&" else char
+                if not finish(operator):
+                    return None
+                i += len(operator)
+                continue
+            if char == "&" and previous not in "<>" and command[i + 1:i + 2] != ">": # `2>&1` and `&>` are redirections
+                return None # Runs in the background
+        current.append(char)
+        i += 1
+
+    if quote or depth or not finish(""):
+        return None
+    return segments
+
+def _segment_programs(segment: str) -> Optional[List[str]]:
+    """The programs a segment runs (including ones run through xargs or find -exec), or None if the
+    segment changes shell state, or sends its output to a file, so it cannot end a stage on its own.
+    """
+    analysis = parse_command(segment)
+    if analysis is None or len(analysis.pipelines) != 1 or len(analysis.pipelines[0].commands) != 1:
+        return None
+    command = analysis.pipelines[0].commands[0]
+    if command.name in SHELL_STATE_BUILTINS or "=" in command.name:
+        return None
+    if any(operator in STDOUT_REDIRECTIONS for operator, _ in command.redirections):
+        return None
+    return [command.name] + [nested.name for nested in command.nested]
+
+class PlannedStage:
+    """One stage of a staged task, mapped to the part of the learner's command that produces it."""
+
+    def __init__(self, config: Dict, command: str, connector: str):
+        self.config = config
+        self.name = config.get("name") or config.get("command") or "result"
+        self.command = command
+        self.connector = connector # How the next stage follows on: "|" (reading this output), "&&", ";", or "" (last)
+
+def plan_stages(user_command: str, stages: List[Dict]) -> Optional[List[PlannedStage]]:
+    """Maps the task's stages onto the learner's command, in order.
+
+    A stage ends with the first segment, after the previous stage, that runs its `command`; the
+    last stage ends with the command. Returns None when they cannot be mapped (e.g. the learner
+    did a stage's work with another program); the command is then run and graded whole.
+    """
+    segments = split_command_segments(user_command)
+    if not stages or segments is None or len(segments) < len(stages):
+        return None
+    programs = [_segment_programs(segment) for segment, _ in segments]
+    if any(segment_programs is None for segment_programs in programs[:-1]):
+        return None
+
+    plan: List[PlannedStage] = []
+    start = 0
+    for index, stage_config in enumerate(stages):
+        if index == len(stages) - 1:
+            end = len(segments) - 1
+        else:
+            end = next((position for position in range(start, len(segments) - 1)
+                        if stage_config.get("command") in programs[position]), None)
+            if end is None:
+                return None
+        # Segments within one stage stay connected as the learner wrote them (a pipeline stays a pipeline)
+        command = "".join(f"{segment} {operator} " for segment, operator in segments[start:end]) + segments[end][0]
+        plan.append(PlannedStage(stage_config, command, segments[end][1]))
+        start = end + 1
+    return plan
+
+def pipeline_script(commands: List[str], stage_channels: List[Tuple[int, int, int]]) -> str:
+    """The stages the learner joined with `|`, as one shell pipeline. Every stage but the last
+    copies its output (through tee) and sends its stderr and exit status to its own channel fds,
+    given as (output, stderr, status) per stage, so each stage can be checked on its own.
+    """
+    parts = [f"{{ {{ {command}\n}}; echo $? >/dev/fd/{status_fd}; }} 2>/dev/fd/{stderr_fd} | tee /dev/fd/{output_fd}"
+             for command, (output_fd, stderr_fd, status_fd) in zip(commands, stage_channels)]
+    return " | ".join(parts + [f"{{ {commands[-1]}\n}}"])
+
+# --- Stage checks ---
+
+def _stdout_failure(context: EvaluationContext) -> Optional[str]:
+    config = context.config
+    if isinstance(config.get("expected_stdout"), str) and not context.stdout_equals(context.expected_stdout()):
+        return "output does not match"
+    pattern = config.get("expected_stdout_pattern")
+    if pattern and not safe_search(pattern, context.stdout, re.MULTILINE):
+        return "output does not match the expected pattern"
+    for substring in config.get("expected_stdout_substrings", []):
+        if substring.encode() not in context.stdout_output:
+            return f"output is missing '{substring}'"
+    return None
+
+def _stderr_failure(context: EvaluationContext) -> Optional[str]:
+    expected_stderr = context.config.get("expected_stderr")
+    if expected_stderr is not None and not context.stderr_equals(expected_stderr):
+        return "unexpected error output" if not expected_stderr else "error output does not match"
+    return None
+
+def _files_failure(context: EvaluationContext) -> Optional[str]:
+    fs_check_config = context.config.get("check_destination_dir_contents")
+    if isinstance(fs_check_config, dict) and not check_directory_contents(context, fs_check_config):
+        return "files are not as expected"
+    return None
+
+StageCheck = Callable[[EvaluationContext], Optional[str]]
+STAGE_CHECKS: List[StageCheck] = [_files_failure, _stdout_failure, _stderr_failure]
+
+_check_pool: Optional[ThreadPoolExecutor] = None
+_check_pool_lock = threading.Lock()
+
+def _get_check_pool() -> ThreadPoolExecutor:
+    # Created on first use: a session server's parent never grades, so it never starts threads before forking
+    global _check_pool
+    with _check_pool_lock:
+        if _check_pool is None:
+            _check_pool = ThreadPoolExecutor(max_workers=STAGE_CHECK_WORKERS, thread_name_prefix="stage-check")
+        return _check_pool
+
+def stage_failure(context: EvaluationContext, must_succeed: bool) -> Optional[str]:
+    """Why a stage's result (context, with the stage as its config) is wrong, or None if it is right.
+
+    The filesystem, stdout and stderr checks do not depend on each other and run concurrently on a
+    shared thread pool; a stage that must succeed (it is the last, or followed by `&&`) also needs
+    exit status 0, unless it names an `expected_return_code`.
+    """
+    expected_return_code = context.config.get("expected_return_code", 0 if must_succeed else None)
+    if expected_return_code is not None and context.return_code != expected_return_code:
+        return f"exited with status {context.return_code}"
+    checks = [_get_check_pool().submit(check, context) for check in STAGE_CHECKS]
+    failures = [check.result() for check in checks]
+    return next((failure for failure in failures if failure), None)
+
+def stage_context(context: EvaluationContext, stage_config: Dict) -> EvaluationContext:
+    """context, with a stage's fields as the evaluation config."""
+    context.config = stage_config
+    return context
+
+def report_stage(index: int, total: int, name: str, failure: Optional[str]):
+    label = f"Stage {index + 1}/{total} ({name})"
+    if failure is None:
+        print(f"{Colors.GREEN}{label}: passed{Colors.ENDC}")
+    else:
+        print(f"{Colors.RED}{label}: {failure}{Colors.ENDC}")
+
+def report_skipped(index: int, total: int, name: str):
+    print(f"{Colors.YELLOW}Stage {index + 1}/{total} ({name}): skipped{Colors.ENDC}")
+
+@register_evaluator(STAGED_METHOD)
+def staged(context: EvaluationContext) -> bool:
+    """Used when the command could not be split into the task's stages (see plan_stages): it ran
+    whole, so only the last stage's checks apply, to the whole command's result.
+    """
+    stages = context.config.get("stages") or []
+    if not stages:
+        print(f"Evaluator: staged task {context.task.id} has no 'stages'.")
+        return False
+    if len(stages) > 1:
+        print(f"{Colors.YELLOW}Your command does not split into this task's {len(stages)} stages; checking its final result only.{Colors.ENDC}")
+    final_stage = stages[-1]
+    failure = stage_failure(stage_context(context, final_stage), must_succeed=True)
+    if failure is not None and len(stages) > 1:
+        report_stage(len(stages) - 1, len(stages), final_stage.get("name") or "result", failure)
+    return failure is None
@@ -0,0 +1,204 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .host_capabilities import HostCapabilities
+from .safe_regex import compile_task_patterns
+from .task_loader import TASKS_DIR, Task, load_task_from_file
+from .task_timeouts import TaskTimeouts
+
+POLL_INTERVAL_SECONDS = 2.0
+# Editors often write a file in several steps; wait this long after an event before re-scanning
+DEBOUNCE_SECONDS = 0.1
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+TASK_DIR_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+CatalogListener = Callable[[List[str], List[str]], None] # (changed or added task ids, removed task ids)
+
+class TaskCatalog:
+    """In-memory task bank that can be refreshed while it is being served.
+
+    refresh() re-parses only the JSON files whose mtime or size changed, then swaps the new
+    mapping in with a single assignment, so readers always see either the old or the new bank.
+    A file that fails to parse keeps its last good task and is parsed again on every refresh.
+    Listeners run on the refreshing thread, often the watcher's.
+    With a HostCapabilities, tasks are adapted to the host's tool flavors and tasks that cannot
+    run here are hidden (listed in `hidden` with the reason). With TaskTimeouts, each task gets
+    the timeout learned from its reference runs.
+    """
+
+    def __init__(self, tasks_directory: str = TASKS_DIR, lazy: bool = False, host: Optional[HostCapabilities] = None,
+                 timeouts: Optional[TaskTimeouts] = None):
+        self.tasks_directory = tasks_directory
+        self.lazy = lazy
+        self.host = host
+        self.timeouts = timeouts
+        self.hidden: Dict[str, str] = {} # task id -> why it cannot run on this host
+        self.version = 0 # Incremented on every refresh that changed something
+        self._tasks: Dict[str, Task] = {}
+        self._files: Dict[str, Tuple[Tuple[int, int], Optional[str]]] = {} # path -> ((mtime_ns, size), task id)
+        self._listeners: List[CatalogListener] = []
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+
+    def add_listener(self, listener: CatalogListener):
+        """Registers a callback for invalidating state derived from tasks (compiled evaluators, caches, ...)."""
+        self._listeners.append(listener)
+
+    def tasks(self) -> List[Task]:
+        return list(self._tasks.values())
+
+    def get(self, task_id: str) -> Optional[Task]:
+        return self._tasks.get(task_id)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """Picks up added, changed and removed task files. Returns (changed or added ids, removed ids)."""
+        with self._refresh_lock: # The watcher thread and explicit callers may refresh concurrently
+            if not os.path.isdir(self.tasks_directory):
+                print(f"Error: Tasks directory not found at {self.tasks_directory}")
+                return [], []
+
+            new_files: Dict[str, Tuple[Tuple[int, int], Optional[str]]] = {}
+            new_tasks = dict(self._tasks)
+            changed_ids: List[str] = []
+            seen_paths = set()
+
+            with os.scandir(self.tasks_directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    seen_paths.add(entry.path)
+                    stat_result = entry.stat()
+                    signature = (stat_result.st_mtime_ns, stat_result.st_size)
+                    previous = self._files.get(entry.path)
+                    if previous and previous[0] == signature:
+                        new_files[entry.path] = previous
+                        continue
+
+                    task = load_task_from_file(entry.path, self.lazy)
+                    if task is None: # Invalid, or caught mid-write: keep the last good task and retry on the next refresh
+                        if previous:
+                            new_files[entry.path] = previous
+                        continue
+                    compile_task_patterns(task) # Classifies its regexes now, not on the first attempt
+                    if self.host is not None:
+                        hidden_reason = self.host.prepare_task(task)
+                        if hidden_reason:
+                            self.hidden[task.id] = hidden_reason
+                            task = None # Treated like a file that defines no task
+                        else:
+                            self.hidden.pop(task.id, None)
+                    if task is not None and self.timeouts is not None:
+                        task.timeout_seconds = self.timeouts.learned_timeout_for(task)
+                    if task is not None and self.lazy:
+                        task.release_heavy_fields() # The timeout fingerprint reads the setup files back in
+                    old_id = previous[1] if previous else None
+                    if old_id and (task is None or task.id != old_id):
+                        new_tasks.pop(old_id, None) # The file no longer defines its old task
+                        changed_ids.append(old_id)
+                    if task is not None:
+                        new_tasks[task.id] = task
+                        changed_ids.append(task.id)
+                    new_files[entry.path] = (signature, task.id if task else None)
+
+            removed_ids = []
+            for path, (_, task_id) in self._files.items():
+                if path not in seen_paths and task_id:
+                    new_tasks.pop(task_id, None)
+                    removed_ids.append(task_id)
+
+            # An id can move between the lists, e.g. when a file is edited to define a different id
+            removed_ids = list(dict.fromkeys(removed_ids + [task_id for task_id in changed_ids if task_id not in new_tasks]))
+            changed_ids = [task_id for task_id in dict.fromkeys(changed_ids) if task_id in new_tasks]
+            if self.host is not None:
+                self.host.save() # Only writes if new tools were probed
+            self._files = new_files
+            self._tasks = new_tasks # Atomic swap
+            if changed_ids or removed_ids:
+                self.version += 1
+                for listener in self._listeners:
+                    listener(changed_ids, removed_ids)
+            return changed_ids, removed_ids
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify. Raises OSError where it is not available."""
+
+    def __init__(self, path: str, mask: int):
+        library_name = ctypes.util.find_library("c")
+        if not library_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(library_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until events arrive (True) or timeout expires (False), draining the queue."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        time.sleep(DEBOUNCE_SECONDS)
+        try:
+            while os.read(self.fd, 65536): # Only the fact that something changed matters
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class TaskWatcher(threading.Thread):
+    """Background thread that refreshes a TaskCatalog when task files change.
+
+    Uses inotify on Linux and falls back to polling os.scandir mtimes elsewhere.
+    """
+
+    def __init__(self, catalog: TaskCatalog, poll_interval: float = POLL_INTERVAL_SECONDS):
+        super().__init__(name="task-watcher", daemon=True)
+        self.catalog = catalog
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        try:
+            self._inotify: Optional[_Inotify] = _Inotify(catalog.tasks_directory, TASK_DIR_EVENTS)
+        except OSError:
+            self._inotify = None
+        self.mode = "inotify" if self._inotify else "polling"
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                if self._inotify is not None:
+                    if not self._inotify.wait(self.poll_interval):
+                        continue
+                elif self._stop_event.wait(self.poll_interval):
+                    break
+                try:
+                    self.catalog.refresh()
+                except Exception as e: # Never let a bad task file kill the watcher
+                    print(f"Warning: Task bank refresh failed: {e}")
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    def stop(self):
+        self._stop_event.set()
@@ -1,39 +1,129 @@
 import json
 import os
-from typing import List, Dict, Any
+import sys
+from typing import List, Dict, Any, Optional
 
 TASKS_DIR = "tasks"
 
+# Fields that can be large (setup file contents, hint text) and are only needed while a task
+# is being set up or practiced. With lazy loading they are re-read from the task's JSON file on
+# access and can be released again with Task.release_heavy_fields().
+HEAVY_FIELDS = ("setup_files", "hints", "man_page_info")
+_NOT_LOADED = object() # Sentinel for a released heavy field
+
 class Task:
+    # __slots__ avoids a per-instance __dict__, which matters for banks with many thousands of tasks
+    __slots__ = ("id", "title", "description", "command_to_practice", "example_solution",
+                 "input_details", "evaluation", "difficulty", "deterministic", "tags", "requires", "timeout_seconds", "source_path",
+                 "_setup_files", "_hints", "_man_page_info")
+
     def __init__(self, id: str, title: str, description: str, command_to_practice: str,
                  example_solution: str, setup_files: List[Dict[str, str]],
                  input_details: Dict[str, Any], evaluation: Dict[str, Any],
                  hints: List[str], difficulty: str = "medium", 
-                 man_page_info: str = ""):
+                 man_page_info: str = "", deterministic: bool = True,
+                 tags: Optional[List[str]] = None, requires: Optional[List[str]] = None):
         self.id = id
         self.title = title
         self.description = description
-        self.command_to_practice = command_to_practice
+        # Command and difficulty strings repeat across the whole bank, so share one copy of each
+        self.command_to_practice = sys.intern(command_to_practice)
         self.example_solution = example_solution
-        self.setup_files = setup_files
+        self._setup_files = setup_files
         self.input_details = input_details
         self.evaluation = evaluation
-        self.hints = hints
-        self.difficulty = difficulty
-        self.man_page_info = man_page_info
+        self._hints = hints
+        self.difficulty = sys.intern(difficulty)
+        self._man_page_info = man_page_info
+        # False for tasks whose output depends on time, the network, etc. (e.g. ping);
+        # their verdicts are never served from the verdict cache.
+        self.deterministic = deterministic
+        # Free-form labels for task queries, e.g. ["pipes", "destructive"] (see task_query.py)
+        self.tags = [sys.intern(tag.lower()) for tag in (tags or [])]
+        # Tools the task needs on this host; None means "whatever the example solution runs"
+        self.requires = requires
+        # Learned from reference runs and set by the task catalog (see task_timeouts.py)
+        self.timeout_seconds: Optional[float] = None
+        self.source_path: Optional[str] = None # JSON file the task was loaded from, if any
 
         # Removed the automatic processing of setup_files from __init__.
-        # This will now be handled by the setup_task_environment function in main.py.
+        # This will now be handled by the setup_task_environment function in task_setup.py.
+
+    def _load_heavy_fields(self):
+        """Re-reads the released heavy fields from the task's source file."""
+        try:
+            with open(self.source_path, 'r') as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError, TypeError) as e:
+            print(f"Error: Could not reload task data for {self.id} from {self.source_path}: {e}")
+            data = {}
+        if self._setup_files is _NOT_LOADED:
+            self._setup_files = data.get("setup_files", [])
+        if self._hints is _NOT_LOADED:
+            self._hints = data.get("hints", [])
+        if self._man_page_info is _NOT_LOADED:
+            self._man_page_info = data.get("man_page_info", "")
+
+    @property
+    def setup_files(self) -> List[Dict[str, str]]:
+        if self._setup_files is _NOT_LOADED:
+            self._load_heavy_fields()
+        return self._setup_files
+
+    @setup_files.setter
+    def setup_files(self, value: List[Dict[str, str]]):
+        self._setup_files = value
+
+    @property
+    def hints(self) -> List[str]:
+        if self._hints is _NOT_LOADED:
+            self._load_heavy_fields()
+        return self._hints
+
+    @hints.setter
+    def hints(self, value: List[str]):
+        self._hints = value
+
+    @property
+    def man_page_info(self) -> str:
+        if self._man_page_info is _NOT_LOADED:
+            self._load_heavy_fields()
+        return self._man_page_info
+
+    @man_page_info.setter
+    def man_page_info(self, value: str):
+        self._man_page_info = value
+
+    def release_heavy_fields(self):
+        """Drops setup contents, hints and man info; they are reloaded from source_path when next used."""
+        if self.source_path is None:
+            return # Nothing to reload from (e.g. tasks built in code)
+        self._setup_files = _NOT_LOADED
+        self._hints = _NOT_LOADED
+        self._man_page_info = _NOT_LOADED
 
     def __repr__(self) -> str:
         return f"<Task id='{self.id}' title='{self.title}' difficulty='{self.difficulty}'>"
 
-def load_task_from_file(filepath: str) -> Task | None:
-    """Loads a single task from a JSON file."""
+def get_task_individual_commands(command_str: str) -> List[str]:
+    """Splits a command_to_practice string like "find, mv, ls" into its unique, sorted commands."""
+    if not command_str:
+        return []
+    # Split by comma, strip whitespace from each part, filter out empty strings, then unique and sort.
+    return sorted(list(set(c.strip() for c in command_str.split(',') if c.strip())))
+
+def load_task_from_file(filepath: str, lazy: bool = False) -> Task | None:
+    """Loads a single task from a JSON file.
+    With lazy=True the heavy fields are released right away and re-read from the file on first use.
+    """
     try:
         with open(filepath, 'r') as f:
             data = json.load(f)
-        return Task(**data)
+        task = Task(**data)
+        task.source_path = filepath
+        if lazy:
+            task.release_heavy_fields()
+        return task
     except FileNotFoundError:
         print(f"Error: Task file not found at {filepath}")
         return None
@@ -44,8 +134,10 @@ def load_task_from_file(filepath: str) -> Task | None:
         print(f"Error: Missing or mismatched keys in JSON file {filepath}. Details: {e}")
         return None
 
-def load_all_tasks(tasks_directory: str = TASKS_DIR) -> List[Task]:
-    """Loads all tasks from JSON files in the specified directory."""
+def load_all_tasks(tasks_directory: str = TASKS_DIR, lazy: bool = False) -> List[Task]:
+    """Loads all tasks from JSON files in the specified directory.
+    Use lazy=True for long-running processes with large banks (see Task.release_heavy_fields).
+    """
     all_tasks: List[Task] = []
     if not os.path.isdir(tasks_directory):
         print(f"Error: Tasks directory not found at {tasks_directory}")
@@ -54,11 +146,22 @@ def load_all_tasks(tasks_directory: str = TASKS_DIR) -> List[Task]:
     for filename in os.listdir(tasks_directory):
         if filename.endswith(".json"):
             filepath = os.path.join(tasks_directory, filename)
-            task = load_task_from_file(filepath)
+            task = load_task_from_file(filepath, lazy)
             if task:
                 all_tasks.append(task)
     return all_tasks
 
+def measure_task_memory(tasks_directory: str = TASKS_DIR, rounds: int = 50, lazy: bool = False) -> float:
+    """Memory benchmark: average bytes retained per loaded task (loads the bank `rounds` times)."""
+    import tracemalloc
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    retained = [load_all_tasks(tasks_directory, lazy) for _ in range(rounds)]
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    task_count = sum(len(tasks) for tasks in retained)
+    return used / task_count if task_count else 0.0
+
 if __name__ == '__main__':
     # Example usage:
     tasks = load_all_tasks()
@@ -100,3 +203,6 @@ if __name__ == '__main__':
     # if not invalid_task_test:
     #     print("Correctly handled invalid JSON task file (if tested).")
 
+    print("\nMemory per task (tracemalloc):")
+    print(f"  eager: {measure_task_memory(lazy=False):8.0f} bytes")
+    print(f"  lazy:  {measure_task_memory(lazy=True):8.0f} bytes (setup contents, hints and man info released)")
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .command_analysis import parse_command
+from .task_catalog import TaskCatalog
+from .task_loader import Task, get_task_individual_commands
+
+FACETS = ("commands", "difficulty", "tags")
+FACET_ALIASES = {"command": "commands", "commands": "commands", "cmd": "commands",
+                 "difficulty": "difficulty", "level": "difficulty",
+                 "tag": "tags", "tags": "tags"}
+DIFFICULTY_ORDER = ["easy", "medium", "hard"]
+# Programs whose use in the example solution marks a task as modifying the filesystem
+DESTRUCTIVE_PROGRAMS = {"rm", "mv", "rmdir", "shred", "truncate"}
+
+# A parsed query: facet -> alternatives (OR), each alternative a list of (negated, value) terms (AND)
+TaskQuery = Dict[str, List[List[Tuple[bool, str]]]]
+
+def derived_tags(task: Task) -> List[str]:
+    """Tags implied by the example solution, in addition to the ones listed in the task file."""
+    tags = []
+    analysis = parse_command(task.example_solution)
+    if analysis is None:
+        return tags
+    if analysis.uses_pipe():
+        tags.append("pipes")
+    programs = set(analysis.invoked_programs())
+    if programs & DESTRUCTIVE_PROGRAMS or analysis.uses_flag("sed", "-i") or analysis.uses_flag("find", "-delete"):
+        tags.append("destructive")
+    return tags
+
+def parse_query(query: str) -> TaskQuery:
+    """Parses a query like "commands=grep&awk difficulty=hard,medium tags=!destructive".
+
+    Facets are separated by whitespace and must all match. Within a facet, `,` or `|` separate
+    alternatives (any may match), `&` joins values that must all match, and `!` negates a value.
+    Raises ValueError on unknown facets or empty values.
+    """
+    parsed: TaskQuery = {}
+    for term in query.split():
+        if "=" not in term:
+            raise ValueError(f"expected facet=value, got '{term}'")
+        facet_name, expression = term.split("=", 1)
+        facet = FACET_ALIASES.get(facet_name.lower())
+        if facet is None:
+            raise ValueError(f"unknown facet '{facet_name}' (use one of: {', '.join(FACETS)})")
+        alternatives = []
+        for alternative in expression.replace("|", ",").split(","):
+            values = [value.strip().lower() for value in alternative.split("&")]
+            if not alternative or not all(value.lstrip("!") for value in values):
+                raise ValueError(f"empty value in '{term}'")
+            alternatives.append([(value.startswith("!"), value.lstrip("!")) for value in values])
+        parsed.setdefault(facet, []).extend(alternatives)
+    return parsed
+
+class TaskIndex:
+    """Per-facet posting bitsets over a fixed list of tasks.
+
+    Bit i of a posting is set when tasks[i] has that facet value, so filters are intersections
+    and unions of Python ints and counts are popcounts, independent of how often menus are drawn.
+    """
+
+    def __init__(self, tasks: Iterable[Task]):
+        self.tasks: List[Task] = list(tasks)
+        self.all_mask = (1 << len(self.tasks)) - 1
+        self.postings: Dict[str, Dict[str, int]] = {facet: defaultdict(int) for facet in FACETS}
+        for bit, task in enumerate(self.tasks):
+            mask = 1 << bit
+            for command in get_task_individual_commands(task.command_to_practice):
+                self.postings["commands"][command] |= mask
+            if task.difficulty:
+                self.postings["difficulty"][task.difficulty] |= mask
+            for tag in set(task.tags) | set(derived_tags(task)):
+                self.postings["tags"][tag] |= mask
+
+    @staticmethod
+    def count(mask: int) -> int:
+        return bin(mask).count("1")
+
+    def values(self, facet: str, within: Optional[int] = None) -> List[str]:
+        """Facet values with at least one task in within (default: all tasks), in menu order."""
+        within = self.all_mask if within is None else within
+        present = [value for value, mask in self.postings[facet].items() if mask & within]
+        if facet == "difficulty": # Known levels in their natural order, any others alphabetically after them
+            return [d for d in DIFFICULTY_ORDER if d in present] + sorted(d for d in present if d not in DIFFICULTY_ORDER)
+        return sorted(present)
+
+    def facet_counts(self, facet: str, within: Optional[int] = None) -> Dict[str, int]:
+        within = self.all_mask if within is None else within
+        return {value: self.count(self.postings[facet][value] & within) for value in self.values(facet, within)}
+
+    def posting(self, facet: str, value: str) -> int:
+        return self.postings[facet].get(value, 0)
+
+    def any_of(self, facet: str, values: Iterable[str]) -> int:
+        mask = 0
+        for value in values:
+            mask |= self.posting(facet, value)
+        return mask
+
+    def select(self, query: TaskQuery, within: Optional[int] = None) -> int:
+        """Returns the bitset of tasks matching a parsed query."""
+        mask = self.all_mask if within is None else within
+        for facet, alternatives in query.items():
+            facet_mask = 0
+            for terms in alternatives:
+                term_mask = self.all_mask
+                for negated, value in terms:
+                    posting = self.posting(facet, value)
+                    term_mask &= (self.all_mask & ~posting) if negated else posting
+                facet_mask |= term_mask
+            mask &= facet_mask
+        return mask
+
+    def tasks_for(self, mask: int) -> List[Task]:
+        selected = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                selected.append(self.tasks[bit])
+            mask >>= 1
+            bit += 1
+        return selected
+
+    def query(self, query: str) -> List[Task]:
+        """Convenience for batch tools: parse query text and return the matching tasks."""
+        return self.tasks_for(self.select(parse_query(query)))
+
+class CatalogTaskIndex:
+    """The TaskIndex of a TaskCatalog's current tasks, rebuilt by a catalog listener on every change,
+    so tasks added or edited while a session runs reach the menus and queries.
+    """
+
+    def __init__(self, catalog: TaskCatalog, index: Optional[TaskIndex] = None):
+        self.catalog = catalog
+        self.index = index if index is not None else TaskIndex(catalog.tasks())
+        catalog.add_listener(self._rebuild)
+
+    def _rebuild(self, changed_ids: List[str], removed_ids: List[str]):
+        self.index = TaskIndex(self.catalog.tasks()) # Swapped in whole; readers keep the index they took
+
+def matching_tasks(tasks: Iterable[Task], query: TaskQuery) -> List[Task]:
+    """The tasks (e.g. ones just added to the bank) that a parsed query selects."""
+    index = TaskIndex(tasks)
+    return index.tasks_for(index.select(query))
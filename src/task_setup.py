@@ -0,0 +1,166 @@
+import contextlib
+import copy
+import datetime
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from .colors import Colors
+from .fixture_store import fixture_store_from_env
+from .sandbox_manager import sandbox_manager_from_env
+from .task_loader import Task
+
+# Shared read-only fixture templates (opt-in via CMD_PRACTICE_FIXTURE_STORE), None when disabled
+# or when the filesystem cannot reflink
+FIXTURE_STORE = fixture_store_from_env()
+# Sandbox directories and the fixture templates' disk use; its reaper thread starts with the first sandbox
+SANDBOX_MANAGER = sandbox_manager_from_env(FIXTURE_STORE)
+
+# Files and directories without a declared time get this one (2024-01-01 00:00:00 UTC), so that
+# `ls -l` and `ls -t` print the same thing on every run and every host
+FIXED_FIXTURE_TIME = 1704067200
+SECONDS_PER_DAY = 24 * 60 * 60
+TIMESTAMPS_NOW = "now" # input_details.timestamps: times are relative to the setup, for `find -mtime` tasks
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """A declared time as epoch seconds: a number, or ISO 8601 text (UTC unless it has an offset)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    return None
+
+def declared_timestamp(task: Task, setup_action: Dict[str, Any], reference_time: float) -> float:
+    """The mtime (and atime) a setup file or directory gets: its "mtime", "last_modified_days_ago"
+    before the reference time, or the reference time itself.
+    """
+    if "mtime" in setup_action:
+        timestamp = parse_timestamp(setup_action["mtime"])
+        if timestamp is not None:
+            return timestamp
+        print(f"{Colors.RED}  Invalid mtime {setup_action['mtime']!r} for {setup_action.get('path')} in task {task.id}. "
+              f"Use epoch seconds or ISO 8601.{Colors.ENDC}")
+    days_ago = setup_action.get("last_modified_days_ago")
+    if isinstance(days_ago, (int, float)) and not isinstance(days_ago, bool):
+        return reference_time - days_ago * SECONDS_PER_DAY
+    return reference_time
+
+def pin_timestamps(task: Task, base_working_dir: str):
+    """Sets the declared times on every setup file and directory.
+
+    Runs after all of them exist, deepest paths first: creating an entry changes its parent
+    directory's mtime, which would undo a parent's pinned time.
+    """
+    if task.input_details.get("timestamps") == TIMESTAMPS_NOW:
+        reference_time = time.time()
+    else:
+        reference_time = FIXED_FIXTURE_TIME
+    actions = [action for action in task.setup_files if action.get("path")]
+    for setup_action in sorted(actions, key=lambda action: os.path.normpath(action["path"]).count(os.sep), reverse=True):
+        timestamp = declared_timestamp(task, setup_action, reference_time)
+        full_path = os.path.join(base_working_dir, setup_action["path"])
+        try:
+            os.utime(full_path, (timestamp, timestamp), follow_symlinks=False)
+        except OSError as e:
+            print(f"{Colors.RED}  Error setting the time of {full_path}: {e}{Colors.ENDC}")
+
+def setup_task_environment(task: Task):
+    """Sets up the environment for a given task, e.g., creating files and directories."""
+    if not task.setup_files:
+        return
+
+    print(f"{Colors.YELLOW}Setting up task environment...{Colors.ENDC}")
+    
+    base_working_dir = task.input_details.get("working_directory", ".")
+    try:
+        if base_working_dir != ".": # Avoid creating the current directory if it's "."
+            os.makedirs(base_working_dir, exist_ok=True)
+            print(f"{Colors.BLUE}  Ensured base working directory exists: {base_working_dir}{Colors.ENDC}")
+    except OSError as e:
+        print(f"{Colors.RED}  Error creating base working directory {base_working_dir}: {e}. Setup might fail.{Colors.ENDC}")
+        # Decide if we should return or try to continue
+        # For now, let's try to continue, individual file/dir ops will show further errors.
+
+    for setup_action in task.setup_files:
+        action = setup_action.get("action")
+        relative_path = setup_action.get("path") # Path relative to working_directory
+        content = setup_action.get("content", "")
+
+        if not relative_path:
+            print(f"{Colors.RED}Error in task setup: Action '{action}' missing 'path'. Skipping.{Colors.ENDC}")
+            continue
+            
+        # Construct the full path using the task's working directory
+        full_path = os.path.join(base_working_dir, relative_path)
+
+        if action == "create_file":
+            try:
+                if FIXTURE_STORE is not None and FIXTURE_STORE.install_file(task, relative_path, full_path):
+                    print(f"{Colors.GREEN}  Reflinked file from fixture template: {full_path}{Colors.ENDC}")
+                    continue
+
+                # Ensure parent directory of the file exists
+                dir_name = os.path.dirname(full_path)
+                if dir_name:
+                    os.makedirs(dir_name, exist_ok=True)
+                # An older version of the fixture store may have left a read-only link to a template here
+                if os.path.exists(full_path) and not os.access(full_path, os.W_OK):
+                    os.remove(full_path)
+                
+                with open(full_path, 'w') as f:
+                    f.write(content)
+                print(f"{Colors.GREEN}  Created/Overwritten file: {full_path}{Colors.ENDC}")
+            except IOError as e:
+                print(f"{Colors.RED}  Error creating/writing file {full_path}: {e}{Colors.ENDC}")
+            except OSError as e: # Catch potential errors from makedirs for file's parent
+                print(f"{Colors.RED}  Error ensuring directory for file {full_path}: {e}{Colors.ENDC}")
+
+        elif action == "create_directory":
+            try:
+                os.makedirs(full_path, exist_ok=True)
+                print(f"{Colors.GREEN}  Ensured directory: {full_path}{Colors.ENDC}")
+            except OSError as e:
+                print(f"{Colors.RED}  Error creating directory {full_path}: {e}{Colors.ENDC}")
+        else:
+            print(f"{Colors.YELLOW}  Unknown setup action '{action}' for path '{relative_path}'. Skipping.{Colors.ENDC}")
+    pin_timestamps(task, base_working_dir)
+    print(f"{Colors.YELLOW}Task environment setup complete.{Colors.ENDC}")
+
+def _sandbox_relative_path(working_dir: str) -> str:
+    """Where a working directory goes inside a sandbox: absolute paths are mirrored under the
+    sandbox root, and leading `..` components are dropped, so the result never leaves it.
+    """
+    parts = os.path.normpath(os.path.splitdrive(working_dir)[1]).lstrip("/" + os.sep).split(os.sep)
+    while parts and parts[0] == "..":
+        parts.pop(0)
+    return os.path.join(*parts) if parts and parts != [""] else "."
+
+@contextlib.contextmanager
+def private_task_sandbox(task: Task, prefix: str = "cmd-practice-sandbox-") -> Iterator[Task]:
+    """Yields a copy of the task whose working directory is a private copy of the original one.
+
+    Lets several attempts (self-test runs, grading workers) use the same task at the same time.
+    The copy is discarded afterwards (deleted in the background by the sandbox manager);
+    setup_task_environment still has to be run on it.
+    """
+    working_dir = task.input_details.get("working_directory", ".")
+    sandbox_root = SANDBOX_MANAGER.create(prefix)
+    try:
+        sandbox_working_dir = os.path.normpath(os.path.join(sandbox_root, _sandbox_relative_path(working_dir)))
+        if working_dir != "." and os.path.isdir(working_dir):
+            # copy2 keeps mtimes, which tasks like find -mtime depend on
+            shutil.copytree(working_dir, sandbox_working_dir, symlinks=True)
+        else:
+            os.makedirs(sandbox_working_dir, exist_ok=True)
+        sandbox_task = copy.copy(task)
+        sandbox_task.input_details = dict(task.input_details, working_directory=sandbox_working_dir)
+        yield sandbox_task
+    finally:
+        SANDBOX_MANAGER.discard(sandbox_root)
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import math
+import os
+from typing import Dict, List, Optional
+
+from .task_loader import Task
+
+TASK_TIMEOUTS_FILE = ".task_timeouts.json"
+DEFAULT_TIMEOUT_SECONDS = 10.0 # Tasks without measurements keep the old fixed timeout
+# Reference runs of example solutions get the longest allowed timeout, so a learned timeout
+# never limits the measurements it is learned from.
+MAX_TIMEOUT_SECONDS = 60.0
+TIMEOUT_FLOOR_SECONDS = 0.5 # Room for process start-up jitter on a loaded host
+TIMEOUT_MULTIPLIER = 5.0 # Timeout = max(floor, multiplier x p99 of the reference runtimes)
+TIMEOUT_PERCENTILE = 0.99
+MAX_SAMPLES_PER_TASK = 50 # Most recent reference runtimes kept per task
+
+def runtime_fingerprint(task: Task) -> str:
+    """Changes when anything that affects the example solution's runtime changes."""
+    data = [task.example_solution, task.setup_files, task.input_details.get("working_directory", ".")]
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def learned_timeout(samples: List[float]) -> float:
+    return min(MAX_TIMEOUT_SECONDS, max(TIMEOUT_FLOOR_SECONDS, TIMEOUT_MULTIPLIER * percentile(samples, TIMEOUT_PERCENTILE)))
+
+class TaskTimeouts:
+    """Per-task timeouts learned from reference runs of each task's example_solution.
+
+    The self-test records runtimes; the task catalog applies the learned timeouts at load time.
+    Samples are dropped when the task's solution or fixtures change.
+    """
+
+    def __init__(self, timeouts_file: str = TASK_TIMEOUTS_FILE):
+        self.timeouts_file = timeouts_file
+        self.entries: Dict[str, Dict] = {} # task id -> {"fingerprint", "samples", "timeout_seconds"}
+        if os.path.exists(timeouts_file):
+            try:
+                with open(timeouts_file, 'r') as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Error loading task timeouts: {e}. Using the default timeout.")
+
+    def save(self):
+        try:
+            tmp_path = f"{self.timeouts_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=4)
+            os.replace(tmp_path, self.timeouts_file)
+        except IOError as e:
+            print(f"Error saving task timeouts: {e}")
+
+    def record(self, task: Task, runtimes: List[float]):
+        """Adds reference runtimes (seconds) for a task and recomputes its timeout."""
+        fingerprint = runtime_fingerprint(task)
+        entry = self.entries.get(task.id)
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            entry = {"fingerprint": fingerprint, "samples": []}
+        entry["samples"] = (entry["samples"] + [round(seconds, 4) for seconds in runtimes])[-MAX_SAMPLES_PER_TASK:]
+        entry["timeout_seconds"] = round(learned_timeout(entry["samples"]), 3)
+        self.entries[task.id] = entry
+
+    def learned_timeout_for(self, task: Task) -> Optional[float]:
+        entry = self.entries.get(task.id)
+        if entry is None or entry.get("fingerprint") != runtime_fingerprint(task) or not entry.get("samples"):
+            return None
+        return entry["timeout_seconds"]
+
+def task_timeout(task: Task) -> float:
+    """Timeout for running a command for this task: input_details["timeout_seconds"], else the
+    learned timeout stored on the task by the catalog, else DEFAULT_TIMEOUT_SECONDS.
+    """
+    override = task.input_details.get("timeout_seconds")
+    if override is not None:
+        return float(override)
+    return task.timeout_seconds if task.timeout_seconds is not None else DEFAULT_TIMEOUT_SECONDS
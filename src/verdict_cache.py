@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .task_loader import Task
+
+VERDICT_CACHE_DIR = ".verdict_cache"
+VERDICT_CACHE_ENV_VAR = "CMD_PRACTICE_VERDICT_CACHE" # Set to "1" to enable the cache in a session
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 24 * 60 * 60  # 1 day
+HASH_CHUNK_BYTES = 1024 * 1024
+
+Verdict = Tuple[bool, str, str] # (is_correct, actual_stdout, actual_stderr), same shape as evaluate_command
+
+def normalize_command(command_str: str) -> str:
+    """Trims the whitespace around a command, the only normalization that can never merge two
+    commands: inner spacing is left alone, since quotes and escapes make it part of the words
+    (`echo 'x y'z` and `echo 'x y' z` print different things).
+    """
+    return command_str.strip()
+
+def fixture_hash(task: Task) -> str:
+    """Hashes everything about the task's starting state that can change a verdict."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(task.setup_files, sort_keys=True).encode())
+
+    # Files the task reads but does not create itself (e.g. data/avonturen.txt) are keyed on
+    # size and mtime, so editing a shared fixture invalidates the verdicts that depended on it.
+    working_dir = task.input_details.get("working_directory", ".")
+    created_by_setup = {action.get("path") for action in task.setup_files}
+    for file_path in task.input_details.get("required_files_for_task", []):
+        if file_path in created_by_setup:
+            continue
+        full_path = os.path.join(working_dir, file_path)
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            digest.update(f"{file_path}:missing".encode())
+            continue
+        digest.update(f"{file_path}:{stat_result.st_size}:{stat_result.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+# Content digests of files seen before, by path: (stat signature, digest). A file is re-read only
+# when its inode, size, mtime or ctime changed; ctime cannot be set back, so an edit is never missed.
+_file_digests: Dict[str, Tuple[Tuple[int, int, int, int], str]] = {}
+
+def _file_digest(path: str, stat_result: os.stat_result) -> str:
+    signature = (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ctime_ns)
+    known = _file_digests.get(path)
+    if known is not None and known[0] == signature:
+        return known[1]
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+    except OSError:
+        return "unreadable"
+    _file_digests[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+def working_directory_state(working_dir: str) -> str:
+    """Hashes what a command will actually find in its working directory: every path, its type,
+    permissions and content (or link target). The directory is shared and not reset between
+    attempts, so a verdict is only valid for the exact state it was computed against.
+    """
+    digest = hashlib.sha256()
+    if not os.path.isdir(working_dir):
+        return "missing"
+    for root, dirs, files in os.walk(working_dir):
+        dirs.sort()
+        for name in dirs + sorted(files):
+            full_path = os.path.join(root, name)
+            try:
+                stat_result = os.lstat(full_path)
+            except OSError:
+                continue # Removed while walking
+            if os.path.islink(full_path):
+                content = "link:" + os.readlink(full_path)
+            elif os.path.isdir(full_path):
+                content = "dir"
+            else:
+                content = _file_digest(full_path, stat_result)
+            relative_path = os.path.relpath(full_path, working_dir)
+            digest.update(f"{relative_path}\0{stat_result.st_mode:o}\0{content}\n".encode())
+    return digest.hexdigest()
+
+class VerdictCache:
+    """LRU + TTL cache of evaluation verdicts with an optional on-disk tier.
+
+    Only deterministic tasks should be cached; evaluate_command checks task.deterministic.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 cache_dir: Optional[str] = VERDICT_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, Tuple[float, Verdict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, task: Task, command_str: str, evaluator_version: str, working_state: str) -> str:
+        """Builds the cache key from (task id, normalized command, fixture hash, evaluator version,
+        working_state), where working_state is working_directory_state() taken right before the run.
+        The task's evaluation block is part of the key too, so editing a task (e.g. on hot reload)
+        never serves verdicts computed against its old expectations.
+        """
+        # Not the working directory's path: a private sandbox copy (see task_setup.private_task_sandbox)
+        # is the same starting state, which working_state already covers
+        definition = json.dumps([task.evaluation, dict(task.input_details, working_directory=None)], sort_keys=True)
+        raw_key = "\0".join([task.id, normalize_command(command_str), fixture_hash(task), evaluator_version,
+                             working_state, definition])
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Verdict]:
+        """Returns the cached verdict for key, or None on a miss or expired entry."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, verdict = entry
+            if now - stored_at < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return verdict
+            del self._entries[key]
+
+        entry = self._load_from_disk(key)
+        if entry is not None and now - entry[0] < self.ttl_seconds:
+            self._remember(key, entry[0], entry[1]) # Promote to the memory tier
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, verdict: Verdict):
+        """Stores a verdict in memory and, if configured, on disk."""
+        stored_at = time.time()
+        self._remember(key, stored_at, verdict)
+        self._save_to_disk(key, stored_at, verdict)
+
+    def clear(self):
+        """Drops every entry from both tiers."""
+        self._entries.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def prune_disk(self) -> int:
+        """Removes expired on-disk entries. Returns the number of files removed."""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for dir_path, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                file_path = os.path.join(dir_path, filename)
+                try:
+                    if filename.endswith(".json") and os.path.getmtime(file_path) < cutoff:
+                        os.remove(file_path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remember(self, key: str, stored_at: float, verdict: Verdict):
+        self._entries[key] = (stored_at, verdict)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False) # Evict least recently used
+
+    def _disk_path(self, key: str) -> str:
+        # Two-character fan-out keeps directories small with many cached submissions
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_from_disk(self, key: str) -> Optional[Tuple[float, Verdict]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                data = json.load(f)
+            return data["stored_at"], (data["is_correct"], data["stdout"], data["stderr"])
+        except (OSError, json.JSONDecodeError, KeyError):
+            return None
+
+    def _save_to_disk(self, key: str, stored_at: float, verdict: Verdict):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        is_correct, stdout, stderr = verdict
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({"stored_at": stored_at, "is_correct": is_correct, "stdout": stdout, "stderr": stderr}, f)
+            os.replace(tmp_path, path) # Atomic, so concurrent graders never read a half-written entry
+        except OSError as e:
+            print(f"Warning: Could not write verdict cache entry: {e}")
+
+def verdict_cache_from_env() -> Optional[VerdictCache]:
+    """Returns a VerdictCache if the opt-in environment variable is set, else None."""
+    if os.environ.get(VERDICT_CACHE_ENV_VAR, "") in ("1", "true", "yes"):
+        return VerdictCache()
+    return None
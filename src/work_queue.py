@@ -0,0 +1,379 @@
+if __name__ == "__main__" and (__package__ is None or __package__ == ''):
+    import sys
+    import os
+    # Allow running as `python src/work_queue.py` as well as `python -m src.work_queue`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "src"
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from .colors import Colors
+from .evaluator import evaluate_command
+from .evaluator_plugins import get_evaluator
+from .host_capabilities import HostCapabilities
+from .isolation import get_isolation_backend
+from .task_catalog import TaskCatalog
+from .task_loader import TASKS_DIR
+from .task_setup import FIXTURE_STORE, private_task_sandbox, setup_task_environment
+from .task_timeouts import MAX_TIMEOUT_SECONDS, TaskTimeouts
+
+GRADING_QUEUE_FILE = "grading_queue.sqlite3"
+DEFAULT_SHARD_COUNT = 16 # Fixed when the queue file is created
+# Longer than the longest command timeout, so a healthy worker never loses a lease mid-job.
+# A batch is leased for this long, and each job's lease is renewed for this long again before it is graded.
+LEASE_SECONDS = MAX_TIMEOUT_SECONDS * 2
+MAX_ATTEMPTS = 3 # Leases per job before it is marked failed (worker crashes, evaluation errors)
+LEASE_BATCH_SIZE = 4 # Jobs leased per transaction; fewer write locks on the shared file
+IDLE_POLL_SECONDS = 0.05
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+STATE_QUEUED = "queued"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    learner_id TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_shard ON jobs (shard, state, id);
+"""
+
+def shard_for(task_id: str, shard_count: int) -> int:
+    """Stable shard of a task id: the same on every node and in every process (unlike hash())."""
+    return zlib.crc32(task_id.encode()) % shard_count
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class GradingQueue:
+    """Durable grading job queue in one SQLite file, shared by the workers of every node.
+
+    Jobs (task id, command, learner id) are routed to shards by task id. A worker leases jobs
+    from its shards for LEASE_SECONDS; a lease that runs out (the worker died) makes the job
+    available again, up to MAX_ATTEMPTS times. Results are written back to the job row.
+    For several hosts, the file has to be on storage with working POSIX locks.
+    """
+
+    def __init__(self, path: str = GRADING_QUEUE_FILE, shard_count: int = DEFAULT_SHARD_COUNT):
+        self.path = path
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL") # Readers do not block the writer
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('shard_count', ?)", (str(shard_count),))
+        self.shard_count = int(self.connection.execute("SELECT value FROM meta WHERE key = 'shard_count'").fetchone()[0])
+
+    def close(self):
+        self.connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE") # Takes the write lock up front, so lease races cannot happen
+        try:
+            yield self.connection
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, task_id: str, command: str, learner_id: str = "anonymous") -> int:
+        return self.enqueue_many([(task_id, command, learner_id)])[0]
+
+    def enqueue_many(self, jobs: List[tuple]) -> List[int]:
+        """Adds (task_id, command, learner_id) jobs in one transaction. Returns their ids."""
+        now = time.time()
+        job_ids = []
+        with self._transaction() as connection:
+            for task_id, command, learner_id in jobs:
+                cursor = connection.execute(
+                    "INSERT INTO jobs (task_id, command, learner_id, shard, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                    (task_id, command, learner_id, shard_for(task_id, self.shard_count), now))
+                job_ids.append(cursor.lastrowid)
+        return job_ids
+
+    def lease(self, worker_id: str, shards: Optional[List[int]] = None, limit: int = LEASE_BATCH_SIZE,
+              lease_seconds: float = LEASE_SECONDS) -> List[sqlite3.Row]:
+        """Leases up to `limit` queued (or expired) jobs from the given shards (all shards if None)."""
+        now = time.time()
+        shard_filter, shard_params = "", []
+        if shards is not None:
+            shard_filter = f"AND shard IN ({','.join('?' * len(shards))})"
+            shard_params = list(shards)
+        with self._transaction() as connection:
+            # Jobs whose lease ran out too often are given up on instead of being handed out again
+            connection.execute(
+                f"UPDATE jobs SET state = ?, finished_at = ?, error = 'lease expired ' || attempts || ' time(s)' "
+                f"WHERE state = ? AND lease_expires < ? AND attempts >= ? {shard_filter}",
+                [STATE_FAILED, now, STATE_LEASED, now, MAX_ATTEMPTS] + shard_params)
+            rows = connection.execute(
+                f"SELECT * FROM jobs WHERE (state = ? OR (state = ? AND lease_expires < ?)) {shard_filter} "
+                f"ORDER BY id LIMIT ?",
+                [STATE_QUEUED, STATE_LEASED, now] + shard_params + [limit]).fetchall()
+            if rows:
+                connection.execute(
+                    f"UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    f"WHERE id IN ({','.join('?' * len(rows))})",
+                    [STATE_LEASED, worker_id, now + lease_seconds] + [row["id"] for row in rows])
+        return rows
+
+    def renew(self, job_id: int, worker_id: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """Extends a job's lease from now, e.g. when the worker starts grading it after the rest of its
+        batch. False if another worker has taken the job over (its lease ran out and was re-leased).
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, job_id, STATE_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Writes a job's result. False if the worker no longer holds the lease (it expired and moved on)."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, result = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (STATE_DONE, json.dumps(result), time.time(), job_id, STATE_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def release(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Gives a leased job back after an error: queued again, or failed after MAX_ATTEMPTS."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, "
+                "finished_at = CASE WHEN attempts >= ? THEN ? ELSE NULL END, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (MAX_ATTEMPTS, STATE_FAILED, STATE_QUEUED, error, MAX_ATTEMPTS, time.time(), job_id, STATE_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def result(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute("SELECT state, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {"state": row["state"], "result": json.loads(row["result"]) if row["result"] else None, "error": row["error"]}
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state."""
+        rows = self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def pending(self, shards: Optional[List[int]] = None) -> int:
+        """Jobs that are queued or leased, optionally only in some shards."""
+        query = "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)"
+        params: List[Any] = [STATE_QUEUED, STATE_LEASED]
+        if shards is not None:
+            query += f" AND shard IN ({','.join('?' * len(shards))})"
+            params += list(shards)
+        return self.connection.execute(query, params).fetchone()[0]
+
+class GradingWorker:
+    """Pulls jobs for its shards and grades them, one private sandbox per job.
+
+    The task catalog, host probes, evaluator plugins and fixture templates for the worker's
+    shards are loaded once when it starts, so jobs only pay for the sandbox and the command.
+    """
+
+    def __init__(self, queue: GradingQueue, shards: Optional[List[int]] = None, worker_id: Optional[str] = None,
+                 tasks_directory: str = TASKS_DIR):
+        self.queue = queue
+        self.shards = shards
+        self.worker_id = worker_id or default_worker_id()
+        # Lazy: heavy fields are read into each job's sandbox copy of the task, not kept in the catalog
+        self.catalog = TaskCatalog(tasks_directory, lazy=True, host=HostCapabilities(), timeouts=TaskTimeouts())
+        self.jobs_done = 0
+        self._warm_up()
+
+    def _warm_up(self):
+        get_isolation_backend() # Probed once per process
+        for task in self.catalog.tasks():
+            if self.shards is not None and shard_for(task.id, self.queue.shard_count) not in self.shards:
+                continue
+            get_evaluator(task.evaluation.get("method", "")) # Loads plugin modules the shard's tasks need
+            if FIXTURE_STORE is not None and task.setup_files:
+                FIXTURE_STORE.template_dir(task)
+            task.release_heavy_fields() # Read back for the template only
+
+    def grade(self, job: sqlite3.Row) -> Dict[str, Any]:
+        task = self.catalog.get(job["task_id"])
+        if task is None:
+            return {"correct": False, "stdout": "", "stderr": f"Unknown or hidden task '{job['task_id']}'.", "seconds": 0.0}
+        started = time.perf_counter()
+        with private_task_sandbox(task, prefix="cmd-practice-grade-") as sandbox_task:
+            with contextlib.redirect_stdout(io.StringIO()): # Setup and evaluator chatter is not part of the result
+                setup_task_environment(sandbox_task)
+                correct, stdout, stderr = evaluate_command(job["command"], sandbox_task)
+        return {"correct": correct, "stdout": stdout.text, "stderr": stderr.text, "seconds": round(time.perf_counter() - started, 4)}
+
+    def run_once(self) -> int:
+        """Leases and grades one batch of jobs. Returns how many were leased."""
+        jobs = self.queue.lease(self.worker_id, self.shards)
+        for job in jobs:
+            # The jobs before it may have used up the batch's lease; a job another worker took over is left to it
+            if not self.queue.renew(job["id"], self.worker_id):
+                continue
+            try:
+                result = self.grade(job)
+            except Exception as e: # Retried by another lease; the worker keeps going
+                self.queue.release(job["id"], self.worker_id, f"{type(e).__name__}: {e}")
+                continue
+            if self.queue.complete(job["id"], self.worker_id, result):
+                self.jobs_done += 1
+        return len(jobs)
+
+    def run(self, stop_when_idle: bool = False):
+        """Grades jobs until interrupted, or until the worker's shards have nothing pending."""
+        while True:
+            if self.run_once():
+                continue
+            if stop_when_idle and self.queue.pending(self.shards) == 0:
+                return
+            time.sleep(IDLE_POLL_SECONDS)
+
+def shards_for_worker(worker_index: int, worker_count: int, shard_count: int) -> List[int]:
+    """Splits the shards evenly over workers: worker i gets shards i, i + n, i + 2n, ..."""
+    return [shard for shard in range(shard_count) if shard % worker_count == worker_index]
+
+def _simulated_node(queue_path: str, worker_index: int, worker_count: int, ready, start):
+    queue = GradingQueue(queue_path)
+    worker = GradingWorker(queue, shards_for_worker(worker_index, worker_count, queue.shard_count),
+                           worker_id=f"node{worker_index}:{os.getpid()}")
+    ready.release()
+    start.wait() # Every node has warmed up before the clock starts
+    worker.run(stop_when_idle=True)
+    queue.close()
+
+def simulate(worker_counts: List[int], jobs_per_run: int, tasks_directory: str = TASKS_DIR) -> List[Dict[str, Any]]:
+    """Grades the same job mix with 1..n worker processes, each standing in for a node, and
+    reports throughput. Every run uses a fresh queue file, so runs do not share state.
+    """
+    catalog = TaskCatalog(tasks_directory, host=HostCapabilities())
+    tasks = catalog.tasks()
+    if not tasks:
+        print(f"{Colors.RED}No tasks to grade.{Colors.ENDC}")
+        return []
+    # Example solutions and a wrong answer per task, round robin, from a few learners
+    mix = []
+    for task in tasks:
+        mix.append((task.id, task.example_solution))
+        mix.append((task.id, "echo wrong answer"))
+    jobs = [(task_id, command, f"learner{i % 7}") for i, (task_id, command) in
+            ((i, mix[i % len(mix)]) for i in range(jobs_per_run))]
+
+    reports = []
+    context = multiprocessing.get_context("spawn" if sys.platform == "darwin" else None)
+    for worker_count in worker_counts:
+        queue_dir = tempfile.mkdtemp(prefix="cmd-practice-queue-")
+        queue_path = os.path.join(queue_dir, GRADING_QUEUE_FILE)
+        queue = GradingQueue(queue_path)
+        queue.enqueue_many(jobs)
+        ready, start = context.Semaphore(0), context.Event()
+        nodes = [context.Process(target=_simulated_node, args=(queue_path, index, worker_count, ready, start))
+                 for index in range(worker_count)]
+        for node in nodes:
+            node.start()
+        for _ in nodes:
+            ready.acquire()
+        started = time.perf_counter()
+        start.set()
+        for node in nodes:
+            node.join()
+        seconds = time.perf_counter() - started
+        counts = queue.counts()
+        correct = queue.connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE json_extract(result, '$.correct')").fetchone()[0]
+        queue.close()
+        for suffix in ("", "-wal", "-shm"):
+            with contextlib.suppress(OSError):
+                os.remove(queue_path + suffix)
+        os.rmdir(queue_dir)
+        reports.append({"workers": worker_count, "jobs": len(jobs), "seconds": seconds,
+                        "jobs_per_second": len(jobs) / seconds if seconds else 0.0,
+                        "done": counts.get(STATE_DONE, 0), "failed": counts.get(STATE_FAILED, 0), "correct": correct})
+    return reports
+
+def print_simulation(reports: List[Dict[str, Any]]):
+    if not reports:
+        return
+    baseline = reports[0]["jobs_per_second"] / reports[0]["workers"]
+    print(f"{Colors.HEADER}{Colors.BOLD}{'workers':>8} {'jobs':>6} {'seconds':>9} {'jobs/s':>9} {'speedup':>8} "
+          f"{'efficiency':>10} {'done':>6} {'failed':>6} {'correct':>8}{Colors.ENDC}")
+    for report in reports:
+        speedup = report["jobs_per_second"] / baseline if baseline else 0.0
+        print(f"{report['workers']:>8} {report['jobs']:>6} {report['seconds']:>9.2f} {report['jobs_per_second']:>9.1f} "
+              f"{speedup:>7.2f}x {speedup / report['workers']:>10.0%} {report['done']:>6} {report['failed']:>6} {report['correct']:>8}")
+    print(f"{Colors.BLUE}({os.cpu_count()} CPU(s) on this host; scaling flattens once workers exceed them){Colors.ENDC}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Sharded grading work queue.")
+    parser.add_argument("--queue", default=GRADING_QUEUE_FILE, help="Queue database shared by all nodes")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add a grading job")
+    enqueue_parser.add_argument("task_id")
+    enqueue_parser.add_argument("grading_command")
+    enqueue_parser.add_argument("--learner", default="anonymous")
+    worker_parser = subparsers.add_parser("worker", help="Grade jobs from some (or all) shards")
+    worker_parser.add_argument("--shard", type=int, action="append", help="Shard to serve (repeatable; default: all)")
+    worker_parser.add_argument("--until-idle", action="store_true", help="Exit when the shards have nothing pending")
+    subparsers.add_parser("status", help="Show job counts per state")
+    simulate_parser = subparsers.add_parser("simulate", help="Measure throughput with several local worker processes")
+    simulate_parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to try")
+    simulate_parser.add_argument("--jobs", type=int, default=400, help="Jobs per run")
+    args = parser.parse_args(argv)
+
+    if args.action == "simulate":
+        try:
+            worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+        except ValueError:
+            print(f"{Colors.RED}--workers must be a comma-separated list of numbers.{Colors.ENDC}")
+            return 1
+        print_simulation(simulate(worker_counts, args.jobs))
+        return 0
+
+    queue = GradingQueue(args.queue)
+    try:
+        if args.action == "enqueue":
+            print(queue.enqueue(args.task_id, args.grading_command, args.learner))
+        elif args.action == "worker":
+            worker = GradingWorker(queue, args.shard)
+            print(f"{Colors.BLUE}Worker {worker.worker_id} serving "
+                  f"{'all shards' if args.shard is None else 'shards ' + ', '.join(map(str, args.shard))}{Colors.ENDC}")
+            try:
+                worker.run(stop_when_idle=args.until_idle)
+            except KeyboardInterrupt:
+                pass
+            print(f"{Colors.BLUE}Graded {worker.jobs_done} job(s).{Colors.ENDC}")
+        else:
+            print(json.dumps(queue.counts(), indent=2))
+    finally:
+        queue.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())